@@ -0,0 +1,40 @@
+# accounts/signals.py
+"""
+Invalidation of the cached student dashboards (see ``accounts.student_dashboard``).
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from colleges.models import Enrollment, Student
+from courses.models import Assignment, Submission
+from discussions.models import Comment, Discussion, StudentBadge
+from quizzes.models import Quiz, QuizResult
+
+from .student_dashboard import bump_section_dashboard_version, invalidate_student_dashboard
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+@receiver([post_save, post_delete], sender=Submission)
+@receiver([post_save, post_delete], sender=QuizResult)
+@receiver([post_save, post_delete], sender=StudentBadge)
+def student_row_changed(sender, instance, **kwargs):
+    invalidate_student_dashboard(instance.student_id)
+
+
+@receiver(post_save, sender=Student)
+def student_changed(sender, instance, **kwargs):
+    invalidate_student_dashboard(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Discussion)
+@receiver([post_save, post_delete], sender=Comment)
+def post_changed(sender, instance, created=True, **kwargs):
+    # Edits do not change forum participation; only new and deleted posts do
+    if created:
+        invalidate_student_dashboard(instance.author_id)
+
+
+@receiver([post_save, post_delete], sender=Assignment)
+@receiver([post_save, post_delete], sender=Quiz)
+def section_item_changed(sender, instance, **kwargs):
+    bump_section_dashboard_version(instance.section_id)
@@ -0,0 +1,198 @@
+# accounts/student_dashboard.py
+"""
+Batched and cached data for the student dashboard.
+
+``get_dashboard`` gathers every widget of ``student_dashboard`` (enrollments,
+SPI, pending assignments, recent submissions, upcoming quizzes, attendance and
+badges) with a fixed number of grouped queries, whatever the number of
+enrollments, and computes the SPI in Python with the same arithmetic as
+``Student.calculate_spi``.
+
+The result is cached per student for ``CACHE_TIMEOUT`` seconds, short enough for
+the time-based widgets (due dates, quiz start times) to roll over. Changes to
+the student's own rows (submissions, quiz results, badges, posts, enrollments)
+delete the entry through the signals in ``accounts.signals``. Changes that
+concern a whole section (assignments, quizzes, attendance) bump that section's
+dashboard version instead, and a cached entry is only used while the versions
+of all its sections are unchanged. Code that writes those rows without signals
+(``bulk_create``, ``bulk_update``, ``update()``) must call
+``invalidate_student_dashboard`` or ``bump_section_dashboard_version`` itself.
+"""
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from colleges.models import Enrollment
+from courses.models import Assignment, Attendance, Submission
+from discussions.models import Discussion, StudentBadge
+from quizzes.models import Quiz, QuizResult
+
+CACHE_KEY = 'student_dashboard:{student_id}'
+VERSION_KEY = 'section_dashboard_version:{section_id}'
+CACHE_TIMEOUT = 60 * 5  # 5 minutes
+
+WEIGHT_ASSIGNMENT = Decimal('0.4')
+WEIGHT_QUIZ = Decimal('0.3')
+WEIGHT_ATTENDANCE = Decimal('0.2')
+WEIGHT_FORUM = Decimal('0.1')
+
+
+def _cache_key(student_id):
+    return CACHE_KEY.format(student_id=student_id)
+
+
+def _version_key(section_id):
+    return VERSION_KEY.format(section_id=section_id)
+
+
+def _section_versions(section_ids):
+    keys = {section_id: _version_key(section_id) for section_id in section_ids}
+    versions = cache.get_many(keys.values())
+    return {section_id: versions.get(key) for section_id, key in keys.items()}
+
+
+def bump_section_dashboard_version(section_id):
+    """Mark the cached dashboards of every student of ``section_id`` as stale."""
+    key = _version_key(section_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Time-based start so a version lost from the cache never reuses an old number
+        cache.add(key, int(time.time() * 1000), None)
+
+
+def invalidate_student_dashboard(*student_ids):
+    """Drop cached dashboards for the given Student pks (user ids)."""
+    cache.delete_many([_cache_key(student_id) for student_id in student_ids])
+
+
+def _spi(spi_enrollments, assignment_avgs, quiz_avgs, attendance, forum_counts):
+    """``Student.calculate_spi`` over pre-aggregated values."""
+    if not spi_enrollments:
+        return Decimal('0.0')
+
+    total_spi = Decimal('0.0')
+    for enrollment in spi_enrollments:
+        assignment_avg = assignment_avgs.get(enrollment.id)
+        assignment_avg = Decimal(assignment_avg) if assignment_avg is not None else Decimal('0.0')
+        quiz_avg = quiz_avgs.get(enrollment.id)
+        quiz_avg = Decimal(quiz_avg) if quiz_avg is not None else Decimal('0.0')
+
+        attended, total_classes = attendance.get(enrollment.section_id, (0, 0))
+        if total_classes > 0:
+            attendance_pct = (Decimal(attended) / Decimal(total_classes)) * Decimal('100.0')
+        else:
+            attendance_pct = Decimal('0.0')
+
+        forum_score = min(Decimal(forum_counts.get(enrollment.section_id, 0) * 10), Decimal('100.0'))
+
+        total_spi += (
+            (WEIGHT_ASSIGNMENT * assignment_avg) +
+            (WEIGHT_QUIZ * quiz_avg) +
+            (WEIGHT_ATTENDANCE * attendance_pct) +
+            (WEIGHT_FORUM * forum_score)
+        )
+
+    final_spi = total_spi / Decimal(len(spi_enrollments))
+    return final_spi.quantize(Decimal('0.01'))
+
+
+def build_dashboard(student):
+    """Compute the dashboard widgets for ``student`` (no caching)."""
+    now = timezone.now()
+    all_enrollments = list(
+        Enrollment.objects.filter(student=student).select_related('section__course', 'section__teacher')
+    )
+    enrollments = [enrollment for enrollment in all_enrollments if enrollment.is_active]
+    spi_enrollments = [
+        enrollment for enrollment in all_enrollments
+        if enrollment.section.course.semester == student.current_semester
+    ]
+    section_ids = {enrollment.section_id for enrollment in all_enrollments}
+    stats_section_ids = {enrollment.section_id for enrollment in enrollments + spi_enrollments}
+
+    assignment_avgs, quiz_avgs, forum_counts = {}, {}, {}
+    if spi_enrollments:
+        spi_enrollment_ids = [enrollment.id for enrollment in spi_enrollments]
+        assignment_avgs = dict(
+            Submission.objects.filter(enrollment_id__in=spi_enrollment_ids, status='graded')
+            .values('enrollment_id').annotate(avg=Avg('marks_obtained')).order_by()
+            .values_list('enrollment_id', 'avg')
+        )
+        quiz_avgs = dict(
+            QuizResult.objects.filter(enrollment_id__in=spi_enrollment_ids)
+            .values('enrollment_id').annotate(avg=Avg('percentage')).order_by()
+            .values_list('enrollment_id', 'avg')
+        )
+        forum_counts = dict(
+            Discussion.objects.filter(section_id__in={enrollment.section_id for enrollment in spi_enrollments})
+            .filter(Q(comments__author_id=student.pk) | Q(author_id=student.pk))
+            .values('section_id').annotate(count=Count('id', distinct=True)).order_by()
+            .values_list('section_id', 'count')
+        )
+
+    attendance = {}
+    if stats_section_ids:
+        rows = Attendance.objects.filter(section_id__in=stats_section_ids).values('section_id').annotate(
+            total=Count('date', distinct=True),
+            attended=Count('id', filter=Q(student_id=student.pk, status='present')),
+        ).order_by()
+        attendance = {row['section_id']: (row['attended'], row['total']) for row in rows}
+
+    attendance_stats = {}
+    for enrollment in enrollments:
+        attended, total_classes = attendance.get(enrollment.section_id, (0, 0))
+        attendance_stats[enrollment.section_id] = {
+            'attended': attended,
+            'total': total_classes,
+            'percentage': round((attended / total_classes) * 100, 2) if total_classes > 0 else 0,
+        }
+
+    pending_assignments = Assignment.objects.filter(
+        section_id__in=section_ids, status='published', due_date__gte=now,
+    ).filter(
+        ~Exists(Submission.objects.filter(assignment_id=OuterRef('pk'), student_id=student.pk))
+    ).count() if section_ids else 0
+
+    upcoming_quizzes = list(
+        Quiz.objects.filter(section_id__in=section_ids, start_time__gte=now, is_active=True)
+        .order_by('start_time')[:5]
+    ) if section_ids else []
+
+    return {
+        'enrollments': enrollments,
+        'spi_score': _spi(spi_enrollments, assignment_avgs, quiz_avgs, attendance, forum_counts),
+        'total_courses': len(enrollments),
+        'pending_assignments': pending_assignments,
+        'recent_submissions': list(
+            Submission.objects.filter(student=student).select_related('assignment').order_by('-submitted_at')[:5]
+        ),
+        'upcoming_quizzes': upcoming_quizzes,
+        'attendance_stats': attendance_stats,
+        'recent_badges': list(
+            StudentBadge.objects.filter(student=student).select_related('badge').order_by('-earned_date')[:3]
+        ),
+    }
+
+
+def get_dashboard(student):
+    """
+    The dashboard widgets for ``student`` as a dict of template context values,
+    from the cache when neither the student's rows nor their sections changed.
+    """
+    key = _cache_key(student.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        versions, data = cached
+        if _section_versions(versions) == versions:
+            return data
+
+    section_ids = Enrollment.objects.filter(student=student).values_list('section_id', flat=True)
+    # Read the versions before building so a change made meanwhile is not hidden
+    versions = _section_versions(list(section_ids))
+    data = build_dashboard(student)
+    cache.set(key, (versions, data), CACHE_TIMEOUT)
+    return data
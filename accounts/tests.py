@@ -1,3 +1,121 @@
+import datetime
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from colleges.models import ClassSection, Course, Department, Enrollment, Student
+from courses.attendance import upsert_attendance
+from courses.models import Assignment
+from discussions.models import Comment, Discussion
+from quizzes.models import Quiz, QuizAttempt, QuizResult
+from .models import College, User
+from .student_dashboard import build_dashboard, get_dashboard
+
+
+class StudentDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        college = College.objects.create(name='College', code='C1', address='a', established_year=2000,
+                                         contact_email='c@example.com', contact_phone='1')
+        cls.department = Department.objects.create(college=college, name='Computer Science', code='CS')
+        cls.teacher = User.objects.create_user('teacher', password='pw', role='teacher', college=college)
+        cls.sections = [
+            ClassSection.objects.create(
+                course=Course.objects.create(department=cls.department, name=f'Course {number}',
+                                             code=f'CS{number}', credits=3, semester=1),
+                section_name='A', academic_year='2024-2025', year=1, teacher=cls.teacher,
+            )
+            for number in range(3)
+        ]
+        cls.admin = User.objects.create_user('admin', password='pw', role='college_admin', college=college)
+        cls.user = User.objects.create_user('student', password='pw', role='student', college=college)
+        cls.student = Student.objects.create(user=cls.user, department=cls.department, roll_number='R001',
+                                             admission_year=2024, current_semester=1, guardian_name='g',
+                                             guardian_phone='1')
+        cls.enrollment = Enrollment.objects.create(student=cls.student, section=cls.sections[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            get_dashboard(Student.objects.get(pk=self.student.pk))
+        return len(queries.captured_queries)
+
+    def add_activity(self):
+        section = self.sections[0]
+        upsert_attendance(section, [
+            (self.student.pk, datetime.date(2025, 1, day), status, '')
+            for day, status in [(6, 'present'), (7, 'present'), (8, 'absent')]
+        ], self.teacher)
+        now = timezone.now()
+        quiz = Quiz.objects.create(section=section, title='Quiz', duration_minutes=30, total_marks=10,
+                                   passing_marks=5, start_time=now - datetime.timedelta(days=1),
+                                   end_time=now, created_by=self.teacher)
+        attempt = QuizAttempt.objects.create(quiz=quiz, student=self.student, status='submitted', score=8,
+                                             percentage=80, submitted_at=now)
+        QuizResult.objects.create(attempt=attempt, student=self.student, enrollment=self.enrollment, quiz=quiz,
+                                  score=8, percentage=80, passed=True)
+        discussion = Discussion.objects.create(section=section, author=self.teacher, title='Q', content='c')
+        Comment.objects.create(discussion=discussion, author=self.user, content='answer')
+
+    def test_spi_matches_the_model(self):
+        self.add_activity()
+        dashboard = get_dashboard(self.student)
+        self.assertEqual(dashboard['spi_score'], self.student.calculate_spi())
+        self.assertGreater(dashboard['spi_score'], 0)
+        self.assertEqual(dashboard['attendance_stats'][self.sections[0].id],
+                         {'attended': 2, 'total': 3, 'percentage': 66.67})
+
+    def test_query_count_does_not_grow_with_enrollments(self):
+        self.add_activity()
+        one_enrollment = self.queries()
+        cache.clear()
+        for section in self.sections[1:]:
+            Enrollment.objects.create(student=self.student, section=section)
+        self.assertEqual(self.queries(), one_enrollment)
+        self.assertEqual(get_dashboard(self.student)['total_courses'], 3)
+
+    def test_cached_dashboard_runs_no_queries(self):
+        get_dashboard(self.student)
+        student = Student.objects.get(pk=self.student.pk)
+        with self.assertNumQueries(0):
+            get_dashboard(student)
+
+    def test_new_assignment_invalidates_the_section(self):
+        self.assertEqual(get_dashboard(self.student)['pending_assignments'], 0)
+        Assignment.objects.create(section=self.sections[0], title='Homework', description='d', total_marks=10,
+                                  due_date=timezone.now() + datetime.timedelta(days=1), status='published',
+                                  created_by=self.teacher)
+        self.assertEqual(get_dashboard(self.student)['pending_assignments'], 1)
+
+    def test_attendance_invalidates_the_section(self):
+        get_dashboard(self.student)
+        upsert_attendance(self.sections[0], [(self.student.pk, datetime.date(2025, 1, 6), 'present', '')],
+                          self.teacher)
+        self.assertEqual(get_dashboard(self.student)['attendance_stats'][self.sections[0].id]['attended'], 1)
+
+    def test_forum_post_invalidates_the_student(self):
+        discussion = Discussion.objects.create(section=self.sections[0], author=self.teacher, title='Q',
+                                               content='c')
+        before = get_dashboard(self.student)['spi_score']
+        Comment.objects.create(discussion=discussion, author=self.user, content='answer')
+        self.assertEqual(get_dashboard(self.student)['spi_score'], before + 1)
+
+    def test_bulk_enrollment_invalidates_the_dashboard(self):
+        self.assertEqual(get_dashboard(self.student)['total_courses'], 1)
+        self.client.login(username='admin', password='pw')
+        response = self.client.post(reverse('bulk_enroll_existing_students'))
+        self.assertRedirects(response, reverse('student_list'), fetch_redirect_response=False)
+        self.assertEqual(get_dashboard(self.student)['total_courses'], 3)
 
-# Create your tests here.
+    def test_dashboard_view(self):
+        self.client.login(username='student', password='pw')
+        response = self.client.get(reverse('student_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_courses'], 1)
+        self.assertEqual(response.context['spi_score'], build_dashboard(self.student)['spi_score'])
@@ -6,8 +6,9 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count, Avg, Q
+from django.db.models import Count, Avg, Q, Sum
 from .models import User
+from .student_dashboard import get_dashboard
 from colleges.models import Student, Teacher, Department, ClassSection
 from courses.models import Assignment, Submission, Attendance
 from quizzes.models import Quiz, QuizAttempt
@@ -116,10 +117,9 @@ def teacher_dashboard(request):
     total_students = sum(section.get_enrolled_count() for section in sections)
     
     # Pending assignments to grade
-    pending_submissions = Submission.objects.filter(
-        assignment__section__teacher=request.user,
-        status='submitted'
-    ).count()
+    pending_submissions = Assignment.objects.filter(
+        section__teacher=request.user
+    ).aggregate(pending=Sum('pending_count'))['pending'] or 0
     
     # Recent activities
     recent_submissions = Submission.objects.filter(
@@ -157,81 +157,8 @@ def student_dashboard(request):
         messages.error(request, 'Student profile not found.')
         return redirect('dashboard')
     
-    # Get enrolled sections
-    from colleges.models import Enrollment
-    enrollments = Enrollment.objects.filter(
-        student=student, is_active=True
-    ).select_related('section__course')
-    
-    # Calculate SPI
-    spi_score = student.calculate_spi()
-    
-    # Statistics
-    total_courses = enrollments.count()
-    
-    # Pending assignments
-    from django.utils import timezone
-    pending_assignments = Assignment.objects.filter(
-        section__enrollments__student=student,
-        status='published',
-        due_date__gte=timezone.now()
-    ).exclude(
-        submissions__student=student
-    ).count()
-    
-    # Recent submissions
-    recent_submissions = Submission.objects.filter(
-        student=student
-    ).select_related('assignment').order_by('-submitted_at')[:5]
-    
-    # Upcoming quizzes
-    upcoming_quizzes = Quiz.objects.filter(
-        section__enrollments__student=student,
-        start_time__gte=timezone.now(),
-        is_active=True
-    ).order_by('start_time')[:5]
-    
-    # Attendance percentage
-    attendance_stats = {}
-    for enrollment in enrollments:
-        total_classes = Attendance.objects.filter(
-            section=enrollment.section
-        ).values('date').distinct().count()
-        
-        attended = Attendance.objects.filter(
-            section=enrollment.section,
-            student=request.user,
-            status='present'
-        ).count()
-        
-        if total_classes > 0:
-            percentage = round((attended / total_classes) * 100, 2)
-        else:
-            percentage = 0
-        
-        attendance_stats[enrollment.section.id] = {
-            'attended': attended,
-            'total': total_classes,
-            'percentage': percentage
-        }
-    
-    # Recent badges
-    from discussions.models import StudentBadge
-    recent_badges = StudentBadge.objects.filter(
-        student=student
-    ).select_related('badge').order_by('-earned_date')[:3]
-    
-    context = {
-        'student': student,
-        'enrollments': enrollments,
-        'spi_score': spi_score,
-        'total_courses': total_courses,
-        'pending_assignments': pending_assignments,
-        'recent_submissions': recent_submissions,
-        'upcoming_quizzes': upcoming_quizzes,
-        'attendance_stats': attendance_stats,
-        'recent_badges': recent_badges,
-    }
+    context = {'student': student}
+    context.update(get_dashboard(student))
     
     return render(request, 'student/dashboard.html', context)
 
@@ -0,0 +1,163 @@
+# analytics/counters.py
+"""
+Buffered counters for hot integer fields (material downloads, discussion views).
+
+``increment`` adds to a counter in the cache instead of writing the row. Pending
+counts are written with ``flush`` - one ``UPDATE ... SET field = field + CASE ...``
+per model/field batch - either from the request path at most once every
+``COUNTER_FLUSH_INTERVAL`` seconds or from the ``flush_counters`` management command.
+
+The database is updated before the cached counts are decremented, and a failed
+flush puts the keys it took back in the pending set, so its counts are written by
+the next flush rather than lost.
+
+Counts live in the ``COUNTER_CACHE_ALIAS`` cache, and only as long as that cache
+keeps them: a cache that evicts keys without an expiry (LocMemCache past its
+``MAX_ENTRIES``, Memcached) loses the counts it evicts. If the pending set itself
+is evicted, the next increment of each counter registers it again. With a
+per-process cache (LocMemCache) every worker buffers and flushes its own counts;
+with a shared cache (Redis) ``flush_counters`` can be run from cron as well.
+
+``counters_flushed`` is sent after each batch is written (``sender`` is the
+model, with ``field`` and ``pks``) for code that derives values from counters.
+"""
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.dispatch import Signal
+from django.utils.connection import ConnectionProxy
+
+COUNTER_KEY = 'counter:{label}:{field}:{pk}'
+PENDING_KEY = 'counters:pending'
+FLUSH_KEY = 'counters:flushed'
+BATCH_SIZE = 500
+
+counter_cache = ConnectionProxy(caches, getattr(settings, 'COUNTER_CACHE_ALIAS', DEFAULT_CACHE_ALIAS))
+counters_flushed = Signal()
+
+
+def _counter_key(label, field, pk):
+    return COUNTER_KEY.format(label=label, field=field, pk=pk)
+
+
+@contextmanager
+def cache_lock(key, timeout=5):
+    """
+    Hold a short-lived lock stored in the cache under ``key``.
+
+    The lock expires after ``timeout`` seconds, so a holder that died blocks the
+    others only until then. It is only released by the holder that took it: one
+    that overran its timeout leaves alone the lock another worker now holds.
+    """
+    token = uuid.uuid4().hex
+    while not counter_cache.add(key, token, timeout):
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        if counter_cache.get(key) == token:
+            counter_cache.delete(key)
+
+
+def update_pending_set(key, add=(), pop=False):
+    """
+    Add entries to the set of buffered keys stored under ``key``; with ``pop`` also
+    take the whole set. Only the first write of a buffered value registers it here.
+    """
+    with cache_lock(f'{key}:lock'):
+        pending = counter_cache.get(key) or set()
+        pending.update(add)
+        if pop:
+            counter_cache.delete(key)
+            return pending
+        counter_cache.set(key, pending, None)
+        return None
+
+
+def _update_pending(add=(), pop=False):
+    """Add ``(label, field, pk)`` entries to the pending set; with ``pop`` also take it."""
+    return update_pending_set(PENDING_KEY, add=add, pop=pop)
+
+
+def increment(instance, field, amount=1):
+    """Add ``amount`` to ``instance.<field>``, buffered in the cache."""
+    label = instance._meta.label_lower
+    key = _counter_key(label, field, instance.pk)
+    try:
+        value = counter_cache.incr(key, amount)
+    except ValueError:
+        if counter_cache.add(key, amount, None):
+            value = amount
+        else:
+            value = counter_cache.incr(key, amount)
+
+    # Only the increment that starts a counter from zero registers it as pending,
+    # unless the pending set was evicted from the cache
+    if value == amount or PENDING_KEY not in counter_cache:
+        _update_pending(add=[(label, field, instance.pk)])
+
+    maybe_flush()
+
+
+def pending_count(instance, field):
+    """Increments of ``instance.<field>`` not yet written to the database."""
+    return counter_cache.get(_counter_key(instance._meta.label_lower, field, instance.pk)) or 0
+
+
+def maybe_flush():
+    """Flush if no flush has happened in the last ``COUNTER_FLUSH_INTERVAL`` seconds."""
+    interval = getattr(settings, 'COUNTER_FLUSH_INTERVAL', 60)
+    if counter_cache.add(FLUSH_KEY, 1, interval):
+        flush()
+
+
+def flush():
+    """Write all pending counts to the database. Returns the number of rows updated."""
+    pending = _update_pending(pop=True)
+    if not pending:
+        return 0
+
+    grouped = defaultdict(list)
+    for label, field, pk in pending:
+        grouped[(label, field)].append(pk)
+
+    updated = 0
+    requeue = []
+    try:
+        for (label, field), pks in grouped.items():
+            model = apps.get_model(label)
+            for start in range(0, len(pks), BATCH_SIZE):
+                keys = {_counter_key(label, field, pk): pk for pk in pks[start:start + BATCH_SIZE]}
+                counts = {keys[key]: value for key, value in counter_cache.get_many(list(keys)).items() if value}
+                if not counts:
+                    continue
+
+                with transaction.atomic():
+                    updated += model.objects.filter(pk__in=counts).update(**{
+                        field: F(field) + Case(
+                            *[When(pk=pk, then=Value(value)) for pk, value in counts.items()],
+                            default=Value(0),
+                            output_field=IntegerField(),
+                        )
+                    })
+
+                for pk, value in counts.items():
+                    # Increments made since get_many() stay in the cache for the next flush
+                    if counter_cache.decr(_counter_key(label, field, pk), value):
+                        requeue.append((label, field, pk))
+                counters_flushed.send(sender=model, field=field, pks=list(counts))
+    except Exception:
+        # Put every taken key back; keys already written hold 0 and are dropped next time
+        _update_pending(add=list(pending) + requeue)
+        raise
+
+    if requeue:
+        _update_pending(add=requeue)
+    return updated
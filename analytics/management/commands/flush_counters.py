@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from analytics.counters import flush
+
+
+class Command(BaseCommand):
+    help = 'Write buffered download/view counts from the counters cache to the database.'
+
+    def handle(self, *args, **options):
+        updated = flush()
+        self.stdout.write(self.style.SUCCESS(f'Flushed counters for {updated} rows.'))
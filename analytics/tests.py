@@ -1,3 +1,143 @@
-from django.test import TestCase
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import College, User
+from colleges.models import ClassSection, Course, Department
+from discussions.models import Discussion
+from . import counters
+from .counters import counter_cache
+
+
+@override_settings(COUNTER_FLUSH_INTERVAL=60)
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        college = College.objects.create(name='College', code='C1', address='a', established_year=2000,
+                                         contact_email='c@example.com', contact_phone='1')
+        department = Department.objects.create(college=college, name='Computer Science', code='CS')
+        course = Course.objects.create(department=department, name='Algorithms', code='CS101', credits=4, semester=1)
+        cls.teacher = User.objects.create_user('teacher', password='pw', role='teacher', college=college)
+        section = ClassSection.objects.create(course=course, section_name='A', academic_year='2024-2025', year=1,
+                                              teacher=cls.teacher)
+        cls.discussions = [
+            Discussion.objects.create(section=section, author=cls.teacher, title=f'Topic {number}', content='c')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        counter_cache.clear()
+        # Keep increment() from flushing on its own unless a test asks for it
+        counter_cache.add(counters.FLUSH_KEY, 1, 60)
+
+    def views(self):
+        return list(Discussion.objects.order_by('title').values_list('views_count', flat=True))
+
+    def test_increments_are_buffered(self):
+        first = self.discussions[0]
+        for _ in range(3):
+            counters.increment(first, 'views_count')
+        self.assertEqual(counters.pending_count(first, 'views_count'), 3)
+        self.assertEqual(self.views(), [0, 0, 0])
+
+    def test_flush_writes_every_row_with_one_update(self):
+        for views, discussion in zip([1, 2, 3], self.discussions):
+            for _ in range(views):
+                counters.increment(discussion, 'views_count')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(counters.flush(), 3)
+        updates = [query['sql'] for query in queries.captured_queries if 'SET "views_count"' in query['sql']]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.views(), [1, 2, 3])
+        self.assertEqual(counters.pending_count(self.discussions[0], 'views_count'), 0)
+        self.assertEqual(counters.flush(), 0)
+
+    def test_failed_flush_keeps_the_counts_pending(self):
+        first = self.discussions[0]
+        for _ in range(3):
+            counters.increment(first, 'views_count')
+        with mock.patch.object(QuerySet, 'update', side_effect=DatabaseError('database is down')):
+            with self.assertRaises(DatabaseError):
+                counters.flush()
+        self.assertEqual(self.views(), [0, 0, 0])
+        self.assertEqual(counters.pending_count(first, 'views_count'), 3)
+
+        self.assertEqual(counters.flush(), 1)
+        self.assertEqual(self.views(), [3, 0, 0])
+
+        # The key stays registered for increments after the failure
+        counters.increment(first, 'views_count')
+        counters.flush()
+        self.assertEqual(self.views(), [4, 0, 0])
+
+    def test_flushed_signal(self):
+        received = []
+
+        def handler(sender, field, pks, **kwargs):
+            received.append((sender, field, sorted(pks)))
+
+        counters.counters_flushed.connect(handler)
+        self.addCleanup(counters.counters_flushed.disconnect, handler)
+        for discussion in self.discussions[:2]:
+            counters.increment(discussion, 'views_count')
+        counters.flush()
+        self.assertEqual(received, [(Discussion, 'views_count', sorted(d.pk for d in self.discussions[:2]))])
+
+    def test_request_path_flushes_once_per_interval(self):
+        counter_cache.delete(counters.FLUSH_KEY)
+        first = self.discussions[0]
+        counters.increment(first, 'views_count')
+        counters.increment(first, 'views_count')
+        self.assertEqual(self.views(), [1, 0, 0])
+        self.assertEqual(counters.pending_count(first, 'views_count'), 1)
+
+    def test_discussion_views_are_counted(self):
+        self.client.login(username='teacher', password='pw')
+        self.client.get(reverse('discussion_detail', args=[self.discussions[0].pk]))
+        self.assertEqual(counters.pending_count(self.discussions[0], 'views_count'), 1)
+
+    def test_flush_counters_command(self):
+        counters.increment(self.discussions[1], 'views_count')
+        out = StringIO()
+        call_command('flush_counters', stdout=out)
+        self.assertIn('Flushed counters for 1 rows.', out.getvalue())
+        self.assertEqual(self.views(), [0, 1, 0])
+
+    def test_evicted_pending_set_is_rebuilt(self):
+        first = self.discussions[0]
+        counters.increment(first, 'views_count')
+        counters.increment(first, 'views_count')
+        counter_cache.delete(counters.PENDING_KEY)
+        counters.increment(first, 'views_count')
+        counters.flush()
+        self.assertEqual(self.views(), [3, 0, 0])
+
+
+class CacheLockTests(TestCase):
+    def setUp(self):
+        counter_cache.clear()
+
+    def test_lock_is_released_by_its_holder(self):
+        with counters.cache_lock('test:lock'):
+            self.assertFalse(counter_cache.add('test:lock', 'other', 5))
+        self.assertTrue(counter_cache.add('test:lock', 'other', 5))
+
+    def test_expired_holder_does_not_release_the_next_holders_lock(self):
+        with counters.cache_lock('test:lock', timeout=1):
+            # The lock expired and another worker took it
+            counter_cache.set('test:lock', 'other', 5)
+        self.assertEqual(counter_cache.get('test:lock'), 'other')
+
+    def test_waiters_do_not_steal_a_held_lock(self):
+        counter_cache.add('test:lock', 'other', 1)
+        started = time.monotonic()
+        with counters.cache_lock('test:lock', timeout=0.01):
+            # Acquired only once the other holder's lock expired on its own
+            self.assertGreater(time.monotonic() - started, 0.5)
@@ -3,7 +3,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Avg, Count, Q, F
+from django.db.models import Avg, Count, Q, F, Sum
 from django.utils import timezone
 from datetime import timedelta
 
@@ -82,7 +82,7 @@ def analytics_dashboard(request):
             section__teacher=user
         ).aggregate(
             total=Count('id'),
-            pending_grading=Count('id', filter=Q(submissions__status='submitted'))
+            pending_grading=Sum('pending_count')
         )
         
         # Attendance overview
@@ -0,0 +1,16 @@
+# colleges/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Enrollment, Student
+from .student_context import invalidate_student_context
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def enrollment_changed(sender, instance, **kwargs):
+    invalidate_student_context(instance.student_id)
+
+
+@receiver([post_save, post_delete], sender=Student)
+def student_changed(sender, instance, **kwargs):
+    invalidate_student_context(instance.pk)
@@ -0,0 +1,75 @@
+# colleges/student_context.py
+"""
+Cached "student context" used by the access checks in the course, quiz and
+discussion views.
+
+A student's profile row and the ids of the sections they are actively enrolled in
+are loaded once, kept on the request for the rest of the request and in the cache
+across requests. Enrollment and Student changes invalidate the cached entry
+(see ``colleges.signals``); code that writes enrollments with ``bulk_create`` or
+``update()`` must call ``invalidate_student_context`` itself.
+"""
+from django.core.cache import cache
+
+from .models import Enrollment, Student
+
+CACHE_KEY = 'student_context:{user_id}'
+CACHE_TIMEOUT = 60 * 15  # 15 minutes
+
+_MISSING = object()
+
+
+class StudentContext:
+    """A student and the set of section ids they are actively enrolled in."""
+
+    def __init__(self, student, section_ids):
+        self.student = student
+        self.section_ids = frozenset(section_ids)
+
+    def is_enrolled(self, section):
+        """``section`` may be a ClassSection or a section id."""
+        section_id = getattr(section, 'pk', section)
+        return section_id in self.section_ids
+
+
+def _cache_key(user_id):
+    return CACHE_KEY.format(user_id=user_id)
+
+
+def get_student_context(request):
+    """
+    Return the ``StudentContext`` for ``request.user``, or ``None`` when the user
+    has no student profile.
+    """
+    context = getattr(request, '_student_context', _MISSING)
+    if context is not _MISSING:
+        return context
+
+    user = request.user
+    context = None
+
+    if user.is_authenticated:
+        key = _cache_key(user.pk)
+        cached = cache.get(key)
+        if cached is None:
+            student = Student.objects.filter(user=user).first()
+            if student is not None:
+                section_ids = list(
+                    Enrollment.objects.filter(student=student, is_active=True).values_list('section_id', flat=True)
+                )
+                cached = (student, section_ids)
+                cache.set(key, cached, CACHE_TIMEOUT)
+
+        if cached is not None:
+            student, section_ids = cached
+            # Reuse the request's user instead of loading it again through student.user
+            student.user = user
+            context = StudentContext(student, section_ids)
+
+    request._student_context = context
+    return context
+
+
+def invalidate_student_context(*user_ids):
+    """Drop cached contexts for the given student user ids (Student pks)."""
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
@@ -1,3 +1,79 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import College, User
+from .models import ClassSection, Course, Department, Enrollment, Student, Teacher
+from .student_context import get_student_context
+
+
+class StudentContextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        college = College.objects.create(name='College', code='C1', address='a', established_year=2000,
+                                         contact_email='c@example.com', contact_phone='1')
+        department = Department.objects.create(college=college, name='Computer Science', code='CS')
+        teacher = User.objects.create_user('teacher', password='pw', role='teacher', college=college)
+        Teacher.objects.create(user=teacher, department=department, employee_id='E1', qualification='q',
+                               specialization='s', joining_date=datetime.date(2020, 1, 1))
+        cls.sections = [
+            ClassSection.objects.create(
+                course=Course.objects.create(department=department, name=f'Course {number}', code=f'CS{number}',
+                                             credits=3, semester=1),
+                section_name='A', academic_year='2024-2025', year=1, teacher=teacher,
+            )
+            for number in range(2)
+        ]
+        cls.admin = User.objects.create_user('admin', password='pw', role='college_admin', college=college)
+        cls.user = User.objects.create_user('student', password='pw', role='student', college=college)
+        cls.student = Student.objects.create(user=cls.user, department=department, roll_number='R001',
+                                             admission_year=2024, current_semester=1, guardian_name='g',
+                                             guardian_phone='1')
+        Enrollment.objects.create(student=cls.student, section=cls.sections[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def request(self, user=None):
+        request = RequestFactory().get('/')
+        request.user = user or self.user
+        return request
+
+    def test_context_is_cached_across_requests(self):
+        with CaptureQueriesContext(connection) as first:
+            context = get_student_context(self.request())
+        self.assertEqual(len(first.captured_queries), 2)
+        self.assertEqual(context.student, self.student)
+        self.assertTrue(context.is_enrolled(self.sections[0]))
+        self.assertFalse(context.is_enrolled(self.sections[1].id))
+
+        with self.assertNumQueries(0):
+            context = get_student_context(self.request())
+            self.assertIs(context.student.user, self.user)
+
+    def test_context_is_kept_on_the_request(self):
+        request = self.request()
+        self.assertIs(get_student_context(request), get_student_context(request))
+
+    def test_non_students_have_no_context(self):
+        self.assertIsNone(get_student_context(self.request(self.admin)))
+
+    def test_enrollment_changes_invalidate_the_context(self):
+        get_student_context(self.request())
+        enrollment = Enrollment.objects.create(student=self.student, section=self.sections[1])
+        self.assertTrue(get_student_context(self.request()).is_enrolled(self.sections[1]))
+
+        enrollment.is_active = False
+        enrollment.save()
+        self.assertFalse(get_student_context(self.request()).is_enrolled(self.sections[1]))
+
+    def test_bulk_enrollment_invalidates_the_context(self):
+        get_student_context(self.request())
+        self.client.login(username='admin', password='pw')
+        response = self.client.post(reverse('bulk_enroll_existing_students'))
+        self.assertRedirects(response, reverse('student_list'), fetch_redirect_response=False)
+        self.assertTrue(get_student_context(self.request()).is_enrolled(self.sections[1]))
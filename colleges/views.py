@@ -5,6 +5,8 @@ from django.contrib import messages
 from django.db.models import Q
 from django.contrib.auth import get_user_model
 from .models import Department, Course, ClassSection, Teacher, Student, Enrollment
+from accounts.student_dashboard import invalidate_student_dashboard
+from .student_context import invalidate_student_context
 from .forms import (DepartmentForm, CourseForm, ClassSectionForm, 
                    TeacherForm, StudentForm, EnrollmentForm)
 
@@ -463,6 +465,11 @@ def bulk_enroll_existing_students(request):
             created_enrollments = Enrollment.objects.bulk_create(new_enrollments, ignore_conflicts=True)
             total_new_enrollments += len(created_enrollments)
 
+        # bulk_create does not send post_save, so drop the cached enrolled-section sets and dashboards here
+        student_ids = [student.pk for student in students]
+        invalidate_student_context(*student_ids)
+        invalidate_student_dashboard(*student_ids)
+
         messages.success(request, f'Bulk enrollment complete. Created {total_new_enrollments} new enrollment records for students in your college.')
         return redirect('student_list') # Redirect to student list or dashboard
     
@@ -520,6 +527,8 @@ def student_register(request):
 
             # Bulk create all new enrollments at once
             Enrollment.objects.bulk_create(new_enrollments, ignore_conflicts=True)
+            invalidate_student_context(student.pk)
+            invalidate_student_dashboard(student.pk)
 
             # --- END AUTO-ENROLLMENT LOGIC ---
             
@@ -0,0 +1,247 @@
+# courses/attendance.py
+"""
+Bulk attendance writes and CSV import.
+
+Attendance rows are upserted with ``bulk_create(update_conflicts=True)`` keyed on
+the model's (section, student, date) unique constraint, so marking a whole class -
+or a whole week of classes - is a handful of INSERT ... ON CONFLICT statements
+instead of a SELECT plus an INSERT/UPDATE per student and day.
+"""
+import codecs
+import csv
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from accounts.student_dashboard import bump_section_dashboard_version
+from colleges.models import Enrollment
+from .models import Attendance
+
+BATCH_SIZE = 500
+ATTENDANCE_STATUSES = {value for value, _ in Attendance.STATUS_CHOICES}
+
+# Single-letter codes used in paper registers
+STATUS_CODES = {'p': 'present', 'a': 'absent', 'l': 'late', 'e': 'excused'}
+DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y']
+MAX_REPORTED_ERRORS = 50
+
+
+def enrolled_students(section):
+    """Map roll number -> student user id for the section's active enrollments (one query)."""
+    return dict(
+        Enrollment.objects.filter(section=section, is_active=True)
+        .values_list('student__roll_number', 'student_id')
+    )
+
+
+def _write_batch(batch):
+    Attendance.objects.bulk_create(
+        batch.values(),
+        update_conflicts=True,
+        unique_fields=['section', 'student', 'date'],
+        update_fields=['status', 'remarks', 'marked_by', 'marked_at'],
+    )
+    return len(batch)
+
+
+@transaction.atomic
+def upsert_attendance(section, records, marked_by, batch_size=BATCH_SIZE):
+    """
+    Insert or update attendance for ``section``.
+
+    ``records`` is any iterable of ``(student_user_id, date, status, remarks)``
+    tuples; it is consumed lazily and written in batches, so a generator over a
+    large file keeps memory bounded. Later records for the same student and date
+    win. Returns the number of rows written.
+    """
+    saved = 0
+    batch = {}
+    for student_id, date, status, remarks in records:
+        # Keyed so a student/date repeated within a batch is only written once
+        batch[(student_id, date)] = Attendance(
+            section=section,
+            student_id=student_id,
+            date=date,
+            status=status,
+            remarks=remarks or '',
+            marked_by=marked_by,
+        )
+        if len(batch) >= batch_size:
+            saved += _write_batch(batch)
+            batch = {}
+    if batch:
+        saved += _write_batch(batch)
+    # bulk_create sends no signals; attendance feeds every student's dashboard
+    bump_section_dashboard_version(section.id)
+    return saved
+
+
+def parse_attendance_grid(section, grid):
+    """
+    Validate an attendance grid of the form::
+
+        {"2025-01-06": {"R001": "present", "R002": {"status": "absent", "remarks": "sick"}}, ...}
+
+    Students are identified by roll number and must be actively enrolled in the
+    section. Returns ``(records, errors)`` where records suit ``upsert_attendance``.
+    """
+    if not isinstance(grid, dict) or not grid:
+        return [], ['"attendance" must map dates to {roll number: status} objects.']
+
+    students = enrolled_students(section)
+    records, errors = [], []
+
+    for date_value, marks in grid.items():
+        try:
+            date = datetime.date.fromisoformat(date_value)
+        except ValueError:
+            errors.append(f'{date_value}: not a valid date (use YYYY-MM-DD).')
+            continue
+        if not isinstance(marks, dict):
+            errors.append(f'{date_value}: expected an object of roll number to status.')
+            continue
+
+        for roll_number, mark in marks.items():
+            if isinstance(mark, dict):
+                status, remarks = mark.get('status'), mark.get('remarks', '')
+            else:
+                status, remarks = mark, ''
+
+            if roll_number not in students:
+                errors.append(f'{date_value}: {roll_number} is not enrolled in this section.')
+            elif status not in ATTENDANCE_STATUSES:
+                errors.append(f'{date_value}: invalid status "{status}" for {roll_number}.')
+            else:
+                records.append((students[roll_number], date, status, str(remarks or '')))
+
+    return records, errors
+
+
+class _ErrorList(list):
+    """Keeps the first MAX_REPORTED_ERRORS messages and counts the rest."""
+
+    def __init__(self):
+        super().__init__()
+        self.total = 0
+
+    def add(self, message):
+        self.total += 1
+        if len(self) < MAX_REPORTED_ERRORS:
+            self.append(message)
+
+    def messages(self):
+        if self.total > len(self):
+            return self + [f'... and {self.total - len(self)} more errors.']
+        return list(self)
+
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_status(value):
+    value = value.strip().lower()
+    return STATUS_CODES.get(value, value)
+
+
+def _iter_csv_records(reader, students, errors):
+    """
+    Yield ``(student_id, date, status, remarks)`` records from a CSV reader.
+
+    Two layouts are understood:
+
+    * register - ``roll_number, <date>, <date>, ...`` with one row per student and a
+      status (or P/A/L/E code) per day; blank cells are skipped.
+    * long - ``roll_number, date, status[, remarks]`` with one row per mark.
+
+    Problems are collected in ``errors`` instead of stopping the import.
+    """
+    header = [column.strip().lower() for column in next(reader, [])]
+    if 'roll_number' not in header:
+        errors.add('The first row must be a header with a "roll_number" column.')
+        return
+    roll_index = header.index('roll_number')
+
+    long_format = 'date' in header and 'status' in header
+    if long_format:
+        date_index, status_index = header.index('date'), header.index('status')
+        remarks_index = header.index('remarks') if 'remarks' in header else None
+    else:
+        date_columns = []
+        for index, column in enumerate(header):
+            if index == roll_index or not column:
+                continue
+            date = _parse_date(column)
+            if date is None:
+                errors.add(f'Header: "{column}" is not a date (use YYYY-MM-DD or DD-MM-YYYY).')
+            else:
+                date_columns.append((index, date))
+        if not date_columns:
+            errors.add('The header has no date columns.')
+            return
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        line = reader.line_num
+
+        roll_number = row[roll_index].strip() if roll_index < len(row) else ''
+        student_id = students.get(roll_number)
+        if student_id is None:
+            errors.add(f'Line {line}: "{roll_number}" is not enrolled in this section.')
+            continue
+
+        if long_format:
+            cell = lambda index: row[index].strip() if index is not None and index < len(row) else ''
+            date_value, status_value = cell(date_index), cell(status_index)
+            date = _parse_date(date_value)
+            status = _parse_status(status_value)
+            if date is None:
+                errors.add(f'Line {line}: "{date_value}" is not a valid date.')
+            elif status not in ATTENDANCE_STATUSES:
+                errors.add(f'Line {line}: invalid status "{status_value}".')
+            else:
+                yield student_id, date, status, cell(remarks_index)
+        else:
+            for index, date in date_columns:
+                value = row[index].strip() if index < len(row) else ''
+                if not value:
+                    continue
+                status = _parse_status(value)
+                if status not in ATTENDANCE_STATUSES:
+                    errors.add(f'Line {line}, {date:%Y-%m-%d}: invalid status "{value}".')
+                else:
+                    yield student_id, date, status, ''
+
+
+def import_attendance_csv(section, uploaded_file, marked_by):
+    """
+    Stream an attendance CSV into ``section``.
+
+    The file is read row by row and written in batched upserts; roll numbers are
+    checked against one in-memory map of the section's enrollments. If any row is
+    invalid the whole import is rolled back and ``ValidationError`` lists the
+    problems. Returns the number of attendance rows written.
+    """
+    students = enrolled_students(section)
+    errors = _ErrorList()
+    reader = csv.reader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+
+    try:
+        with transaction.atomic():
+            saved = upsert_attendance(section, _iter_csv_records(reader, students, errors), marked_by)
+            if errors.total:
+                # Undo the batches already written
+                raise ValidationError(errors.messages())
+    except (csv.Error, UnicodeDecodeError) as exc:
+        raise ValidationError(f'Invalid CSV file: {exc}')
+
+    if not saved:
+        raise ValidationError('The file does not contain any attendance marks.')
+    return saved
@@ -0,0 +1,37 @@
+# courses/content_cache.py
+"""
+Per-section content version for the fragment cache of ``course_detail``.
+
+The materials, assignments and announcements blocks of the course page are
+cached with ``{% cache %}`` keyed on the section's content version (and the
+viewer's role). Saving or deleting a StudyMaterial, Assignment or Announcement
+bumps the version (``courses.signals``), so the next request re-renders the
+blocks and stale fragments simply expire.
+"""
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'section_content_version:{section_id}'
+FRAGMENT_TIMEOUT = 60 * 60 * 24  # 24 hours; versions make explicit deletes unnecessary
+
+
+def _key(section_id):
+    return VERSION_KEY.format(section_id=section_id)
+
+
+def get_section_content_version(section_id):
+    key = _key(section_id)
+    version = cache.get(key)
+    if version is None:
+        # Time-based start so a version lost from the cache never reuses an old number
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_section_content_version(section_id):
+    try:
+        cache.incr(_key(section_id))
+    except ValueError:
+        get_section_content_version(section_id)
@@ -0,0 +1,12 @@
+# courses/context_processors.py
+from django.utils.functional import SimpleLazyObject
+
+from .inbox import unread_count
+
+
+def inbox(request):
+    """``unread_announcements`` for the navbar; only queried when a template uses it."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated or user.role != 'student':
+        return {}
+    return {'unread_announcements': SimpleLazyObject(lambda: unread_count(user))}
@@ -0,0 +1,243 @@
+# courses/downloads.py
+"""
+File delivery for protected media (study materials).
+
+Views run their access checks and then call ``serve_file``. Depending on
+``settings.MEDIA_DELIVERY_MODE`` the bytes are sent by:
+
+* ``'x-accel-redirect'`` - nginx, via an ``internal`` location that maps
+  ``MEDIA_ACCEL_REDIRECT_PREFIX`` to ``MEDIA_ROOT``;
+* ``'x-sendfile'`` - Apache mod_xsendfile / lighttpd, using the file's path;
+* ``'django'`` (default) - the worker itself. This fallback answers
+  ``If-None-Match`` with 304 and single ``Range`` requests with 206, so
+  videos can be resumed and seeked even without a front proxy.
+
+``iter_submissions_zip`` builds a ZIP archive of an assignment's submissions on
+the fly for a ``StreamingHttpResponse``.
+"""
+import csv
+import io
+import mimetypes
+import os
+import re
+import zipfile
+import zlib
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header, http_date, parse_etags, parse_http_date_safe
+from django.utils.text import get_valid_filename
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+UNSATISFIABLE = object()
+
+
+def _file_validators(field_file):
+    """Return ``(size, modified timestamp or None, etag)`` for a stored file."""
+    size = field_file.size
+    try:
+        modified = field_file.storage.get_modified_time(field_file.name).timestamp()
+    except (NotImplementedError, OSError):
+        modified = None
+
+    if modified is not None:
+        etag = '"%x-%x"' % (size, int(modified * 1000))
+    else:
+        etag = '"%x-%x"' % (size, zlib.crc32(field_file.name.encode()))
+    return size, modified, etag
+
+
+def _parse_range(header, size):
+    """
+    Parse a single ``bytes=`` range. Returns ``(start, end)`` (inclusive), ``None``
+    when the header should be ignored (multiple or malformed ranges), or
+    ``UNSATISFIABLE``.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return UNSATISFIABLE
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        return UNSATISFIABLE
+    end = int(end) if end else size - 1
+    return start, min(end, size - 1)
+
+
+def _iter_range(file, start, length):
+    try:
+        file.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _django_response(request, field_file, content_type):
+    size, modified, etag = _file_validators(field_file)
+    last_modified = http_date(modified) if modified is not None else None
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        if etags == ['*'] or etag in etags:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.method in ('GET', 'HEAD'):
+        if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+        if not if_range or if_range == etag or (
+            modified is not None and parse_http_date_safe(if_range) == int(modified)
+        ):
+            byte_range = _parse_range(range_header, size)
+
+    if byte_range is UNSATISFIABLE:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        file = field_file.storage.open(field_file.name, 'rb')
+        response = StreamingHttpResponse(_iter_range(file, start, length), status=206, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        file = field_file.storage.open(field_file.name, 'rb')
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = str(size)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = last_modified
+    return response
+
+
+def serve_file(request, field_file, as_attachment=True, filename=None):
+    """
+    Return a response delivering ``field_file``; call only after access checks.
+    ``filename`` is the name offered to the browser (defaults to the stored name).
+    """
+    filename = filename or os.path.basename(field_file.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    mode = getattr(settings, 'MEDIA_DELIVERY_MODE', 'django')
+
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(field_file.name)
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = field_file.path
+    else:
+        response = _django_response(request, field_file, content_type)
+
+    if response.status_code in (200, 206):
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+class _ZipStream:
+    """Write-only, unseekable sink for ``zipfile``; written bytes are collected by ``pop()``."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _zip_entry(name, size=0, compress_type=zipfile.ZIP_STORED, date_time=None):
+    info = zipfile.ZipInfo(name, date_time=date_time or (1980, 1, 1, 0, 0, 0))
+    info.compress_type = compress_type
+    info.file_size = size  # Lets zipfile pick ZIP64 up front for very large files
+    return info
+
+
+def iter_submissions_zip(assignment):
+    """
+    Yield a ZIP archive of every submission file of ``assignment``.
+
+    Files are named by roll number and a ``manifest.csv`` lists each student's
+    status and submission time. Because the sink is unseekable, ``zipfile`` writes
+    data descriptors after each entry, so the archive is produced piece by piece
+    and never held in memory or written to disk.
+    """
+    submissions = list(
+        assignment.submissions.select_related('student__user').order_by('student__roll_number')
+    )
+    stream = _ZipStream()
+
+    with zipfile.ZipFile(stream, 'w') as archive:
+        entries = []
+        for submission in submissions:
+            extension = os.path.splitext(submission.submission_file.name)[1]
+            entries.append((submission, get_valid_filename(submission.student.roll_number) + extension))
+
+        manifest = io.StringIO()
+        writer = csv.writer(manifest)
+        writer.writerow(['roll_number', 'student_name', 'status', 'submitted_at', 'marks_obtained', 'file'])
+        for submission, arcname in entries:
+            writer.writerow([
+                submission.student.roll_number,
+                submission.student.user.get_full_name(),
+                submission.status,
+                submission.submitted_at.isoformat(),
+                '' if submission.marks_obtained is None else submission.marks_obtained,
+                arcname if submission.submission_file else '',
+            ])
+        archive.writestr(_zip_entry('manifest.csv', compress_type=zipfile.ZIP_DEFLATED), manifest.getvalue())
+        yield stream.pop()
+
+        for submission, arcname in entries:
+            field_file = submission.submission_file
+            if not field_file:
+                continue
+            try:
+                source = field_file.storage.open(field_file.name, 'rb')
+            except FileNotFoundError:
+                continue
+            date_time = timezone.localtime(submission.submitted_at).timetuple()[:6]
+            with source, archive.open(_zip_entry(arcname, field_file.size, date_time=date_time), 'w') as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    target.write(chunk)
+                    yield stream.pop()
+            yield stream.pop()
+
+    # Central directory
+    yield stream.pop()
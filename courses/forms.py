@@ -1,5 +1,6 @@
 # courses/forms.py
 from django import forms
+from django.core.validators import FileExtensionValidator
 from .models import StudyMaterial, Assignment, Submission, Attendance, Announcement
 
 class StudyMaterialForm(forms.ModelForm):
@@ -49,6 +50,18 @@ class AttendanceForm(forms.ModelForm):
             'remarks': forms.TextInput(attrs={'class': 'form-control'}),
         }
 
+class AttendanceImportForm(forms.Form):
+    file = forms.FileField(
+        validators=[FileExtensionValidator(allowed_extensions=['csv'])],
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv'}),
+    )
+
+class GradeSheetImportForm(forms.Form):
+    file = forms.FileField(
+        validators=[FileExtensionValidator(allowed_extensions=['csv'])],
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv'}),
+    )
+
 class AnnouncementForm(forms.ModelForm):
     class Meta:
         model = Announcement
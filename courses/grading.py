@@ -0,0 +1,138 @@
+# courses/grading.py
+"""
+Spreadsheet (CSV) bulk grading of assignment submissions.
+
+A teacher exports the grade sheet of an assignment, fills in ``marks_obtained``
+and ``feedback`` and uploads it back. The whole sheet is validated first and
+then applied with one ``bulk_update`` in a single transaction, instead of one
+``grade_submission`` POST per student.
+"""
+import codecs
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.student_dashboard import invalidate_student_dashboard
+from educational_portal.csv_export import StreamingWriter, unescape_formula
+
+from .models import Submission
+from .submission_counters import reconcile_submission_counters
+
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 50
+GRADE_SHEET_COLUMNS = [
+    'roll_number', 'student_name', 'status', 'submitted_at', 'late', 'max_marks', 'marks_obtained', 'feedback',
+]
+
+
+def max_marks(assignment, submission):
+    """Highest mark a submission may receive: late work loses the assignment's late penalty."""
+    total = Decimal(assignment.total_marks)
+    if submission.status == 'late' or submission.submitted_at > assignment.due_date:
+        total = total * (100 - assignment.late_penalty_percentage) / 100
+    return total.quantize(Decimal('0.01'))
+
+
+def _submissions(assignment):
+    return assignment.submissions.select_related('student__user').order_by('student__roll_number')
+
+
+def iter_grade_sheet(assignment):
+    """Yield CSV lines of the assignment's grade sheet, one row per submission."""
+    writer = StreamingWriter()
+    yield writer.writerow(GRADE_SHEET_COLUMNS)
+    for submission in _submissions(assignment).iterator(chunk_size=BATCH_SIZE):
+        limit = max_marks(assignment, submission)
+        yield writer.writerow([
+            submission.student.roll_number,
+            submission.student.user.get_full_name(),
+            submission.status,
+            timezone.localtime(submission.submitted_at).strftime('%Y-%m-%d %H:%M'),
+            'yes' if limit < assignment.total_marks else 'no',
+            limit,
+            '' if submission.marks_obtained is None else submission.marks_obtained,
+            submission.feedback,
+        ])
+
+
+def apply_grade_sheet(assignment, uploaded_file, grader):
+    """
+    Validate an uploaded grade sheet and grade every row that has marks.
+
+    Rows are matched to submissions by roll number; rows with blank marks are
+    skipped. Marks must be between 0 and the row's ``max_marks`` (total marks less
+    the late penalty for late submissions). If any row is invalid nothing is saved
+    and ``ValidationError`` lists the problems. Returns the number of submissions graded.
+    """
+    submissions = {submission.student.roll_number: submission for submission in _submissions(assignment)}
+    errors, graded, seen = [], [], set()
+
+    try:
+        reader = csv.DictReader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+        header = [column.strip().lower() for column in reader.fieldnames or []]
+        if 'roll_number' not in header or 'marks_obtained' not in header:
+            raise ValidationError('The first row must be a header with "roll_number" and "marks_obtained" columns.')
+        reader.fieldnames = header
+
+        now = timezone.now()
+        for row in reader:
+            line = reader.line_num
+            roll_number, marks_value, feedback = (
+                unescape_formula((row.get(column) or '').strip())
+                for column in ['roll_number', 'marks_obtained', 'feedback']
+            )
+            if not roll_number and not marks_value:
+                continue
+
+            submission = submissions.get(roll_number)
+            if submission is None:
+                errors.append(f'Line {line}: no submission from "{roll_number}" for this assignment.')
+                continue
+            if roll_number in seen:
+                errors.append(f'Line {line}: {roll_number} appears more than once.')
+                continue
+            seen.add(roll_number)
+
+            if not marks_value:
+                if feedback:
+                    errors.append(f'Line {line}: {roll_number} has feedback but no marks.')
+                continue
+            try:
+                marks = Decimal(marks_value)
+            except InvalidOperation:
+                errors.append(f'Line {line}: "{marks_value}" is not a valid mark.')
+                continue
+
+            limit = max_marks(assignment, submission)
+            if not marks.is_finite() or marks < 0 or marks > limit:
+                reason = ' after the late penalty' if limit < assignment.total_marks else ''
+                errors.append(f'Line {line}: marks for {roll_number} must be between 0 and {limit}{reason} (got {marks_value}).')
+                continue
+
+            submission.marks_obtained = marks.quantize(Decimal('0.01'))
+            submission.feedback = feedback
+            submission.status = 'graded'
+            submission.graded_by = grader
+            submission.graded_at = now
+            graded.append(submission)
+    except (csv.Error, UnicodeDecodeError) as exc:
+        raise ValidationError(f'Invalid CSV file: {exc}')
+
+    if errors:
+        if len(errors) > MAX_REPORTED_ERRORS:
+            errors = errors[:MAX_REPORTED_ERRORS] + [f'... and {len(errors) - MAX_REPORTED_ERRORS} more errors.']
+        raise ValidationError(errors)
+    if not graded:
+        raise ValidationError('The file does not contain any marks.')
+
+    with transaction.atomic():
+        Submission.objects.bulk_update(
+            graded, ['marks_obtained', 'feedback', 'status', 'graded_by', 'graded_at'], batch_size=BATCH_SIZE
+        )
+        # bulk_update skips the signals that maintain the assignment's counters
+        reconcile_submission_counters([assignment.id])
+    invalidate_student_dashboard(*{submission.student_id for submission in graded})
+    return len(graded)
@@ -0,0 +1,101 @@
+# courses/inbox.py
+"""
+Per-student announcement inbox (fan-out on write).
+
+When an announcement is created, one ``InboxItem`` per active enrollment of its
+section is inserted with ``bulk_create``. Reading the inbox is then a range scan
+of the student's own rows on the ``(user, -is_urgent, -created_at, -id)``
+index: urgent items first, newest first, paginated with an opaque keyset cursor
+instead of OFFSET. The unread count uses a partial index on unread rows.
+
+Students who enroll after an announcement was posted only receive it if the
+announcement is edited later.
+"""
+import base64
+import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+from colleges.models import Enrollment
+from .models import InboxItem
+
+BATCH_SIZE = 1000
+PAGE_SIZE = 20
+
+
+def fan_out(announcement):
+    """Deliver ``announcement`` to every active student of its section. Returns the number of items."""
+    student_ids = Enrollment.objects.filter(
+        section_id=announcement.section_id, is_active=True
+    ).values_list('student_id', flat=True)
+    items = [
+        InboxItem(
+            user_id=student_id,
+            announcement=announcement,
+            is_urgent=announcement.priority == 'urgent',
+            created_at=announcement.created_at,
+        )
+        for student_id in student_ids.iterator(chunk_size=BATCH_SIZE)
+    ]
+    InboxItem.objects.bulk_create(items, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return len(items)
+
+
+def sync_announcement(announcement):
+    """Propagate an edited announcement's priority and active flag to the inbox."""
+    if not announcement.is_active:
+        InboxItem.objects.filter(announcement=announcement).delete()
+        return
+    InboxItem.objects.filter(announcement=announcement).update(is_urgent=announcement.priority == 'urgent')
+    # Re-deliver if it was deactivated before; existing items are left alone
+    fan_out(announcement)
+
+
+def _encode_cursor(item):
+    raw = f'{int(item.is_urgent)}|{item.created_at.isoformat()}|{item.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        urgent, created_at, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return bool(int(urgent)), datetime.datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def inbox_page(user, cursor=None, page_size=PAGE_SIZE):
+    """
+    Return ``(items, next_cursor)`` for ``user``'s inbox.
+
+    ``next_cursor`` is None on the last page. An invalid cursor restarts from the top.
+    """
+    items = InboxItem.objects.filter(user=user).select_related(
+        'announcement__section__course', 'announcement__created_by'
+    ).order_by('-is_urgent', '-created_at', '-id')
+
+    position = _decode_cursor(cursor) if cursor else None
+    if position is not None:
+        urgent, created_at, item_id = position
+        items = items.filter(
+            Q(is_urgent__lt=urgent)
+            | Q(is_urgent=urgent, created_at__lt=created_at)
+            | Q(is_urgent=urgent, created_at=created_at, id__lt=item_id)
+        )
+
+    page = list(items[:page_size + 1])
+    next_cursor = _encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
+
+
+def unread_count(user):
+    return InboxItem.objects.filter(user=user, read_at__isnull=True).count()
+
+
+def mark_read(user, item_ids=None):
+    """Mark the given inbox items (or all of them) as read. Returns the number changed."""
+    items = InboxItem.objects.filter(user=user, read_at__isnull=True)
+    if item_ids is not None:
+        items = items.filter(id__in=item_ids)
+    return items.update(read_at=timezone.now())
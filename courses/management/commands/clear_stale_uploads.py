@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.models import ChunkedUpload
+from courses.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads (and their partial files) that were never attached to a record.'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+        stale = ChunkedUpload.objects.filter(created_at__lt=cutoff)
+        count = 0
+        for upload in stale.iterator():
+            discard_upload(upload)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Removed {count} stale uploads.'))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.models import MediaBlob
+from courses.storage import content_addressed_storage
+
+
+class Command(BaseCommand):
+    help = 'Delete stored blobs that no record references (e.g. left behind by a failed save).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24,
+                            help='Only prune blobs created more than this many hours ago.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        count = 0
+        for blob in MediaBlob.objects.filter(ref_count=0, created_at__lt=cutoff).iterator():
+            content_addressed_storage.delete(blob.name)
+            blob.delete()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Pruned {count} unreferenced blobs.'))
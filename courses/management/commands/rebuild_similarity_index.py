@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from courses.models import Assignment
+from courses.similarity import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Index submission texts for near-duplicate detection (unchanged submissions are skipped).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('assignment_ids', nargs='*', type=int,
+                            help='Only index these assignments (default: all).')
+
+    def handle(self, *args, **options):
+        assignments = Assignment.objects.all()
+        if options['assignment_ids']:
+            assignments = assignments.filter(pk__in=options['assignment_ids'])
+        for assignment in assignments.iterator():
+            rebuild_index(assignment)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {assignments.count()} assignments.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses.submission_counters import reconcile_submission_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-assignment submission counters from the Submission table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('assignment_ids', nargs='*', type=int,
+                            help='Only reconcile these assignments (default: all).')
+
+    def handle(self, *args, **options):
+        corrected = reconcile_submission_counters(options['assignment_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Corrected counters on {corrected} assignments.'))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses.reminders import send_reminders
+
+
+class Command(BaseCommand):
+    help = ('Email students a digest of unsubmitted assignments and unattempted quizzes due soon. '
+            'Each item is reminded once, so the command can run as often as needed (e.g. hourly from cron).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.DEADLINE_REMINDER_HOURS,
+                            help='Remind about deadlines within this many hours (default: %(default)s).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the reminders without sending or recording them.')
+
+    def handle(self, *args, **options):
+        students, items, failed = send_reminders(hours=options['hours'], dry_run=options['dry_run'])
+        verb = 'Would send' if options['dry_run'] else 'Sent'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {students} reminder emails covering {items} deadlines.'))
+        if failed:
+            self.stderr.write(self.style.WARNING(f'{failed} reminder emails could not be sent; '
+                                                 f'they will be retried on the next run.'))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:22
+
+import courses.storage
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('digest', models.CharField(db_index=True, max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='announcement',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=courses.storage.ContentAddressedStorage(), upload_to='announcements/'),
+        ),
+        migrations.AlterField(
+            model_name='studymaterial',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=courses.storage.ContentAddressedStorage(), upload_to='study_materials/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'ppt', 'pptx', 'doc', 'docx', 'mp4', 'avi', 'mkv'])]),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='submission_file',
+            field=models.FileField(storage=courses.storage.ContentAddressedStorage(), upload_to='submissions/'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:25
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    Assignment = apps.get_model('courses', 'Assignment')
+    Submission = apps.get_model('courses', 'Submission')
+    rows = Submission.objects.values('assignment_id').annotate(
+        submission_count=Count('id'),
+        graded_count=Count('id', filter=Q(status='graded')),
+        pending_count=Count('id', filter=Q(status='submitted')),
+        late_count=Count('id', filter=Q(status='late')),
+    ).order_by()
+    for row in rows:
+        assignment_id = row.pop('assignment_id')
+        Assignment.objects.filter(pk=assignment_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='graded_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='late_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='pending_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='submission_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
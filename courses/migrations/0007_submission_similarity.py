@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_assignment_submission_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionFingerprint',
+            fields=[
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fingerprint', serialize=False, to='courses.submission')),
+                ('text_digest', models.CharField(max_length=64)),
+                ('signature', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprints', to='courses.assignment')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_buckets', to='courses.assignment')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_buckets', to='courses.submission')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['assignment', 'band', 'bucket'], name='courses_sim_assignm_60e265_idx')],
+                'unique_together': {('submission', 'band')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarityPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField()),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_pairs', to='courses.assignment')),
+                ('submission_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.submission')),
+                ('submission_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.submission')),
+            ],
+            options={
+                'ordering': ['-similarity'],
+                'unique_together': {('submission_a', 'submission_b')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_submission_similarity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_urgent', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('announcement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_items', to='courses.announcement')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-is_urgent', '-created_at', '-id'],
+                'indexes': [models.Index(fields=['user', '-is_urgent', '-created_at', '-id'], name='inbox_user_order_idx'), models.Index(condition=models.Q(('read_at__isnull', True)), fields=['user'], name='inbox_user_unread_idx')],
+                'unique_together': {('user', 'announcement')},
+            },
+        ),
+    ]
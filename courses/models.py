@@ -1,7 +1,12 @@
-from django.db import models
+import os
+import uuid
+
+from django.conf import settings
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator, FileExtensionValidator
 from accounts.models import User
 from colleges.models import ClassSection
+from .storage import content_addressed_storage
 
 class StudyMaterial(models.Model):
     MATERIAL_TYPES = (
@@ -16,7 +21,7 @@ class StudyMaterial(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     material_type = models.CharField(max_length=20, choices=MATERIAL_TYPES)
-    file = models.FileField(upload_to='study_materials/', blank=True, null=True,
+    file = models.FileField(upload_to='study_materials/', blank=True, null=True, storage=content_addressed_storage,
                            validators=[FileExtensionValidator(
                                allowed_extensions=['pdf', 'ppt', 'pptx', 'doc', 'docx', 'mp4', 'avi', 'mkv']
                            )])
@@ -53,6 +58,12 @@ class Assignment(models.Model):
     late_penalty_percentage = models.IntegerField(default=10, 
                                                   validators=[MinValueValidator(0), MaxValueValidator(100)])
     
+    # Maintained from Submission saves/deletes (see courses/submission_counters.py)
+    submission_count = models.PositiveIntegerField(default=0, editable=False)
+    graded_count = models.PositiveIntegerField(default=0, editable=False)
+    pending_count = models.PositiveIntegerField(default=0, editable=False)
+    late_count = models.PositiveIntegerField(default=0, editable=False)
+    
     def __str__(self):
         return f"{self.title} - {self.section}"
     
@@ -81,7 +92,7 @@ class Submission(models.Model):
         related_name='submissions' ,
         
     )
-    submission_file = models.FileField(upload_to='submissions/')
+    submission_file = models.FileField(upload_to='submissions/', storage=content_addressed_storage)
     submission_text = models.TextField(blank=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='submitted')
@@ -94,6 +105,11 @@ class Submission(models.Model):
     def __str__(self):
         return f"{self.student.roll_number} - {self.assignment.title}"
     
+    def save(self, *args, **kwargs):
+        # The post_save handler updates the assignment's counters in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     def calculate_percentage(self):
         if self.marks_obtained and self.assignment.total_marks:
             return round((self.marks_obtained / self.assignment.total_marks) * 100, 2)
@@ -147,7 +163,8 @@ class Announcement(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='announcements')
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
-    attachment = models.FileField(upload_to='announcements/', blank=True, null=True)
+    attachment = models.FileField(upload_to='announcements/', blank=True, null=True,
+                                  storage=content_addressed_storage)
     
     def __str__(self):
         return f"{self.title} - {self.section}"
@@ -155,3 +172,121 @@ class Announcement(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+
+class InboxItem(models.Model):
+    """An announcement delivered to one student (written once per enrollment when it is created)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inbox_items')
+    announcement = models.ForeignKey(Announcement, on_delete=models.CASCADE, related_name='inbox_items')
+    # Copied from the announcement so the inbox is ordered by this table's index alone
+    is_urgent = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    read_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.announcement.title} -> {self.user.username}"
+    
+    class Meta:
+        unique_together = ['user', 'announcement']
+        ordering = ['-is_urgent', '-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-is_urgent', '-created_at', '-id'], name='inbox_user_order_idx'),
+            models.Index(fields=['user'], condition=models.Q(read_at__isnull=True), name='inbox_user_unread_idx'),
+        ]
+
+
+class ChunkedUpload(models.Model):
+    """A file being uploaded in fixed-size chunks (see courses/uploads.py)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    offset = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+    
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+    
+    @property
+    def path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{self.id}.part")
+
+
+
+class MediaBlob(models.Model):
+    """A file in ContentAddressedStorage and the number of records referencing it."""
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+
+
+class SubmissionFingerprint(models.Model):
+    """MinHash signature of a submission's text (see courses/similarity.py)."""
+    submission = models.OneToOneField(Submission, on_delete=models.CASCADE, primary_key=True,
+                                      related_name='fingerprint')
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='fingerprints')
+    text_digest = models.CharField(max_length=64)
+    signature = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Fingerprint of {self.submission_id}"
+
+
+class SimilarityBucket(models.Model):
+    """One LSH band of a fingerprint; submissions sharing a bucket are candidate duplicates."""
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='similarity_buckets')
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='similarity_buckets')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+    
+    class Meta:
+        unique_together = ['submission', 'band']
+        indexes = [models.Index(fields=['assignment', 'band', 'bucket'])]
+
+
+class SimilarityPair(models.Model):
+    """Two submissions whose estimated text similarity is above the report threshold."""
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='similarity_pairs')
+    submission_a = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='+')
+    submission_b = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='+')
+    similarity = models.FloatField()
+    
+    def __str__(self):
+        return f"{self.submission_a_id} ~ {self.submission_b_id} ({self.similarity:.0%})"
+    
+    class Meta:
+        unique_together = ['submission_a', 'submission_b']
+        ordering = ['-similarity']
+
+
+class DeadlineReminder(models.Model):
+    """A deadline reminder already emailed to a user (see courses/reminders.py)."""
+    KIND_CHOICES = (
+        ('assignment', 'Assignment'),
+        ('quiz', 'Quiz'),
+    )
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='deadline_reminders')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    due_at = models.DateTimeField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id} -> {self.user.username}"
+    
+    class Meta:
+        unique_together = ['user', 'kind', 'object_id']
@@ -0,0 +1,143 @@
+# courses/reminders.py
+"""
+Batched deadline reminder emails.
+
+``pending_deadlines`` finds, in one UNION query, every (student, item) pair
+where the item is a published assignment due in the window that the student
+has not submitted, or an active quiz starting in the window that the student
+has not attempted, and that has not been reminded before. ``send_reminders``
+groups those rows into one digest per student and sends them over a single
+email connection, recording a ``DeadlineReminder`` per item so a rerun of the
+``send_deadline_reminders`` command never emails the same item twice.
+
+Digests are handed to the email backend one at a time and reminder rows are
+written only for the digests it accepted, so a rejected address or a dropped
+connection fails just that digest: its items stay unreminded and are retried
+on the next run, and the rest of the run goes on. Only one instance of the
+command should run at a time.
+"""
+from datetime import timedelta
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import CharField, Exists, F, OuterRef, Value
+from django.utils import timezone
+
+from colleges.models import Enrollment
+from quizzes.models import QuizAttempt
+from .models import DeadlineReminder, Submission
+
+BATCH_SIZE = 100
+ROW_FIELDS = ['user_id', 'email', 'first_name', 'kind', 'item_id', 'title', 'course', 'due_at']
+
+
+def _enrolled_students():
+    return Enrollment.objects.filter(
+        is_active=True, student__user__is_active=True,
+    ).exclude(student__user__email='').annotate(
+        user_id=F('student_id'),
+        email=F('student__user__email'),
+        first_name=F('student__user__first_name'),
+        course=F('section__course__name'),
+    )
+
+
+def _not_reminded(kind):
+    return ~Exists(DeadlineReminder.objects.filter(user_id=OuterRef('user_id'), kind=kind, object_id=OuterRef('item_id')))
+
+
+def pending_deadlines(start, end):
+    """
+    Rows (dicts with ``ROW_FIELDS``) of items due in ``(start, end]`` that still
+    need a reminder, ordered by student and due date.
+    """
+    # Each filter() below joins section -> assignments/quizzes once; the annotations reuse that join
+    assignments = _enrolled_students().filter(
+        section__assignments__status='published',
+        section__assignments__due_date__gt=start,
+        section__assignments__due_date__lte=end,
+    ).annotate(
+        kind=Value('assignment', output_field=CharField()),
+        item_id=F('section__assignments__id'),
+        title=F('section__assignments__title'),
+        due_at=F('section__assignments__due_date'),
+    ).filter(
+        ~Exists(Submission.objects.filter(assignment_id=OuterRef('item_id'), student_id=OuterRef('user_id'))),
+        _not_reminded('assignment'),
+    )
+
+    quizzes = _enrolled_students().filter(
+        section__quizzes__is_active=True,
+        section__quizzes__start_time__gt=start,
+        section__quizzes__start_time__lte=end,
+    ).annotate(
+        kind=Value('quiz', output_field=CharField()),
+        item_id=F('section__quizzes__id'),
+        title=F('section__quizzes__title'),
+        due_at=F('section__quizzes__start_time'),
+    ).filter(
+        ~Exists(QuizAttempt.objects.filter(quiz_id=OuterRef('item_id'), student_id=OuterRef('user_id'))),
+        _not_reminded('quiz'),
+    )
+
+    # Enrollment's default ordering is not allowed inside a UNION
+    rows = assignments.values_list(*ROW_FIELDS).order_by().union(
+        quizzes.values_list(*ROW_FIELDS).order_by(), all=True
+    )
+    for row in rows.order_by('user_id', 'due_at').iterator():
+        yield dict(zip(ROW_FIELDS, row))
+
+
+def _digest(items):
+    first = items[0]
+    lines = [f"Hello {first['first_name'] or 'there'},", '', 'These deadlines are coming up:', '']
+    for item in items:
+        due = timezone.localtime(item['due_at']).strftime('%a %d %b %Y, %H:%M')
+        label = 'Quiz starts' if item['kind'] == 'quiz' else 'Assignment due'
+        lines.append(f"- {item['course']}: {item['title']} ({label} {due})")
+    lines += ['', 'Log in to the portal to submit your work.']
+    subject = f"Reminder: {len(items)} upcoming deadline{'s' if len(items) != 1 else ''}"
+    return EmailMessage(subject, '\n'.join(lines), settings.DEFAULT_FROM_EMAIL, [first['email']])
+
+
+def _send_batch(connection, batch):
+    """Send each digest of ``batch`` and record its items. Returns the digests sent."""
+    sent = []
+    for items in batch:
+        try:
+            if connection.send_messages([_digest(items)]):
+                sent.append(items)
+        except Exception:
+            # Backends raise their own errors (SMTPException, OSError, ...); reconnect for the next digest
+            connection.close()
+    DeadlineReminder.objects.bulk_create([
+        DeadlineReminder(user_id=item['user_id'], kind=item['kind'], object_id=item['item_id'], due_at=item['due_at'])
+        for items in sent for item in items
+    ], ignore_conflicts=True)
+    return sent
+
+
+def send_reminders(hours=None, now=None, dry_run=False):
+    """
+    Email one digest per student for deadlines in the next ``hours``.
+
+    Returns ``(students, items, failed)``: the digests sent (or that would be sent
+    with ``dry_run``) and the deadlines they cover, and the digests that could not
+    be sent and will be retried on the next run.
+    """
+    hours = settings.DEADLINE_REMINDER_HOURS if hours is None else hours
+    now = now or timezone.now()
+    rows = pending_deadlines(now, now + timedelta(hours=hours))
+
+    digests = (list(items) for _user_id, items in groupby(rows, key=lambda row: row['user_id']))
+
+    students = items_total = failed = 0
+    # One connection for every batch: SMTP login happens once per run
+    with get_connection() as connection:
+        for batch in iter(lambda: list(islice(digests, BATCH_SIZE)), []):
+            sent = batch if dry_run else _send_batch(connection, batch)
+            students += len(sent)
+            items_total += sum(len(items) for items in sent)
+            failed += len(batch) - len(sent)
+    return students, items_total, failed
@@ -0,0 +1,59 @@
+# courses/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .content_cache import bump_section_content_version
+from .inbox import fan_out, sync_announcement
+from .models import Announcement, Assignment, StudyMaterial, Submission
+from .storage import track_file_references
+from .similarity import index_submission
+from .submission_counters import apply_submission_delta
+
+track_file_references(StudyMaterial, 'file')
+track_file_references(Submission, 'submission_file')
+track_file_references(Announcement, 'attachment')
+
+
+@receiver(post_save, sender=Announcement)
+def announcement_saved(sender, instance, created, **kwargs):
+    if created:
+        if instance.is_active:
+            fan_out(instance)
+    else:
+        sync_announcement(instance)
+
+
+_DEFERRED = object()
+
+
+@receiver([post_save, post_delete], sender=StudyMaterial)
+@receiver([post_save, post_delete], sender=Assignment)
+@receiver([post_save, post_delete], sender=Announcement)
+def section_content_changed(sender, instance, **kwargs):
+    bump_section_content_version(instance.section_id)
+
+
+@receiver(post_init, sender=Submission)
+def remember_submission_state(sender, instance, **kwargs):
+    instance._counted_status = instance.__dict__.get('status', _DEFERRED)
+    instance._indexed_text = instance.__dict__.get('submission_text', _DEFERRED)
+
+
+@receiver(post_save, sender=Submission)
+def submission_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_submission_delta(instance.assignment_id, new_status=instance.status, total=1)
+    elif instance._counted_status is not _DEFERRED and instance._counted_status != instance.status:
+        apply_submission_delta(instance.assignment_id, old_status=instance._counted_status, new_status=instance.status)
+    instance._counted_status = instance.status
+    
+    # Keep the near-duplicate index current as submissions arrive or change
+    if 'submission_text' in instance.__dict__ and (created or instance._indexed_text != instance.submission_text):
+        transaction.on_commit(lambda: index_submission(instance))
+        instance._indexed_text = instance.submission_text
+
+
+@receiver(post_delete, sender=Submission)
+def submission_deleted(sender, instance, **kwargs):
+    apply_submission_delta(instance.assignment_id, old_status=instance._counted_status, total=-1)
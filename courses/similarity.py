@@ -0,0 +1,189 @@
+# courses/similarity.py
+"""
+Near-duplicate detection for submission text with MinHash and LSH.
+
+Each submission's text is split into word shingles and summarized by a MinHash
+signature of ``NUM_PERMUTATIONS`` values; the fraction of equal values between
+two signatures estimates the Jaccard similarity of their shingle sets. The
+signature is cut into ``BANDS`` bands of ``ROWS`` values and each band is hashed
+into a ``SimilarityBucket``. Only submissions sharing at least one bucket are
+compared, so indexing a new submission costs a few indexed lookups instead of a
+comparison with every other submission of the assignment.
+
+With 20 bands of 5 rows, pairs around 55% similar have an even chance of
+becoming candidates and pairs at 80% are almost always found. Candidates at or
+above ``SIMILARITY_THRESHOLD`` are stored as ``SimilarityPair`` rows and grouped
+into clusters for the teacher's report.
+"""
+import hashlib
+import random
+import re
+from array import array
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import SimilarityBucket, SimilarityPair, Submission, SubmissionFingerprint
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 100
+BANDS = 20
+ROWS = NUM_PERMUTATIONS // BANDS
+SIMILARITY_THRESHOLD = 0.6
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 61) - 1
+_random = random.Random(20240601)  # Fixed seed: signatures must stay comparable across processes
+_PERMUTATIONS = [(_random.randrange(1, _PRIME), _random.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+WORD_RE = re.compile(r'\w+')
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+def shingles(text):
+    """Hashes of the overlapping ``SHINGLE_SIZE``-word sequences of ``text``."""
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return set()
+    if len(words) < SHINGLE_SIZE:
+        return {_hash64(' '.join(words))}
+    return {_hash64(' '.join(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_hashes):
+    """MinHash signature (list of ``NUM_PERMUTATIONS`` ints) of a set of shingle hashes."""
+    return [
+        min((a * value + b) % _PRIME for value in shingle_hashes) & _MAX_HASH
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_buckets(signature):
+    """``(band, bucket)`` pairs for a signature; bucket is a signed 64-bit hash of the band's rows."""
+    buckets = []
+    for band in range(BANDS):
+        rows = array('Q', signature[band * ROWS:(band + 1) * ROWS]).tobytes()
+        bucket = int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), 'big', signed=True)
+        buckets.append((band, bucket))
+    return buckets
+
+
+def estimated_similarity(signature_a, signature_b):
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / NUM_PERMUTATIONS
+
+
+def _pack(signature):
+    return array('Q', signature).tobytes()
+
+
+def _unpack(data):
+    signature = array('Q')
+    signature.frombytes(bytes(data))
+    return signature.tolist()
+
+
+def _clear(submission_id):
+    SimilarityBucket.objects.filter(submission_id=submission_id).delete()
+    SimilarityPair.objects.filter(Q(submission_a_id=submission_id) | Q(submission_b_id=submission_id)).delete()
+
+
+@transaction.atomic
+def index_submission(submission):
+    """
+    (Re)index one submission and record its similar pairs.
+
+    Does nothing if the text is unchanged since it was last indexed. Returns the
+    number of similar submissions this call found (0 when it did nothing, or the
+    text is too short to fingerprint).
+    """
+    text = submission.submission_text or ''
+    digest = hashlib.sha256(text.encode()).hexdigest()
+    fingerprint = SubmissionFingerprint.objects.filter(submission_id=submission.id).first()
+    if fingerprint is not None and fingerprint.text_digest == digest:
+        return 0
+
+    hashes = shingles(text)
+    if not hashes:
+        _clear(submission.id)
+        SubmissionFingerprint.objects.filter(submission_id=submission.id).delete()
+        return 0
+
+    signature = minhash(hashes)
+    buckets = band_buckets(signature)
+    _clear(submission.id)
+    SubmissionFingerprint.objects.update_or_create(
+        submission_id=submission.id,
+        defaults={'assignment_id': submission.assignment_id, 'text_digest': digest, 'signature': _pack(signature)},
+    )
+    SimilarityBucket.objects.bulk_create([
+        SimilarityBucket(assignment_id=submission.assignment_id, submission_id=submission.id, band=band, bucket=bucket)
+        for band, bucket in buckets
+    ])
+
+    same_bucket = Q()
+    for band, bucket in buckets:
+        same_bucket |= Q(band=band, bucket=bucket)
+    candidate_ids = set(
+        SimilarityBucket.objects.filter(same_bucket, assignment_id=submission.assignment_id)
+        .exclude(submission_id=submission.id).values_list('submission_id', flat=True)
+    )
+
+    pairs = []
+    for candidate_id, packed in SubmissionFingerprint.objects.filter(
+        submission_id__in=candidate_ids
+    ).values_list('submission_id', 'signature'):
+        similarity = estimated_similarity(signature, _unpack(packed))
+        if similarity >= SIMILARITY_THRESHOLD:
+            first, second = sorted([submission.id, candidate_id])
+            pairs.append(SimilarityPair(
+                assignment_id=submission.assignment_id,
+                submission_a_id=first, submission_b_id=second, similarity=similarity,
+            ))
+    SimilarityPair.objects.bulk_create(pairs)
+    return len(pairs)
+
+
+def rebuild_index(assignment):
+    """Index every submission of ``assignment`` (unchanged ones are skipped)."""
+    for submission in assignment.submissions.only('id', 'assignment_id', 'submission_text').iterator(chunk_size=500):
+        index_submission(submission)
+
+
+def similarity_clusters(assignment):
+    """
+    Group the assignment's similar pairs into clusters (connected components).
+
+    Returns a list of dicts with ``submissions`` (ordered by roll number),
+    ``pairs`` and ``max_similarity``, largest and most similar clusters first.
+    """
+    pairs = list(SimilarityPair.objects.filter(assignment=assignment).order_by('-similarity'))
+    parent = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for pair in pairs:
+        parent[find(pair.submission_a_id)] = find(pair.submission_b_id)
+
+    submissions = Submission.objects.select_related('student__user').in_bulk(list(parent))
+    clusters = {}
+    for pair in pairs:
+        cluster = clusters.setdefault(find(pair.submission_a_id), {'ids': set(), 'pairs': [], 'max_similarity': 0})
+        cluster['ids'].update([pair.submission_a_id, pair.submission_b_id])
+        pair.submission_a = submissions[pair.submission_a_id]
+        pair.submission_b = submissions[pair.submission_b_id]
+        cluster['pairs'].append(pair)
+        cluster['max_similarity'] = max(cluster['max_similarity'], pair.similarity)
+
+    report = []
+    for cluster in clusters.values():
+        members = sorted((submissions[i] for i in cluster.pop('ids')), key=lambda s: s.student.roll_number)
+        report.append({'submissions': members, **cluster})
+    report.sort(key=lambda c: (-len(c['submissions']), -c['max_similarity']))
+    return report
@@ -0,0 +1,162 @@
+# courses/storage.py
+"""
+Content-addressed, deduplicating storage for uploaded course files.
+
+``ContentAddressedStorage`` stores every file under the SHA-256 digest of its
+bytes (``blobs/ab/<digest>.pdf``), so the same slide deck uploaded to ten
+sections, or a resubmitted assignment, is kept on disk once. Each stored file
+has a ``MediaBlob`` row whose ``ref_count`` is the number of records pointing at
+it. Counts are maintained by ``track_file_references`` (post_save/post_delete
+signals, see ``courses.signals`` and ``discussions.signals``), and a blob is
+removed from disk once its last reference is gone.
+
+Files saved under the old per-folder names are still read normally; they are
+simply not reference counted.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+_DEFERRED = object()
+
+
+def _blob_model():
+    # Imported lazily: model fields reference this module at import time
+    return apps.get_model('courses', 'MediaBlob')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by the SHA-256 of their content."""
+
+    def _save(self, name, content):
+        tmp_dir = self.path(os.path.join(BLOB_DIR, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        # Hash while copying to a temporary file: one streamed pass over the upload
+        digest = hashlib.sha256()
+        size = 0
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        blob_name = f'{BLOB_DIR}/{digest[:2]}/{digest}{extension}'
+        full_path = self.path(blob_name)
+
+        with transaction.atomic():
+            # Lock the blob row so a concurrent release() cannot delete the file under us
+            _blob_model().objects.select_for_update().get_or_create(
+                name=blob_name, defaults={'digest': digest, 'size': size}
+            )
+            if os.path.exists(full_path):
+                os.remove(tmp.name)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(tmp.name, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+
+        return blob_name
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content digest in _save()
+        return name
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def acquire(names):
+    """Add a reference to each stored blob in ``names``."""
+    for name in names:
+        _blob_model().objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+
+
+def _delete_unreferenced(name):
+    # Runs after commit, outside release()'s lock: an upload of the same content
+    # may have created a new row since and be relying on the file on disk
+    with transaction.atomic():
+        if not _blob_model().objects.select_for_update().filter(name=name).exists():
+            content_addressed_storage.delete(name)
+
+
+def release(names):
+    """Drop a reference to each blob in ``names``; unreferenced blobs are deleted after commit."""
+    if not names:
+        return
+    MediaBlob = _blob_model()
+    with transaction.atomic():
+        for name in names:
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                continue
+            if blob.ref_count > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+            else:
+                blob.delete()
+                transaction.on_commit(lambda name=name: _delete_unreferenced(name))
+
+
+def _file_names(instance, fields):
+    names = {}
+    for field in fields:
+        value = instance.__dict__.get(field, _DEFERRED)
+        if value is not _DEFERRED:
+            value = getattr(value, 'name', value) or None
+        names[field] = value
+    return names
+
+
+def track_file_references(model, *fields):
+    """Keep ``MediaBlob.ref_count`` in step with ``model``'s file ``fields``."""
+
+    def remember(sender, instance, **kwargs):
+        instance._stored_file_names = _file_names(instance, fields)
+
+    def saved(sender, instance, created=False, **kwargs):
+        before = {} if created else getattr(instance, '_stored_file_names', {})
+        after = _file_names(instance, fields)
+        added, removed = [], []
+        for field in fields:
+            old, new = before.get(field), after[field]
+            if new is _DEFERRED or old is _DEFERRED or old == new:
+                continue
+            if new:
+                added.append(new)
+            if old:
+                removed.append(old)
+        acquire(added)
+        release(removed)
+        instance._stored_file_names = after
+
+    def deleting(sender, instance, **kwargs):
+        names = getattr(instance, '_stored_file_names', {})
+        deferred = [field for field in fields if names.get(field, _DEFERRED) is _DEFERRED]
+        if deferred:
+            # Loaded with only()/defer(): read the stored names before the row is gone
+            row = sender._base_manager.filter(pk=instance.pk).values(*deferred).first() or {}
+            instance._stored_file_names = {**names, **{field: row.get(field) or None for field in deferred}}
+
+    def deleted(sender, instance, **kwargs):
+        names = getattr(instance, '_stored_file_names', {}).values()
+        release([name for name in names if name and name is not _DEFERRED])
+
+    uid = f'track_file_references:{model._meta.label_lower}'
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=uid)
+    pre_delete.connect(deleting, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=uid)
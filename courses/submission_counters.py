@@ -0,0 +1,68 @@
+# courses/submission_counters.py
+"""
+Denormalized per-assignment submission counters.
+
+``Assignment.submission_count``, ``graded_count``, ``pending_count`` (status
+'submitted') and ``late_count`` (status 'late') are kept up to date by the
+Submission signals in ``courses.signals``: each create, status change or delete
+applies an ``F()`` delta inside the same transaction. Bulk writes that bypass
+signals (``bulk_update``, ``QuerySet.update``) must call
+``reconcile_submission_counters`` for the assignments they touched; the
+``reconcile_submission_counters`` management command re-derives all of them.
+"""
+from django.db.models import Count, F, Q
+
+from .models import Assignment, Submission
+
+STATUS_COUNTERS = {
+    'graded': 'graded_count',
+    'submitted': 'pending_count',
+    'late': 'late_count',
+}
+COUNTER_FIELDS = ['submission_count'] + list(STATUS_COUNTERS.values())
+
+
+def apply_submission_delta(assignment_id, old_status=None, new_status=None, total=0):
+    """Move one submission between status counters and adjust the total by ``total``."""
+    deltas = {}
+    if total:
+        deltas['submission_count'] = total
+    if old_status in STATUS_COUNTERS:
+        deltas[STATUS_COUNTERS[old_status]] = deltas.get(STATUS_COUNTERS[old_status], 0) - 1
+    if new_status in STATUS_COUNTERS:
+        deltas[STATUS_COUNTERS[new_status]] = deltas.get(STATUS_COUNTERS[new_status], 0) + 1
+
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if updates:
+        Assignment.objects.filter(pk=assignment_id).update(**updates)
+
+
+def reconcile_submission_counters(assignment_ids=None):
+    """
+    Recompute the counters from the Submission table with one grouped query.
+
+    Only assignments whose stored counters differ are written. Returns the
+    number of assignments corrected.
+    """
+    assignments = Assignment.objects.all()
+    if assignment_ids is not None:
+        assignments = assignments.filter(pk__in=list(assignment_ids))
+
+    counts = {
+        row['assignment_id']: row
+        for row in Submission.objects.filter(assignment__in=assignments).values('assignment_id').annotate(
+            submission_count=Count('id'),
+            **{field: Count('id', filter=Q(status=status)) for status, field in STATUS_COUNTERS.items()},
+        ).order_by()
+    }
+
+    stale = []
+    for assignment in assignments.only('id', *COUNTER_FIELDS).iterator(chunk_size=1000):
+        row = counts.get(assignment.id, {})
+        if any(getattr(assignment, field) != row.get(field, 0) for field in COUNTER_FIELDS):
+            for field in COUNTER_FIELDS:
+                setattr(assignment, field, row.get(field, 0))
+            stale.append(assignment)
+
+    Assignment.objects.bulk_update(stale, COUNTER_FIELDS, batch_size=500)
+    return len(stale)
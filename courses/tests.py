@@ -1,3 +1,877 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core import mail
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import College, User
+from analytics.counters import counter_cache
+from colleges.models import ClassSection, Course, Department, Enrollment, Student, Teacher
+from quizzes.models import Quiz, QuizAttempt
+from .attendance import import_attendance_csv, parse_attendance_grid, upsert_attendance
+from .content_cache import get_section_content_version
+from .grading import apply_grade_sheet, iter_grade_sheet
+from .inbox import inbox_page, mark_read, unread_count
+from .reminders import pending_deadlines, send_reminders
+from .models import (
+    Announcement, Assignment, Attendance, ChunkedUpload, InboxItem, MediaBlob, SimilarityBucket, SimilarityPair, StudyMaterial, Submission,
+)
+from .similarity import BANDS, estimated_similarity, index_submission, minhash, shingles, similarity_clusters
+from .storage import content_addressed_storage
+from .submission_counters import reconcile_submission_counters
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+class CourseTestData(TestCase):
+    """A section with its teacher and three enrolled students (roll numbers R000-R002)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.college = College.objects.create(name='College', code='C1', address='a', established_year=2000,
+                                             contact_email='c@example.com', contact_phone='1')
+        cls.department = Department.objects.create(college=cls.college, name='Computer Science', code='CS')
+        course = Course.objects.create(department=cls.department, name='Algorithms', code='CS101', credits=4,
+                                       semester=1)
+        cls.teacher = User.objects.create_user('teacher', password='pw', role='teacher', college=cls.college)
+        Teacher.objects.create(user=cls.teacher, department=cls.department, employee_id='E1', qualification='q',
+                               specialization='s', joining_date=datetime.date(2020, 1, 1))
+        cls.section = ClassSection.objects.create(course=course, section_name='A', academic_year='2024-2025',
+                                                  year=1, teacher=cls.teacher)
+        cls.students, cls.enrollments = [], []
+        for number in range(3):
+            cls.add_student(number)
+
+    @classmethod
+    def add_student(cls, number, section=None):
+        user = User.objects.create_user(f'student{number}', password='pw', role='student', college=cls.college,
+                                        email=f'student{number}@example.com', first_name=f'Student {number}')
+        student = Student.objects.create(user=user, department=cls.department, roll_number=f'R{number:03d}',
+                                         admission_year=2024, current_semester=1, guardian_name='g',
+                                         guardian_phone='1')
+        cls.students.append(student)
+        cls.enrollments.append(Enrollment.objects.create(student=student, section=section or cls.section))
+        return student
+
+    def setUp(self):
+        cache.clear()
+        counter_cache.clear()
+
+    def add_assignment(self, title='Homework', **kwargs):
+        kwargs.setdefault('due_date', timezone.now() + datetime.timedelta(days=7))
+        kwargs.setdefault('status', 'published')
+        return Assignment.objects.create(section=self.section, title=title, description='d', total_marks=10,
+                                         created_by=self.teacher, **kwargs)
+
+    def submit(self, assignment, number, content=b'answer', name='answer.txt', **kwargs):
+        return Submission.objects.create(assignment=assignment, student=self.students[number],
+                                         enrollment=self.enrollments[number],
+                                         submission_file=ContentFile(content, name=name), **kwargs)
+
+
+class AttendanceTests(CourseTestData):
+    def marks(self):
+        return set(Attendance.objects.values_list('student__username', 'date', 'status', 'remarks'))
+
+    def test_upsert_inserts_then_updates(self):
+        day = datetime.date(2025, 1, 6)
+        first, second = self.students[:2]
+        upsert_attendance(self.section, [(first.pk, day, 'present', ''), (second.pk, day, 'absent', '')], self.teacher)
+        saved = upsert_attendance(self.section, [
+            (second.pk, day, 'late', 'bus'),
+            (second.pk, day, 'excused', 'doctor'),  # later records for the same day win
+        ], self.teacher)
+        self.assertEqual(saved, 1)
+        self.assertEqual(self.marks(), {('student0', day, 'present', ''), ('student1', day, 'excused', 'doctor')})
+
+    def test_upsert_query_count_does_not_grow_with_records(self):
+        days = [datetime.date(2025, 1, day) for day in range(1, 11)]
+        with CaptureQueriesContext(connection) as one_day:
+            upsert_attendance(self.section, [(self.students[0].pk, days[0], 'present', '')], self.teacher)
+        with CaptureQueriesContext(connection) as ten_days:
+            upsert_attendance(self.section, [(student.pk, day, 'present', '')
+                                             for student in self.students for day in days], self.teacher)
+        self.assertEqual(len(one_day.captured_queries), len(ten_days.captured_queries))
+        self.assertEqual(Attendance.objects.count(), 30)
+
+    def test_mark_attendance_view(self):
+        self.client.login(username='teacher', password='pw')
+        first, second, third = self.students
+        response = self.client.post(reverse('mark_attendance', args=[self.section.id]), {
+            'date': '2025-01-06',
+            f'status_{first.pk}': 'present',
+            f'status_{second.pk}': 'absent', f'remarks_{second.pk}': 'sick',
+            f'status_{third.pk}': 'bogus',
+        })
+        self.assertRedirects(response, reverse('course_detail', args=[self.section.id]), fetch_redirect_response=False)
+        day = datetime.date(2025, 1, 6)
+        self.assertEqual(self.marks(), {('student0', day, 'present', ''), ('student1', day, 'absent', 'sick')})
+
+    def test_grid_validation(self):
+        records, errors = parse_attendance_grid(self.section, {
+            '2025-01-06': {'R000': 'present', 'R001': {'status': 'absent', 'remarks': 'sick'}},
+            '2025-13-01': {'R000': 'present'},
+            '2025-01-07': {'R999': 'present', 'R002': 'asleep'},
+        })
+        self.assertEqual(len(records), 2)
+        self.assertEqual(errors, [
+            '2025-13-01: not a valid date (use YYYY-MM-DD).',
+            '2025-01-07: R999 is not enrolled in this section.',
+            '2025-01-07: invalid status "asleep" for R002.',
+        ])
+
+    def test_grid_api(self):
+        self.client.login(username='teacher', password='pw')
+        url = reverse('api_mark_attendance', args=[self.section.id])
+        grid = {'2025-01-06': {'R000': 'present', 'R001': 'late'}, '2025-01-07': {'R000': 'absent'}}
+        response = self.client.post(url, json.dumps({'attendance': grid}), content_type='application/json')
+        self.assertEqual(response.json(), {'success': True, 'saved': 3})
+
+        response = self.client.post(url, json.dumps({'attendance': {'2025-01-06': {'R999': 'present'}}}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Attendance.objects.count(), 3)
+
+    def test_grid_api_is_for_the_section_teacher(self):
+        self.client.login(username='student0', password='pw')
+        response = self.client.post(reverse('api_mark_attendance', args=[self.section.id]), '{}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+class AttendanceImportTests(CourseTestData):
+    def upload(self, content):
+        return SimpleUploadedFile('attendance.csv', content.encode())
+
+    def test_register_layout(self):
+        saved = import_attendance_csv(self.section, self.upload(
+            'roll_number,2025-01-06,07-01-2025\n'
+            'R000,P,a\n'
+            'R001,late,\n'
+        ), self.teacher)
+        self.assertEqual(saved, 3)
+        self.assertEqual(
+            set(Attendance.objects.values_list('student__username', 'date', 'status')),
+            {('student0', datetime.date(2025, 1, 6), 'present'), ('student0', datetime.date(2025, 1, 7), 'absent'),
+             ('student1', datetime.date(2025, 1, 6), 'late')},
+        )
+
+    def test_long_layout(self):
+        saved = import_attendance_csv(self.section, self.upload(
+            'roll_number,date,status,remarks\n'
+            'R002,2025-01-06,E,medical\n'
+        ), self.teacher)
+        self.assertEqual(saved, 1)
+        self.assertEqual(Attendance.objects.get().remarks, 'medical')
+
+    def test_any_error_rolls_back_the_whole_file(self):
+        rows = ''.join(f'R000,2025-01-{day:02d},P\n' for day in range(1, 29)) + 'R999,2025-02-01,P\n'
+        with self.assertRaises(ValidationError) as raised:
+            import_attendance_csv(self.section, self.upload('roll_number,date,status\n' + rows), self.teacher)
+        self.assertEqual(raised.exception.messages, ['Line 30: "R999" is not enrolled in this section.'])
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_import_view(self):
+        self.client.login(username='teacher', password='pw')
+        upload = self.upload('roll_number,2025-01-06\nR000,P\nR001,A\nR002,P\n')
+        response = self.client.post(reverse('import_attendance', args=[self.section.id]), {'file': upload})
+        self.assertRedirects(response, reverse('attendance_report', args=[self.section.id]),
+                             fetch_redirect_response=False)
+        self.assertEqual(Attendance.objects.filter(status='present').count(), 2)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, MEDIA_DELIVERY_MODE='django')
+class MaterialDownloadTests(CourseTestData):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        self.material = StudyMaterial.objects.create(
+            section=self.section, title='Week 1 notes', material_type='pdf', uploaded_by=self.teacher,
+            file=ContentFile(self.content, name='notes.pdf'),
+        )
+        self.url = reverse('download_material', args=[self.material.id])
+        self.client.login(username='student0', password='pw')
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_download(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'])
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="Week_1_notes.pdf"')
+
+    def test_byte_ranges(self):
+        response, body = self.get(Range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[10:20])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+
+        response, body = self.get(Range='bytes=-4')
+        self.assertEqual((response.status_code, body), (206, self.content[-4:]))
+        response, body = self.get(Range='bytes=1000-')
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+
+        response, _ = self.get(Range='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        # Multiple ranges are not supported: the whole file is sent
+        response, body = self.get(Range='bytes=0-1,5-6')
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_conditional_requests(self):
+        etag = self.get()[0]['ETag']
+        self.assertEqual(self.get(If_None_Match=etag)[0].status_code, 304)
+
+        # A stale If-Range validator gets the full, current file instead of a partial one
+        response, body = self.get(Range='bytes=0-9', If_Range='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.content))
+        self.assertEqual(self.get(Range='bytes=0-9', If_Range=etag)[0].status_code, 206)
+
+    @override_settings(MEDIA_DELIVERY_MODE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected/')
+    def test_proxy_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.material.file.name)
+        self.assertEqual(response.content, b'')
+
+    def test_students_of_other_sections_are_refused(self):
+        other = ClassSection.objects.create(course=self.section.course, section_name='B', academic_year='2024-2025',
+                                            year=1, teacher=self.teacher)
+        Enrollment.objects.filter(student=self.students[0]).update(section=other)
+        cache.clear()
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('student_dashboard'), fetch_redirect_response=False)
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=os.path.join(MEDIA_ROOT, 'chunked'),
+                   CHUNKED_UPLOAD_CHUNK_SIZE=4, CHUNKED_UPLOAD_MAX_SIZE=100)
+class ChunkedUploadTests(CourseTestData):
+    data = b'0123456789'
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(username='teacher', password='pw')
+
+    def start(self, **payload):
+        payload = {'filename': 'lecture.pdf', 'size': len(self.data), **payload}
+        return self.client.post(reverse('api_upload_start'), json.dumps(payload), content_type='application/json')
+
+    def put(self, upload_id, offset, chunk, checksum=None):
+        return self.client.put(f"{reverse('api_upload_chunk', args=[upload_id])}?offset={offset}", chunk,
+                               content_type='application/octet-stream',
+                               headers={'X-Chunk-SHA256': checksum or sha256(chunk)})
+
+    def upload(self, **payload):
+        upload_id = self.start(**payload).json()['upload_id']
+        for offset in range(0, len(self.data), 4):
+            response = self.put(upload_id, offset, self.data[offset:offset + 4])
+        return upload_id, response
+
+    def test_upload_in_chunks(self):
+        response = self.start(sha256=sha256(self.data))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['chunk_size'], 4)
+
+        upload_id, response = self.upload(sha256=sha256(self.data))
+        self.assertEqual(response.json()['offset'], 10)
+        self.assertTrue(response.json()['complete'])
+        with open(ChunkedUpload.objects.get(id=upload_id).path, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_resume_after_a_rejected_chunk(self):
+        upload_id = self.start().json()['upload_id']
+        self.put(upload_id, 0, b'0123')
+
+        response = self.put(upload_id, 4, b'4567', checksum=sha256(b'corrupted'))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['offset'], 4)
+        self.assertEqual(self.put(upload_id, 8, b'89').status_code, 409)
+        self.assertEqual(self.put(upload_id, 4, b'45').status_code, 400)
+
+        self.assertEqual(self.client.get(reverse('api_upload_chunk', args=[upload_id])).json()['offset'], 4)
+        self.put(upload_id, 4, b'4567')
+        self.assertTrue(self.put(upload_id, 8, b'89').json()['complete'])
+
+    def test_whole_file_checksum_mismatch_resets_the_upload(self):
+        upload_id, response = self.upload(sha256=sha256(b'something else'))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(ChunkedUpload.objects.get(id=upload_id).offset, 0)
+
+    def test_start_validation(self):
+        self.assertEqual(self.start(size=101).status_code, 413)
+        self.assertEqual(self.start(size=0).status_code, 400)
+        self.assertEqual(self.start(filename='').status_code, 400)
+        self.assertEqual(self.start(sha256='xyz').status_code, 400)
+
+    def test_uploads_belong_to_their_user(self):
+        upload_id = self.start().json()['upload_id']
+        self.client.login(username='student0', password='pw')
+        self.assertEqual(self.put(upload_id, 0, b'0123').status_code, 404)
+
+    def test_completed_upload_is_attached_to_a_material(self):
+        upload_id, _ = self.upload()
+        response = self.client.post(reverse('upload_material', args=[self.section.id]), {
+            'title': 'Lecture', 'material_type': 'pdf', 'upload_id': upload_id,
+        })
+        self.assertRedirects(response, reverse('course_detail', args=[self.section.id]), fetch_redirect_response=False)
+        material = StudyMaterial.objects.get()
+        with material.file.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+    def test_clear_stale_uploads(self):
+        upload_id = self.start().json()['upload_id']
+        path = ChunkedUpload.objects.get(id=upload_id).path
+        ChunkedUpload.objects.update(created_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        call_command('clear_stale_uploads', stdout=StringIO())
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTests(CourseTestData):
+    def material(self, content, name='slides.pdf'):
+        return StudyMaterial.objects.create(section=self.section, title=name, material_type='pdf',
+                                            uploaded_by=self.teacher, file=ContentFile(content, name=name))
+
+    def test_identical_files_are_stored_once(self):
+        first, second = self.material(b'same deck'), self.material(b'same deck', name='copy.pdf')
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.file.name, f'blobs/{sha256(b"same deck")[:2]}/{sha256(b"same deck")}.pdf')
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        first, second = self.material(b'deck'), self.material(b'deck')
+        name = first.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        self.assertTrue(content_addressed_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(content_addressed_storage.exists(name))
+
+    def test_replacing_a_file_releases_the_old_one(self):
+        material = self.material(b'draft')
+        old_name = material.file.name
+        material.file = ContentFile(b'final', name='slides.pdf')
+        with self.captureOnCommitCallbacks(execute=True):
+            material.save()
+        self.assertEqual(list(MediaBlob.objects.values_list('name', 'ref_count')), [(material.file.name, 1)])
+        self.assertFalse(content_addressed_storage.exists(old_name))
+
+    def test_file_reused_after_release_is_kept(self):
+        material = self.material(b'reused deck')
+        name = material.file.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            material.delete()
+        # The same content is uploaded again before the deferred delete runs
+        self.material(b'reused deck')
+        for callback in callbacks:
+            callback()
+        self.assertTrue(content_addressed_storage.exists(name))
+
+    def test_prune_media_blobs(self):
+        name = content_addressed_storage.save('orphan.pdf', ContentFile(b'orphan'))
+        MediaBlob.objects.update(created_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        self.material(b'referenced')
+        call_command('prune_media_blobs', stdout=StringIO())
+        self.assertFalse(content_addressed_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.count(), 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SubmissionZipTests(CourseTestData):
+    def download(self, assignment):
+        response = self.client.get(reverse('download_submissions', args=[assignment.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+
+    def test_archive_has_every_file_and_a_manifest(self):
+        assignment = self.add_assignment('Week 1: sorting')
+        self.submit(assignment, 1, b'zip second', name='work.py')
+        self.submit(assignment, 0, b'zip first', name='work.pdf', status='graded', marks_obtained=8)
+        self.client.login(username='teacher', password='pw')
+        response, archive = self.download(assignment)
+
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('Week_1_sorting_submissions.zip', response['Content-Disposition'])
+        self.assertEqual(archive.namelist(), ['manifest.csv', 'R000.pdf', 'R001.py'])
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.read('R000.pdf'), b'zip first')
+        self.assertEqual(archive.read('R001.py'), b'zip second')
+
+        rows = [row.split(',') for row in archive.read('manifest.csv').decode().splitlines()]
+        self.assertEqual(rows[0][0], 'roll_number')
+        self.assertEqual([(row[0], row[1], row[2], row[4], row[5]) for row in rows[1:]], [
+            ('R000', 'Student 0', 'graded', '8.00', 'R000.pdf'),
+            ('R001', 'Student 1', 'submitted', '', 'R001.py'),
+        ])
+
+    def test_missing_files_are_left_out(self):
+        assignment = self.add_assignment()
+        submission = self.submit(assignment, 0, b'zip lost')
+        os.remove(submission.submission_file.path)
+        self.client.login(username='teacher', password='pw')
+        _, archive = self.download(assignment)
+        self.assertEqual(archive.namelist(), ['manifest.csv'])
+
+    def test_only_the_section_teacher_can_download(self):
+        assignment = self.add_assignment()
+        other = User.objects.create_user('other', password='pw', role='teacher', college=self.college)
+        self.client.force_login(other)
+        response = self.client.get(reverse('download_submissions', args=[assignment.id]))
+        self.assertEqual(response.status_code, 404)
+
+        self.client.login(username='student0', password='pw')
+        response = self.client.get(reverse('download_submissions', args=[assignment.id]))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class GradeSheetTests(CourseTestData):
+    def setUp(self):
+        super().setUp()
+        self.assignment = self.add_assignment('Essay')
+        for number in range(3):
+            self.submit(self.assignment, number)
+
+    def sheet(self, *rows, header='roll_number,marks_obtained,feedback'):
+        return SimpleUploadedFile('grades.csv', '\n'.join([header, *rows]).encode())
+
+    def grades(self):
+        return list(Submission.objects.order_by('student__roll_number')
+                    .values_list('status', 'marks_obtained', 'feedback'))
+
+    def test_export(self):
+        Submission.objects.filter(student=self.students[1]).update(marks_obtained=7, feedback='ok')
+        self.client.login(username='teacher', password='pw')
+        response = self.client.get(reverse('export_grade_sheet', args=[self.assignment.id]))
+        self.assertIn('Essay_grades.csv', response['Content-Disposition'])
+        rows = [line.split(',') for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows[0], ['roll_number', 'student_name', 'status', 'submitted_at', 'late', 'max_marks',
+                                   'marks_obtained', 'feedback'])
+        self.assertEqual([row[:3] + row[4:] for row in rows[1:]], [
+            ['R000', 'Student 0', 'submitted', 'no', '10.00', '', ''],
+            ['R001', 'Student 1', 'submitted', 'no', '10.00', '7.00', 'ok'],
+            ['R002', 'Student 2', 'submitted', 'no', '10.00', '', ''],
+        ])
+
+    def test_export_escapes_formulas(self):
+        self.students[0].user.first_name = '=HYPERLINK("http://example.com")'
+        self.students[0].user.save()
+        Submission.objects.filter(student=self.students[0]).update(marks_obtained=7, feedback='-see me')
+        export = ''.join(iter_grade_sheet(self.assignment))
+        self.assertIn('R000,"\'=HYPERLINK(""http://example.com"")",', export)
+        self.assertIn(",7.00,'-see me", export)
+        # The escaped feedback reads back as it was written
+        apply_grade_sheet(self.assignment, SimpleUploadedFile('grades.csv', export.encode()), self.teacher)
+        self.assertEqual(self.grades()[0], ('graded', Decimal('7.00'), '-see me'))
+
+    def test_import_grades_rows_with_marks(self):
+        graded = apply_grade_sheet(self.assignment, self.sheet('R000,9.5,Good', 'R001,,', 'R002,0,Missing'),
+                                   self.teacher)
+        self.assertEqual(graded, 2)
+        self.assertEqual(self.grades(), [
+            ('graded', Decimal('9.50'), 'Good'), ('submitted', None, ''), ('graded', Decimal('0.00'), 'Missing'),
+        ])
+        self.assignment.refresh_from_db()
+        self.assertEqual((self.assignment.graded_count, self.assignment.pending_count), (2, 1))
+
+    def test_any_invalid_row_saves_nothing(self):
+        with self.assertRaises(ValidationError) as raised:
+            apply_grade_sheet(self.assignment, self.sheet(
+                'R000,8,', 'R000,9,', 'R001,11,', 'R002,,Nice', 'R999,5,', 'R001,abc,',
+            ), self.teacher)
+        self.assertEqual(raised.exception.messages, [
+            'Line 3: R000 appears more than once.',
+            'Line 4: marks for R001 must be between 0 and 10.00 (got 11).',
+            'Line 5: R002 has feedback but no marks.',
+            'Line 6: no submission from "R999" for this assignment.',
+            'Line 7: R001 appears more than once.',
+        ])
+        self.assertEqual(self.grades(), [('submitted', None, '')] * 3)
+
+    def test_late_penalty_lowers_the_limit(self):
+        late = self.add_assignment('Late essay', due_date=timezone.now() - datetime.timedelta(days=1))
+        self.submit(late, 0)
+        with self.assertRaises(ValidationError) as raised:
+            apply_grade_sheet(late, self.sheet('R000,9.5,'), self.teacher)
+        self.assertEqual(raised.exception.messages, [
+            'Line 2: marks for R000 must be between 0 and 9.00 after the late penalty (got 9.5).',
+        ])
+        self.assertEqual(apply_grade_sheet(late, self.sheet('R000,9,'), self.teacher), 1)
+
+    def test_sheet_needs_a_header_and_marks(self):
+        with self.assertRaisesMessage(ValidationError, '"roll_number" and "marks_obtained"'):
+            apply_grade_sheet(self.assignment, self.sheet('R000,5', header='roll,marks'), self.teacher)
+        with self.assertRaisesMessage(ValidationError, 'The file does not contain any marks.'):
+            apply_grade_sheet(self.assignment, self.sheet('R000,,'), self.teacher)
+
+    def test_import_view_invalidates_student_dashboards(self):
+        invalidated = []
+        with mock.patch('courses.grading.invalidate_student_dashboard',
+                        side_effect=lambda *ids: invalidated.extend(ids)):
+            self.client.login(username='teacher', password='pw')
+            response = self.client.post(reverse('import_grade_sheet', args=[self.assignment.id]),
+                                        {'file': self.sheet('R000,6,', 'R002,7,')})
+        self.assertRedirects(response, reverse('assignment_detail', args=[self.assignment.id]),
+                             fetch_redirect_response=False)
+        self.assertEqual(sorted(invalidated), [self.students[0].pk, self.students[2].pk])
+
+    def test_import_view_shows_the_errors(self):
+        self.client.login(username='teacher', password='pw')
+        response = self.client.post(reverse('import_grade_sheet', args=[self.assignment.id]),
+                                    {'file': self.sheet('R000,50,')})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['import_errors'],
+                         ['Line 2: marks for R000 must be between 0 and 10.00 (got 50).'])
+        self.assertEqual(self.grades(), [('submitted', None, '')] * 3)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SubmissionCounterTests(CourseTestData):
+    def counters(self, assignment):
+        assignment.refresh_from_db()
+        return (assignment.submission_count, assignment.graded_count, assignment.pending_count,
+                assignment.late_count)
+
+    def test_counters_follow_submission_changes(self):
+        assignment = self.add_assignment()
+        first = self.submit(assignment, 0)
+        self.submit(assignment, 1, status='late')
+        self.assertEqual(self.counters(assignment), (2, 0, 1, 1))
+
+        first.status = 'graded'
+        first.marks_obtained = 7
+        first.save()
+        self.assertEqual(self.counters(assignment), (2, 1, 0, 1))
+
+        first.delete()
+        self.assertEqual(self.counters(assignment), (1, 0, 0, 1))
+
+    def test_reconcile_fixes_only_stale_assignments(self):
+        stale, fresh = self.add_assignment('Stale'), self.add_assignment('Fresh')
+        self.submit(stale, 0)
+        self.submit(fresh, 1)
+        Submission.objects.filter(assignment=stale).update(status='graded')
+        self.assertEqual(reconcile_submission_counters(), 1)
+        self.assertEqual(self.counters(stale), (1, 1, 0, 0))
+        self.assertEqual(self.counters(fresh), (1, 0, 1, 0))
+        self.assertEqual(reconcile_submission_counters([stale.id, fresh.id]), 0)
+
+    def test_reconcile_command(self):
+        assignment = self.add_assignment()
+        Assignment.objects.filter(pk=assignment.pk).update(submission_count=4)
+        out = StringIO()
+        call_command('reconcile_submission_counters', assignment.id, stdout=out)
+        self.assertIn('Corrected counters on 1 assignments.', out.getvalue())
+        self.assertEqual(self.counters(assignment), (0, 0, 0, 0))
+
+    def test_editing_an_assignment_keeps_its_counters(self):
+        assignment = self.add_assignment()
+        stale = Assignment.objects.get(pk=assignment.pk)
+        # A submission arrives after the edit view loaded the assignment
+        self.submit(assignment, 0)
+        self.client.login(username='teacher', password='pw')
+        with mock.patch('courses.views.get_object_or_404', return_value=stale):
+            response = self.client.post(reverse('edit_assignment', args=[assignment.id]), {
+                'title': 'Renamed', 'description': 'd', 'total_marks': 20, 'due_date': '2030-01-01 10:00',
+                'status': 'published', 'late_penalty_percentage': 10,
+            })
+        self.assertRedirects(response, reverse('assignment_detail', args=[assignment.id]),
+                             fetch_redirect_response=False)
+        self.assertEqual(self.counters(assignment), (1, 0, 1, 0))
+        self.assertEqual((assignment.title, assignment.total_marks), ('Renamed', 20))
+
+
+ESSAY = ' '.join(f'word{number}' for number in range(80))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SimilarityTests(CourseTestData):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.add_student(3)
+
+    def setUp(self):
+        super().setUp()
+        self.assignment = self.add_assignment()
+
+    def submit_text(self, number, text):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.submit(self.assignment, number, submission_text=text)
+
+    def test_signatures_estimate_jaccard_similarity(self):
+        self.assertEqual(estimated_similarity(minhash(shingles(ESSAY)), minhash(shingles(ESSAY.upper()))), 1)
+        self.assertLess(estimated_similarity(minhash(shingles(ESSAY)), minhash(shingles('something else entirely'))),
+                        0.1)
+        self.assertEqual(shingles('  '), set())
+
+    def test_similar_submissions_are_clustered(self):
+        first = self.submit_text(0, ESSAY)
+        second = self.submit_text(1, ESSAY.replace('word79', 'conclusion'))
+        third = self.submit_text(2, ESSAY.replace('word0 ', 'intro '))
+        self.submit_text(3, ' '.join(f'other{number}' for number in range(80)))
+
+        self.assertEqual(SimilarityBucket.objects.count(), 4 * BANDS)
+        self.assertEqual(SimilarityPair.objects.count(), 3)
+        clusters = similarity_clusters(self.assignment)
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]['submissions'], [first, second, third])
+        self.assertGreaterEqual(clusters[0]['max_similarity'], 0.9)
+
+    def test_reindexing_follows_text_changes(self):
+        self.submit_text(0, ESSAY)
+        second = self.submit_text(1, ESSAY)
+        self.assertEqual(SimilarityPair.objects.get().similarity, 1)
+        self.assertEqual(index_submission(second), 0)
+
+        second.submission_text = 'My own answer, written from scratch.'
+        with self.captureOnCommitCallbacks(execute=True):
+            second.save()
+        self.assertFalse(SimilarityPair.objects.exists())
+        self.assertEqual(similarity_clusters(self.assignment), [])
+
+    def test_rebuild_command(self):
+        first = self.submit(self.assignment, 0, submission_text=ESSAY)
+        self.submit(self.assignment, 1, submission_text=ESSAY)
+        self.assertFalse(SimilarityPair.objects.exists())
+        call_command('rebuild_similarity_index', self.assignment.id, stdout=StringIO())
+        self.assertEqual(SimilarityPair.objects.get().submission_a, first)
+
+    def test_report_view(self):
+        self.submit_text(0, ESSAY)
+        self.submit_text(1, ESSAY)
+        self.client.login(username='teacher', password='pw')
+        response = self.client.get(reverse('similarity_report', args=[self.assignment.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['clusters']), 1)
+        self.assertContains(response, 'R001')
+
+
+class CourseContentCacheTests(CourseTestData):
+    def page(self, username='teacher'):
+        self.client.login(username=username, password='pw')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('course_detail', args=[self.section.id]))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries.captured_queries)
+
+    def test_content_changes_bump_the_version(self):
+        version = get_section_content_version(self.section.id)
+        self.assertEqual(get_section_content_version(self.section.id), version)
+        assignment = self.add_assignment()
+        self.assertEqual(get_section_content_version(self.section.id), version + 1)
+        Announcement.objects.create(section=self.section, title='News', content='c', created_by=self.teacher)
+        assignment.delete()
+        self.assertEqual(get_section_content_version(self.section.id), version + 3)
+
+    def test_fragments_are_cached_until_the_content_changes(self):
+        assignment = self.add_assignment('Cached title')
+        _, first_queries = self.page()
+        # update() skips the signals, so the cached fragment keeps the old title
+        Assignment.objects.filter(pk=assignment.pk).update(title='Hidden title')
+        response, cached_queries = self.page()
+        self.assertContains(response, 'Cached title')
+        self.assertLess(cached_queries, first_queries)
+
+        assignment.refresh_from_db()
+        assignment.save()
+        self.assertContains(self.page()[0], 'Hidden title')
+
+    def test_fragments_are_cached_per_role(self):
+        self.add_assignment('Draft plan', status='draft')
+        self.assertContains(self.page()[0], 'Draft plan')
+        self.assertNotContains(self.page('student0')[0], 'Draft plan')
+
+
+class InboxTests(CourseTestData):
+    def announce(self, title, priority='medium'):
+        return Announcement.objects.create(section=self.section, title=title, content='c', priority=priority,
+                                           created_by=self.teacher)
+
+    def titles(self, items):
+        return [item.announcement.title for item in items]
+
+    def test_announcements_fan_out_to_active_students(self):
+        self.enrollments[2].is_active = False
+        self.enrollments[2].save()
+        self.announce('Exam moved')
+        self.assertEqual(sorted(InboxItem.objects.values_list('user_id', flat=True)),
+                         [self.students[0].pk, self.students[1].pk])
+
+    def test_pages_are_urgent_first_then_newest(self):
+        for title in ['First', 'Second', 'Third']:
+            self.announce(title)
+        self.announce('Fire drill', priority='urgent')
+        user = self.students[0].user
+
+        items, cursor = inbox_page(user, page_size=3)
+        self.assertEqual(self.titles(items), ['Fire drill', 'Third', 'Second'])
+        items, cursor = inbox_page(user, cursor, page_size=3)
+        self.assertEqual(self.titles(items), ['First'])
+        self.assertIsNone(cursor)
+        self.assertEqual(self.titles(inbox_page(user, 'not-a-cursor', page_size=1)[0]), ['Fire drill'])
+
+    def test_edits_are_synced(self):
+        announcement = self.announce('Quiz')
+        announcement.priority = 'urgent'
+        announcement.save()
+        self.assertEqual(InboxItem.objects.filter(is_urgent=True).count(), 3)
+
+        announcement.is_active = False
+        announcement.save()
+        self.assertFalse(InboxItem.objects.exists())
+        announcement.is_active = True
+        announcement.save()
+        self.assertEqual(InboxItem.objects.count(), 3)
+
+    def test_mark_read(self):
+        first, _ = self.announce('One'), self.announce('Two')
+        user = self.students[0].user
+        self.assertEqual(unread_count(user), 2)
+        item = InboxItem.objects.get(user=user, announcement=first)
+        self.assertEqual(mark_read(user, [item.id]), 1)
+        self.assertEqual(unread_count(user), 1)
+        self.assertEqual(mark_read(user), 1)
+        self.assertEqual(unread_count(user), 0)
+        self.assertEqual(unread_count(self.students[1].user), 2)
+
+    def test_inbox_view(self):
+        self.announce('Welcome')
+        self.client.login(username='student0', password='pw')
+        response = self.client.get(reverse('inbox'))
+        self.assertEqual(self.titles(response.context['items']), ['Welcome'])
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_mark_read_view_follows_local_next_urls(self):
+        self.announce('Welcome')
+        self.client.login(username='student0', password='pw')
+        course_url = reverse('course_detail', args=[self.section.id])
+        response = self.client.post(reverse('inbox_mark_read'), {'next': course_url})
+        self.assertRedirects(response, course_url, fetch_redirect_response=False)
+        self.assertEqual(unread_count(self.students[0].user), 0)
+
+    def test_mark_read_view_refuses_external_next_urls(self):
+        self.client.login(username='student0', password='pw')
+        for next_url in ['https://evil.example.com/', '//evil.example.com/inbox/', '']:
+            response = self.client.post(reverse('inbox_mark_read'), {'next': next_url})
+            self.assertRedirects(response, reverse('inbox'), fetch_redirect_response=False)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, DEADLINE_REMINDER_HOURS=48)
+class ReminderTests(CourseTestData):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.assignment = self.add_assignment('Essay', due_date=self.now + datetime.timedelta(hours=12))
+        self.quiz = Quiz.objects.create(section=self.section, title='Quiz 1', duration_minutes=30, total_marks=10,
+                                        passing_marks=5, start_time=self.now + datetime.timedelta(hours=24),
+                                        end_time=self.now + datetime.timedelta(hours=25), created_by=self.teacher)
+        # Outside the window, unpublished or already handed in: never reminded
+        self.add_assignment('Later', due_date=self.now + datetime.timedelta(days=5))
+        self.add_assignment('Draft', due_date=self.now + datetime.timedelta(hours=12), status='draft')
+        self.submit(self.assignment, 1)
+        QuizAttempt.objects.create(quiz=self.quiz, student=self.students[2])
+
+    def pending(self):
+        return [(row['user_id'], row['kind'], row['title'])
+                for row in pending_deadlines(self.now, self.now + datetime.timedelta(hours=48))]
+
+    def test_pending_deadlines(self):
+        first, second, third = (student.pk for student in self.students)
+        self.assertEqual(self.pending(), [
+            (first, 'assignment', 'Essay'), (first, 'quiz', 'Quiz 1'),
+            (second, 'quiz', 'Quiz 1'),
+            (third, 'assignment', 'Essay'),
+        ])
+
+    def test_inactive_students_and_students_without_email_are_skipped(self):
+        self.enrollments[0].is_active = False
+        self.enrollments[0].save()
+        User.objects.filter(pk=self.students[1].pk).update(email='')
+        self.assertEqual([row[0] for row in self.pending()], [self.students[2].pk])
+
+    def test_one_digest_per_student_and_no_repeats(self):
+        self.assertEqual(send_reminders(now=self.now), (3, 4, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        digest = next(message for message in mail.outbox if message.to == ['student0@example.com'])
+        self.assertEqual(digest.subject, 'Reminder: 2 upcoming deadlines')
+        self.assertIn('Hello Student 0,', digest.body)
+        self.assertIn('- Algorithms: Essay (Assignment due', digest.body)
+        self.assertIn('- Algorithms: Quiz 1 (Quiz starts', digest.body)
+
+        self.assertEqual(send_reminders(now=self.now), (0, 0, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(self.pending(), [])
+
+    def test_only_the_failed_digest_is_retried(self):
+        send_messages = mail.backends.locmem.EmailBackend.send_messages
+
+        def reject_student1(backend, messages):
+            if messages[0].to == ['student1@example.com']:
+                raise ConnectionError('mailbox unavailable')
+            return send_messages(backend, messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', reject_student1):
+            self.assertEqual(send_reminders(now=self.now), (2, 3, 1))
+        self.assertEqual(self.pending(), [(self.students[1].pk, 'quiz', 'Quiz 1')])
+
+        self.assertEqual(send_reminders(now=self.now), (1, 1, 0))
+        self.assertEqual([message.to for message in mail.outbox],
+                         [['student0@example.com'], ['student2@example.com'], ['student1@example.com']])
+
+    def test_command_reports_failures(self):
+        err = StringIO()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=ConnectionError('smtp down')):
+            call_command('send_deadline_reminders', stdout=StringIO(), stderr=err)
+        self.assertIn('3 reminder emails could not be sent', err.getvalue())
+        self.assertEqual(len(self.pending()), 4)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('send_deadline_reminders', '--dry-run', stdout=out)
+        self.assertIn('Would send 3 reminder emails covering 4 deadlines.', out.getvalue())
+        self.assertEqual(mail.outbox, [])
+
+        call_command('send_deadline_reminders', '--hours', '18', stdout=out)
+        self.assertIn('Sent 2 reminder emails covering 2 deadlines.', out.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
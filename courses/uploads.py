@@ -0,0 +1,175 @@
+# courses/uploads.py
+"""
+Chunked, resumable uploads.
+
+Protocol (JSON API, see the ``api_upload_*`` views):
+
+1. ``POST uploads/`` with ``{"filename", "size", "sha256"?}`` starts an upload and
+   returns its id, the chunk size and the current offset (0).
+2. ``PUT uploads/<id>/?offset=N`` sends the raw bytes of one chunk with an
+   ``X-Chunk-SHA256`` header. Every chunk except the last must be exactly
+   ``chunk_size`` bytes and ``offset`` must equal the number of bytes received.
+3. ``GET uploads/<id>/`` returns the current offset, so an interrupted client
+   resumes from there instead of from zero.
+
+Chunks are streamed from the request straight into a partial file on disk and
+hashed on the way, so neither a chunk nor the whole file is held in memory. Once
+complete, the upload id is posted with the normal material/submission form and
+the file goes through the form's usual validation (``bind_upload``).
+"""
+import hashlib
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChunkedUpload
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A rejected upload request; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def start_upload(user, filename, size, sha256=''):
+    filename = os.path.basename(str(filename or '')).strip()
+    if not filename:
+        raise UploadError('"filename" is required.')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('"size" must be an integer.')
+    if size <= 0:
+        raise UploadError('"size" must be positive.')
+    if size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+        raise UploadError(f'Files larger than {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes are not accepted.', status=413)
+    sha256 = str(sha256 or '').lower()
+    if sha256 and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256)):
+        raise UploadError('"sha256" must be a hex SHA-256 digest.')
+
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    upload = ChunkedUpload.objects.create(
+        user=user,
+        filename=filename[:255],
+        size=size,
+        chunk_size=settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+        sha256=sha256,
+    )
+    # Create the partial file so chunks can always be written with 'r+b'
+    open(upload.path, 'wb').close()
+    return upload
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_chunk(upload_id, user, offset, stream, length, checksum):
+    """
+    Append one chunk read from ``stream`` at ``offset``. Returns the updated upload.
+
+    A chunk with the wrong offset, length or checksum is rejected without moving
+    the upload's offset, so the client can simply resend it.
+    """
+    upload, reset = _write_chunk(upload_id, user, offset, stream, length, checksum)
+    if reset:
+        raise UploadError('File checksum mismatch; the upload has been reset.', status=422)
+    return upload
+
+
+@transaction.atomic
+def _write_chunk(upload_id, user, offset, stream, length, checksum):
+    upload = ChunkedUpload.objects.select_for_update().filter(id=upload_id, user=user).first()
+    if upload is None:
+        raise UploadError('Upload not found.', status=404)
+    if upload.is_complete:
+        raise UploadError('Upload is already complete.', status=409)
+    if offset != upload.offset:
+        raise UploadError(f'Expected offset {upload.offset}.', status=409)
+
+    expected = min(upload.chunk_size, upload.size - upload.offset)
+    if length != expected:
+        raise UploadError(f'Chunk must be {expected} bytes (got {length}).')
+    checksum = (checksum or '').strip().lower()
+    if not checksum:
+        raise UploadError('The X-Chunk-SHA256 header is required.')
+
+    digest = hashlib.sha256()
+    with open(upload.path, 'r+b') as f:
+        f.seek(offset)
+        f.truncate()
+        remaining = length
+        while remaining > 0:
+            block = stream.read(min(READ_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            f.write(block)
+            remaining -= len(block)
+
+        if remaining or digest.hexdigest() != checksum:
+            f.truncate(offset)
+            raise UploadError('Chunk checksum mismatch or incomplete chunk; resend it.', status=422)
+
+    upload.offset += length
+    if upload.offset == upload.size:
+        if upload.sha256 and _file_digest(upload.path) != upload.sha256:
+            # The file is corrupt even though every chunk matched; start over
+            open(upload.path, 'wb').close()
+            upload.offset = 0
+            upload.save(update_fields=['offset'])
+            return upload, True
+        upload.completed_at = timezone.now()
+    upload.save(update_fields=['offset', 'completed_at'])
+    return upload, False
+
+
+def bind_upload(request, field_name):
+    """
+    Return ``(files, upload)`` for binding a form: ``request.FILES`` plus, when an
+    ``upload_id`` was posted, the completed chunked upload under ``field_name``.
+    ``upload`` is None when no chunked upload was used.
+    """
+    upload_id = request.POST.get('upload_id')
+    if not upload_id:
+        return request.FILES, None
+
+    try:
+        upload = ChunkedUpload.objects.filter(id=upload_id, user=request.user).first()
+    except ValidationError:
+        upload = None
+    if upload is None or not upload.is_complete:
+        raise UploadError('The uploaded file is missing or incomplete; please upload it again.')
+
+    files = request.FILES.copy()
+    files[field_name] = upload.file = UploadedFile(
+        file=open(upload.path, 'rb'),
+        name=upload.filename,
+        content_type=mimetypes.guess_type(upload.filename)[0] or 'application/octet-stream',
+        size=upload.size,
+    )
+    return files, upload
+
+
+def discard_upload(upload):
+    """Remove an upload's partial file and its row."""
+    if getattr(upload, 'file', None) is not None:
+        upload.file.close()
+    try:
+        os.remove(upload.path)
+    except FileNotFoundError:
+        pass
+    upload.delete()
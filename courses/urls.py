@@ -10,19 +10,31 @@ urlpatterns = [
     path('material/<int:material_id>/download/', views.download_material, name='download_material'),
     path('material/<int:material_id>/delete/', views.delete_material, name='delete_material'),
     
+    # Chunked uploads
+    path('uploads/', views.api_upload_start, name='api_upload_start'),
+    path('uploads/<uuid:upload_id>/', views.api_upload_chunk, name='api_upload_chunk'),
+    
     # Assignments
     path('<int:section_id>/create-assignment/', views.create_assignment, name='create_assignment'),
     path('assignment/<int:assignment_id>/', views.assignment_detail, name='assignment_detail'),
     path('assignment/<int:assignment_id>/edit/', views.edit_assignment, name='edit_assignment'),
     path('assignment/<int:assignment_id>/delete/', views.delete_assignment, name='delete_assignment'),
     path('assignment/<int:assignment_id>/submit/', views.submit_assignment, name='submit_assignment'),
+    path('assignment/<int:assignment_id>/download-submissions/', views.download_submissions, name='download_submissions'),
+    path('assignment/<int:assignment_id>/similarity/', views.similarity_report, name='similarity_report'),
     path('submission/<int:submission_id>/grade/', views.grade_submission, name='grade_submission'),
+    path('assignment/<int:assignment_id>/grade-sheet/', views.export_grade_sheet, name='export_grade_sheet'),
+    path('assignment/<int:assignment_id>/grade-sheet/import/', views.import_grade_sheet, name='import_grade_sheet'),
     
     # Attendance
     path('<int:section_id>/mark-attendance/', views.mark_attendance, name='mark_attendance'),
+    path('<int:section_id>/api/attendance/', views.api_mark_attendance, name='api_mark_attendance'),
+    path('<int:section_id>/import-attendance/', views.import_attendance, name='import_attendance'),
     path('<int:section_id>/attendance-report/', views.attendance_report, name='attendance_report'),
     
     # Announcements
+    path('inbox/', views.inbox, name='inbox'),
+    path('inbox/read/', views.inbox_mark_read, name='inbox_mark_read'),
     path('<int:section_id>/announcements/', views.announcement_list, name='announcement_list'),
     path('<int:section_id>/announcements/create/', views.announcement_create, name='announcement_create'),
     path('announcements/<int:pk>/edit/', views.announcement_edit, name='announcement_edit'),
@@ -1,13 +1,30 @@
 # courses/views.py - COMPLETE
+import datetime
+import json
+import os
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.http import FileResponse
+from django.utils.http import content_disposition_header, url_has_allowed_host_and_scheme
+from django.utils.text import get_valid_filename
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.db.models import Q
-from .models import StudyMaterial, Assignment, Submission, Attendance, Announcement
+from django.core.exceptions import ValidationError
+from .models import StudyMaterial, Assignment, Submission, Attendance, Announcement, ChunkedUpload
 from colleges.models import ClassSection, Student, Enrollment
-from .forms import StudyMaterialForm, AssignmentForm, SubmissionForm, AttendanceForm, AnnouncementForm
+from colleges.student_context import get_student_context
+from analytics import counters
+from .forms import (StudyMaterialForm, AssignmentForm, SubmissionForm, AttendanceForm, AnnouncementForm,
+                    AttendanceImportForm, GradeSheetImportForm)
+from .attendance import ATTENDANCE_STATUSES, upsert_attendance, parse_attendance_grid, import_attendance_csv
+from .downloads import serve_file, iter_submissions_zip
+from .grading import iter_grade_sheet, apply_grade_sheet
+from .similarity import SIMILARITY_THRESHOLD, similarity_clusters
+from .content_cache import FRAGMENT_TIMEOUT, get_section_content_version
+from .inbox import inbox_page, mark_read
+from .uploads import UploadError, start_upload, write_chunk, bind_upload, discard_upload
 
 @login_required
 def course_detail(request, section_id):
@@ -15,7 +32,8 @@ def course_detail(request, section_id):
     
     # Check access
     if request.user.role == 'student':
-        if not Enrollment.objects.filter(student__user=request.user, section=section, is_active=True).exists():
+        student_context = get_student_context(request)
+        if student_context is None or not student_context.is_enrolled(section):
             messages.error(request, 'You are not enrolled in this course.')
             return redirect('student_dashboard')
     elif request.user.role == 'teacher':
@@ -32,11 +50,14 @@ def course_detail(request, section_id):
     
     announcements = Announcement.objects.filter(section=section, is_active=True).order_by('-created_at')[:5]
     
+    # The querysets are lazy: they only run when the template's cached fragments miss
     context = {
         'section': section,
         'materials': materials,
         'assignments': assignments,
         'announcements': announcements,
+        'content_version': get_section_content_version(section.id),
+        'fragment_timeout': FRAGMENT_TIMEOUT,
     }
     
     return render(request, 'courses/course_detail.html', context)
@@ -50,32 +71,119 @@ def upload_material(request, section_id):
     section = get_object_or_404(ClassSection, id=section_id, teacher=request.user)
     
     if request.method == 'POST':
-        form = StudyMaterialForm(request.POST, request.FILES)
+        try:
+            files, upload = bind_upload(request, 'file')
+        except UploadError as e:
+            messages.error(request, str(e))
+            files, upload = request.FILES, None
+        form = StudyMaterialForm(request.POST, files)
         if form.is_valid():
             material = form.save(commit=False)
             material.section = section
             material.uploaded_by = request.user
             material.save()
+            if upload:
+                discard_upload(upload)
             messages.success(request, 'Study material uploaded successfully!')
             return redirect('course_detail', section_id=section.id)
+        if upload:
+            upload.file.close()
     else:
         form = StudyMaterialForm()
     
     return render(request, 'courses/upload_material.html', {'form': form, 'section': section})
 
+def _upload_state(upload):
+    return {
+        'upload_id': str(upload.id),
+        'filename': upload.filename,
+        'size': upload.size,
+        'chunk_size': upload.chunk_size,
+        'offset': upload.offset,
+        'complete': upload.is_complete,
+    }
+
+@login_required
+def api_upload_start(request):
+    """
+    Start a chunked upload for a large study material or submission file.
+    
+    Body: {"filename": "...", "size": <bytes>, "sha256": "<optional hex digest of the whole file>"}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    if request.user.role not in ('teacher', 'student'):
+        return JsonResponse({'error': 'Only teachers and students can upload files.'}, status=403)
+    
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Request body must be valid JSON.'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Request body must be a JSON object.'}, status=400)
+    
+    try:
+        upload = start_upload(request.user, payload.get('filename'), payload.get('size'), payload.get('sha256'))
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    
+    return JsonResponse(_upload_state(upload), status=201)
+
+@login_required
+def api_upload_chunk(request, upload_id):
+    """
+    GET: the upload's current offset (to resume after a failure).
+    PUT ?offset=N: the raw bytes of the next chunk, with an X-Chunk-SHA256 header.
+    """
+    if request.method == 'GET':
+        upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user)
+        return JsonResponse(_upload_state(upload))
+    
+    if request.method != 'PUT':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    try:
+        offset = int(request.GET.get('offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'error': '"offset" must be an integer.'}, status=400)
+    
+    try:
+        # The request is read as a stream, never through request.body
+        upload = write_chunk(upload_id, request.user, offset, request, length,
+                             request.META.get('HTTP_X_CHUNK_SHA256'))
+    except UploadError as e:
+        current = ChunkedUpload.objects.filter(id=upload_id, user=request.user).values_list('offset', flat=True).first()
+        return JsonResponse({'error': str(e), 'offset': current}, status=e.status)
+    
+    return JsonResponse(_upload_state(upload))
+
 @login_required
 def download_material(request, material_id):
     material = get_object_or_404(StudyMaterial, id=material_id)
     
     if request.user.role == 'student':
-        if not Enrollment.objects.filter(student__user=request.user, section=material.section, is_active=True).exists():
+        student_context = get_student_context(request)
+        if student_context is None or not student_context.is_enrolled(material.section_id):
             messages.error(request, 'Access denied.')
             return redirect('student_dashboard')
     
-    material.download_count += 1
-    material.save()
-    
-    return FileResponse(material.file.open('rb'), as_attachment=True)
+    if not material.file:
+        if material.external_link:
+            return redirect(material.external_link)
+        messages.error(request, 'This material has no file to download.')
+        return redirect('course_detail', section_id=material.section_id)
+    
+    # Count the download once, not for every Range/revalidation request of the same file
+    if 'HTTP_RANGE' not in request.META and 'HTTP_IF_NONE_MATCH' not in request.META:
+        counters.increment(material, 'download_count')
+    
+    # Videos are served inline so the browser's player can seek with Range requests
+    # Stored names are content digests, so offer the material's title as the file name
+    extension = os.path.splitext(material.file.name)[1]
+    filename = get_valid_filename(material.title) + extension
+    return serve_file(request, material.file, as_attachment=material.material_type != 'video', filename=filename)
 
 @login_required
 def delete_material(request, material_id):
@@ -120,12 +228,13 @@ def assignment_detail(request, assignment_id):
     assignment = get_object_or_404(Assignment, id=assignment_id)
     
     if request.user.role == 'student':
-        if not Enrollment.objects.filter(student__user=request.user, section=assignment.section, is_active=True).exists():
+        student_context = get_student_context(request)
+        if student_context is None or not student_context.is_enrolled(assignment.section_id):
             messages.error(request, 'Access denied.')
             return redirect('student_dashboard')
         
         try:
-            submission = Submission.objects.get(assignment=assignment, student__user=request.user)
+            submission = Submission.objects.get(assignment=assignment, student=student_context.student)
         except Submission.DoesNotExist:
             submission = None
         
@@ -141,21 +250,49 @@ def assignment_detail(request, assignment_id):
         submissions = Submission.objects.filter(assignment=assignment).select_related('student__user')
         
         total_students = assignment.section.get_enrolled_count()
-        submitted_count = submissions.count()
-        graded_count = submissions.filter(status='graded').count()
-        pending_count = submissions.filter(status='submitted').count()
         
         context = {
             'assignment': assignment,
             'submissions': submissions,
             'total_students': total_students,
-            'submitted_count': submitted_count,
-            'graded_count': graded_count,
-            'pending_count': pending_count,
+            'submitted_count': assignment.submission_count,
+            'graded_count': assignment.graded_count,
+            'pending_count': assignment.pending_count,
+            'late_count': assignment.late_count,
         }
         
         return render(request, 'courses/assignment_detail_teacher.html', context)
 
+@login_required
+def download_submissions(request, assignment_id):
+    """Stream a ZIP of all submission files for an assignment, with a manifest CSV"""
+    if request.user.role != 'teacher':
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+    
+    assignment = get_object_or_404(Assignment, id=assignment_id, section__teacher=request.user)
+    
+    response = StreamingHttpResponse(iter_submissions_zip(assignment), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(
+        True, f'{get_valid_filename(assignment.title)}_submissions.zip'
+    )
+    return response
+
+@login_required
+def similarity_report(request, assignment_id):
+    """Clusters of submissions with suspiciously similar text"""
+    if request.user.role != 'teacher':
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+    
+    assignment = get_object_or_404(Assignment, id=assignment_id, section__teacher=request.user)
+    
+    return render(request, 'courses/similarity_report.html', {
+        'assignment': assignment,
+        'clusters': similarity_clusters(assignment),
+        'threshold': SIMILARITY_THRESHOLD,
+    })
+
 @login_required
 def edit_assignment(request, assignment_id):
     if request.user.role != 'teacher':
@@ -167,7 +304,9 @@ def edit_assignment(request, assignment_id):
     if request.method == 'POST':
         form = AssignmentForm(request.POST, request.FILES, instance=assignment)
         if form.is_valid():
-            form.save()
+            # The submission counters are maintained with F() deltas; don't write back the loaded values
+            assignment = form.save(commit=False)
+            assignment.save(update_fields=form.Meta.fields)
             messages.success(request, 'Assignment updated successfully!')
             return redirect('assignment_detail', assignment_id=assignment.id)
     else:
@@ -203,7 +342,10 @@ def submit_assignment(request, assignment_id):
         return redirect('dashboard')
     
     assignment = get_object_or_404(Assignment, id=assignment_id)
-    student = get_object_or_404(Student, user=request.user)
+    student_context = get_student_context(request)
+    if student_context is None:
+        raise Http404('Student profile not found.')
+    student = student_context.student
     
     # 2. Enrollment Check & Fetch (Required to set submission.enrollment)
     try:
@@ -230,7 +372,12 @@ def submit_assignment(request, assignment_id):
     
     # 5. POST Request Handling
     if request.method == 'POST':
-        form = SubmissionForm(request.POST, request.FILES)
+        try:
+            files, upload = bind_upload(request, 'submission_file')
+        except UploadError as e:
+            messages.error(request, str(e))
+            files, upload = request.FILES, None
+        form = SubmissionForm(request.POST, files)
         if form.is_valid():
             submission = form.save(commit=False)
             
@@ -247,8 +394,12 @@ def submit_assignment(request, assignment_id):
             
             # 7. Save and Redirect
             submission.save()
+            if upload:
+                discard_upload(upload)
             messages.success(request, 'Assignment submitted successfully!')
             return redirect('assignment_detail', assignment_id=assignment.id)
+        if upload:
+            upload.file.close()
     else:
         form = SubmissionForm()
     
@@ -282,6 +433,51 @@ def grade_submission(request, submission_id):
     
     return render(request, 'courses/grade_submission.html', {'submission': submission})
 
+@login_required
+def export_grade_sheet(request, assignment_id):
+    """Download the grade sheet (CSV) of an assignment for offline grading"""
+    if request.user.role != 'teacher':
+        messages.error(request, 'Only teachers can grade submissions.')
+        return redirect('dashboard')
+    
+    assignment = get_object_or_404(Assignment, id=assignment_id, section__teacher=request.user)
+    
+    response = StreamingHttpResponse(iter_grade_sheet(assignment), content_type='text/csv')
+    response['Content-Disposition'] = content_disposition_header(
+        True, f'{get_valid_filename(assignment.title)}_grades.csv'
+    )
+    return response
+
+@login_required
+def import_grade_sheet(request, assignment_id):
+    """Grade many submissions at once from an uploaded grade sheet"""
+    if request.user.role != 'teacher':
+        messages.error(request, 'Only teachers can grade submissions.')
+        return redirect('dashboard')
+    
+    assignment = get_object_or_404(Assignment, id=assignment_id, section__teacher=request.user)
+    import_errors = []
+    
+    if request.method == 'POST':
+        form = GradeSheetImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                graded = apply_grade_sheet(assignment, form.cleaned_data['file'], request.user)
+            except ValidationError as e:
+                import_errors = e.messages
+                messages.error(request, 'No grades were saved. Fix the errors below and try again.')
+            else:
+                messages.success(request, f'{graded} submissions graded successfully!')
+                return redirect('assignment_detail', assignment_id=assignment.id)
+    else:
+        form = GradeSheetImportForm()
+    
+    return render(request, 'courses/import_grade_sheet.html', {
+        'form': form,
+        'assignment': assignment,
+        'import_errors': import_errors,
+    })
+
 @login_required
 def mark_attendance(request, section_id):
     if request.user.role != 'teacher':
@@ -291,24 +487,25 @@ def mark_attendance(request, section_id):
     section = get_object_or_404(ClassSection, id=section_id, teacher=request.user)
     
     if request.method == 'POST':
-        date = request.POST.get('date')
-        students = Enrollment.objects.filter(section=section, is_active=True).select_related('student__user')
+        try:
+            date = datetime.date.fromisoformat(request.POST.get('date', ''))
+        except ValueError:
+            messages.error(request, 'Please select a valid date.')
+            return redirect('mark_attendance', section_id=section.id)
+        
+        # Student primary keys are their user ids, so no join is needed here
+        student_ids = Enrollment.objects.filter(section=section, is_active=True).values_list('student_id', flat=True)
         
-        for enrollment in students:
-            status = request.POST.get(f'status_{enrollment.student.user.id}')
-            remarks = request.POST.get(f'remarks_{enrollment.student.user.id}', '')
+        records = []
+        for student_id in student_ids:
+            status = request.POST.get(f'status_{student_id}')
+            remarks = request.POST.get(f'remarks_{student_id}', '')
             
-            if status:
-                Attendance.objects.update_or_create(
-                    section=section,
-                    student=enrollment.student.user,
-                    date=date,
-                    defaults={
-                        'status': status,
-                        'remarks': remarks,
-                        'marked_by': request.user
-                    }
-                )
+            if status in ATTENDANCE_STATUSES:
+                records.append((student_id, date, status, remarks))
+        
+        # One bulk upsert for the whole class instead of update_or_create per student
+        upsert_attendance(section, records, request.user)
         
         messages.success(request, 'Attendance marked successfully!')
         return redirect('course_detail', section_id=section.id)
@@ -324,6 +521,64 @@ def mark_attendance(request, section_id):
     
     return render(request, 'courses/mark_attendance.html', context)
 
+@login_required
+def api_mark_attendance(request, section_id):
+    """
+    JSON API to mark a grid of dates x students in one transaction.
+    
+    Body: {"attendance": {"YYYY-MM-DD": {"<roll number>": "present" | {"status": ..., "remarks": ...}}}}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    if request.user.role != 'teacher':
+        return JsonResponse({'error': 'Only teachers can mark attendance.'}, status=403)
+    
+    section = get_object_or_404(ClassSection, id=section_id, teacher=request.user)
+    
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Request body must be valid JSON.'}, status=400)
+    
+    records, errors = parse_attendance_grid(section, payload.get('attendance') if isinstance(payload, dict) else None)
+    if errors:
+        return JsonResponse({'success': False, 'errors': errors}, status=400)
+    
+    saved = upsert_attendance(section, records, request.user)
+    
+    return JsonResponse({'success': True, 'saved': saved})
+
+@login_required
+def import_attendance(request, section_id):
+    """Import a register-style attendance CSV for a section"""
+    if request.user.role != 'teacher':
+        messages.error(request, 'Only teachers can mark attendance.')
+        return redirect('dashboard')
+    
+    section = get_object_or_404(ClassSection, id=section_id, teacher=request.user)
+    import_errors = []
+    
+    if request.method == 'POST':
+        form = AttendanceImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                saved = import_attendance_csv(section, form.cleaned_data['file'], request.user)
+            except ValidationError as e:
+                import_errors = e.messages
+                messages.error(request, 'Attendance was not imported. Fix the errors below and try again.')
+            else:
+                messages.success(request, f'{saved} attendance records imported successfully!')
+                return redirect('attendance_report', section_id=section.id)
+    else:
+        form = AttendanceImportForm()
+    
+    return render(request, 'courses/import_attendance.html', {
+        'form': form,
+        'section': section,
+        'import_errors': import_errors,
+    })
+
 @login_required
 def attendance_report(request, section_id):
     section = get_object_or_404(ClassSection, id=section_id)
@@ -370,6 +625,40 @@ def announcement_list(request, section_id):
         'announcements': announcements
     })
 
+@login_required
+def inbox(request):
+    """A student's announcements from all enrolled sections, urgent first"""
+    if request.user.role != 'student':
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+    
+    items, next_cursor = inbox_page(request.user, request.GET.get('cursor'))
+    
+    return render(request, 'courses/inbox.html', {
+        'items': items,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+    })
+
+@login_required
+def inbox_mark_read(request):
+    """Mark one inbox item (item_id) or all of them as read"""
+    if request.method != 'POST' or request.user.role != 'student':
+        return redirect('inbox')
+    
+    item_id = request.POST.get('item_id')
+    if item_id:
+        mark_read(request.user, [item_id] if item_id.isdigit() else [])
+    else:
+        marked = mark_read(request.user)
+        messages.success(request, f'{marked} announcements marked as read.')
+    
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()},
+                                           require_https=request.is_secure()):
+        next_url = 'inbox'
+    return redirect(next_url)
+
 @login_required
 def announcement_create(request, section_id):
     if request.user.role != 'teacher':
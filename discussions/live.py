@@ -0,0 +1,178 @@
+# discussions/live.py
+"""
+Live updates for discussion pages over Server-Sent Events.
+
+Comment and vote changes are published to a per-discussion channel on a
+broker (``publish_comment``, ``publish_votes``), and ``discussion_stream``
+relays them to the browser. The broker class is read from
+``DISCUSSION_LIVE_BROKER``; the default ``InProcessBroker`` keeps the last
+``buffer_size`` events of each channel in memory and only reaches clients
+served by the same process. A broker for a shared service (Redis pub/sub, a
+local message queue) needs the same three methods.
+
+Event ids are ``<broker token>:<sequence>``. A reconnecting client sends the
+last id it saw (``Last-Event-ID``) and receives only the events after it. When
+those events are no longer buffered, or the id comes from a previous process,
+the client is sent a ``resync`` event and should reload the thread.
+
+Each open stream holds a worker thread, so streams are only served when
+``DISCUSSION_LIVE_UPDATES`` is on, and at most ``DISCUSSION_STREAM_MAX_CLIENTS``
+at a time per process (``stream_slots``).
+"""
+import itertools
+import threading
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.module_loading import import_string
+
+RESYNC = None
+
+
+class InProcessBroker:
+    """Per-channel ring buffers of events, shared by the threads of one process."""
+
+    def __init__(self, buffer_size=200):
+        self.buffer_size = buffer_size
+        self.token = uuid.uuid4().hex[:8]
+        self._sequence = itertools.count(1)
+        self._channels = {}
+        self._evicted = {}
+        # One lock for the buffers and a condition per channel on it, so that a
+        # publish only wakes the streams of its own channel
+        self._lock = threading.Lock()
+        self._conditions = {}
+
+    def _condition(self, channel):
+        condition = self._conditions.get(channel)
+        if condition is None:
+            condition = self._conditions[channel] = threading.Condition(self._lock)
+        return condition
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            event_id = next(self._sequence)
+            buffer = self._channels.setdefault(channel, deque(maxlen=self.buffer_size))
+            if len(buffer) == self.buffer_size:
+                self._evicted[channel] = buffer[0][0]
+            buffer.append((event_id, event, data))
+            self._condition(channel).notify_all()
+        return f'{self.token}:{event_id}'
+
+    def last_event_id(self, channel):
+        with self._lock:
+            buffer = self._channels.get(channel)
+            return f'{self.token}:{buffer[-1][0] if buffer else 0}'
+
+    def _parse(self, last_event_id):
+        token, _, sequence = (last_event_id or '').partition(':')
+        if token != self.token or not sequence.isdigit():
+            return RESYNC
+        return int(sequence)
+
+    def events_after(self, channel, last_event_id, timeout):
+        """
+        Events of ``channel`` after ``last_event_id`` as ``(id, event, data)``
+        tuples, waiting up to ``timeout`` seconds for one to arrive. Returns
+        ``RESYNC`` if the client has missed events that are no longer buffered.
+        """
+        after = self._parse(last_event_id)
+        if after is RESYNC:
+            return RESYNC
+        with self._lock:
+            if after < self._evicted.get(channel, 0):
+                return RESYNC
+            events = self._pending(channel, after)
+            if not events:
+                self._condition(channel).wait(timeout)
+                events = self._pending(channel, after)
+        return [(f'{self.token}:{event_id}', event, data) for event_id, event, data in events]
+
+    def _pending(self, channel, after):
+        return [entry for entry in self._channels.get(channel, ()) if entry[0] > after]
+
+
+class StreamSlots:
+    """Count of the event streams this process is serving, against a limit."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self, limit):
+        """Take a slot; False when ``limit`` streams are already open."""
+        with self._lock:
+            if self.open >= limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+    def hold(self, events):
+        """Wrap an acquired slot's ``events`` iterable so the slot is released when it ends or is closed."""
+        return _HeldStream(self, events)
+
+
+class _HeldStream:
+    def __init__(self, slots, events):
+        self._slots = slots
+        self._events = iter(events)
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._events)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        # Called by the server when the client goes away, even if iteration never started
+        if self._released:
+            return
+        self._released = True
+        self._slots.release()
+        close = getattr(self._events, 'close', None)
+        if close is not None:
+            close()
+
+
+stream_slots = StreamSlots()
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.DISCUSSION_LIVE_BROKER)()
+    return _broker
+
+
+def channel_for(discussion_id):
+    return f'discussion:{discussion_id}'
+
+
+def publish_comment(comment):
+    """Push a new comment (rendered like the thread's other comments) to its discussion's viewers."""
+    comment.children = []
+    html = render_to_string('discussions/_comment.html', {'comment': comment, 'discussion': comment.discussion})
+    get_broker().publish(channel_for(comment.discussion_id), 'comment', {
+        'id': comment.id,
+        'parent_id': comment.parent_id,
+        'html': html,
+    })
+
+
+def publish_votes(discussion_id, comment_id, upvotes):
+    get_broker().publish(channel_for(discussion_id), 'vote', {'id': comment_id, 'upvotes': upvotes})
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from discussions.read_state import flush
+
+
+class Command(BaseCommand):
+    help = 'Write buffered discussion visits (read watermarks) from the cache to the database.'
+
+    def handle(self, *args, **options):
+        written = flush()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} read watermarks.'))
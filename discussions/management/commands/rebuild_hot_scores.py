@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from discussions.ranking import rebuild_hot_scores
+
+
+class Command(BaseCommand):
+    help = 'Recompute vote totals and trending (hot) scores of all discussions.'
+
+    def handle(self, *args, **options):
+        updated = rebuild_hot_scores()
+        self.stdout.write(self.style.SUCCESS(f'Updated hot scores of {updated} discussions.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from discussions.votes import reconcile_comment_votes
+
+
+class Command(BaseCommand):
+    help = 'Recompute comment vote totals (Comment.upvotes) from the CommentVote table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('comment_ids', nargs='*', type=int,
+                            help='Only reconcile these comments (default: all).')
+
+    def handle(self, *args, **options):
+        corrected = reconcile_comment_votes(options['comment_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Corrected vote totals on {corrected} comments.'))
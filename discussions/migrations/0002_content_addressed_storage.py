@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:22
+
+import courses.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discussions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=courses.storage.ContentAddressedStorage(), upload_to='comments/'),
+        ),
+        migrations.AlterField(
+            model_name='discussion',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=courses.storage.ContentAddressedStorage(), upload_to='discussions/'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Full-text search table for discussions and comments (see discussions/search.py)
+
+from django.db import migrations
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE discussions_search USING fts5("
+    "discussion_id UNINDEXED, section_id UNINDEXED, title, body, tokenize='porter unicode61')",
+]
+
+POSTGRESQL_CREATE = [
+    "CREATE TABLE discussions_search ("
+    "doc_id bigint PRIMARY KEY, discussion_id bigint NOT NULL, section_id bigint NOT NULL, "
+    "title text NOT NULL, body text NOT NULL, "
+    "document tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')"
+    ") STORED)",
+    "CREATE INDEX discussions_search_document_idx ON discussions_search USING GIN (document)",
+    "CREATE INDEX discussions_search_section_idx ON discussions_search (section_id)",
+]
+
+KEY_COLUMN = {'sqlite': 'rowid', 'postgresql': 'doc_id'}
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRESQL_CREATE}.get(vendor)
+    if statements is None:
+        return  # search falls back to icontains lookups
+    for statement in statements:
+        schema_editor.execute(statement)
+
+    key = KEY_COLUMN[vendor]
+    schema_editor.execute(
+        f"INSERT INTO discussions_search ({key}, discussion_id, section_id, title, body) "
+        f"SELECT id * 2, id, section_id, title, content FROM discussions_discussion"
+    )
+    schema_editor.execute(
+        f"INSERT INTO discussions_search ({key}, discussion_id, section_id, title, body) "
+        f"SELECT c.id * 2 + 1, c.discussion_id, d.section_id, '', c.content "
+        f"FROM discussions_comment c JOIN discussions_discussion d ON d.id = c.discussion_id"
+    )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in KEY_COLUMN:
+        schema_editor.execute("DROP TABLE discussions_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discussions', '0002_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+SEGMENT_WIDTH = 10
+MAX_DEPTH = 255 // (SEGMENT_WIDTH + 1)
+
+
+def fill_comment_paths(apps, schema_editor):
+    Comment = apps.get_model('discussions', 'Comment')
+    parents = dict(Comment.objects.values_list('id', 'parent_id'))
+    paths = {}
+    moved = []
+
+    def path_of(comment_id):
+        # Walk up iteratively; threads can be deeper than the recursion limit
+        chain = []
+        while comment_id is not None and comment_id not in paths:
+            chain.append(comment_id)
+            comment_id = parents.get(comment_id)
+        prefix = paths.get(comment_id, '')
+        for node in reversed(chain):
+            # Replies nested deeper than the path can hold are attached one level up, as Comment.save does
+            if len(prefix) >= MAX_DEPTH * (SEGMENT_WIDTH + 1):
+                prefix = prefix[:-(SEGMENT_WIDTH + 1)]
+                parents[node] = int(prefix[-(SEGMENT_WIDTH + 1):-1])
+                moved.append(node)
+            prefix = paths[node] = f"{prefix}{node:0{SEGMENT_WIDTH}d}/"
+        return prefix
+
+    comments = [Comment(id=comment_id, path=path_of(comment_id)) for comment_id in parents]
+    Comment.objects.bulk_update(comments, ['path'], batch_size=500)
+    Comment.objects.bulk_update([Comment(id=comment_id, parent_id=parents[comment_id]) for comment_id in moved],
+                                ['parent'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discussions', '0003_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_comment_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['discussion', 'path'], name='comment_thread_path_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:35
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_comment_counts(apps, schema_editor):
+    Discussion = apps.get_model('discussions', 'Discussion')
+    Comment = apps.get_model('discussions', 'Comment')
+    counts = Comment.objects.filter(discussion=OuterRef('pk')).order_by().values('discussion').annotate(
+        total=Count('id')
+    ).values('total')
+    Discussion.objects.update(comment_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colleges', '0003_alter_student_current_semester'),
+        ('discussions', '0004_comment_path'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='discussion',
+            options={'ordering': ['-is_pinned', '-created_at', '-id']},
+        ),
+        migrations.AddField(
+            model_name='discussion',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_comment_counts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='discussion',
+            index=models.Index(fields=['section', '-is_pinned', '-created_at', '-id'], name='discussion_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discussion',
+            index=models.Index(fields=['section', 'category', '-is_pinned', '-created_at', '-id'], name='discussion_category_idx'),
+        ),
+    ]
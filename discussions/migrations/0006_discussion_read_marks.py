@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discussions', '0005_discussion_list_pagination'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscussionReadMark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['discussion', 'created_at'], name='comment_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='discussionreadmark',
+            name='discussion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_marks', to='discussions.discussion'),
+        ),
+        migrations.AddField(
+            model_name='discussionreadmark',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discussion_read_marks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='discussionreadmark',
+            unique_together={('user', 'discussion')},
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:39
+
+import datetime
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+# Formula of discussions.ranking.hot_score at the time of this migration
+HOT_EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def backfill_hot_scores(apps, schema_editor):
+    Discussion = apps.get_model('discussions', 'Discussion')
+    Comment = apps.get_model('discussions', 'Comment')
+    votes = Comment.objects.filter(discussion=OuterRef('pk')).order_by().values('discussion').annotate(
+        total=Sum('upvotes')
+    ).values('total')
+    Discussion.objects.update(vote_total=Coalesce(Subquery(votes), 0))
+
+    discussions = []
+    for discussion in Discussion.objects.only('id', 'comment_count', 'vote_total', 'views_count', 'created_at'):
+        activity = discussion.comment_count * 2.0 + max(discussion.vote_total, 0) + discussion.views_count * 0.1
+        age = (discussion.created_at - HOT_EPOCH).total_seconds()
+        discussion.hot_score = round(math.log10(max(activity, 1)) + age / 45000, 7)
+        discussions.append(discussion)
+    Discussion.objects.bulk_update(discussions, ['hot_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colleges', '0003_alter_student_current_semester'),
+        ('discussions', '0006_discussion_read_marks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discussion',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='discussion',
+            name='vote_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_hot_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='discussion',
+            index=models.Index(fields=['section', '-hot_score', '-id'], name='discussion_section_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discussion',
+            index=models.Index(fields=['-hot_score', '-id'], name='discussion_hot_idx'),
+        ),
+    ]
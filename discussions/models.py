@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.text import slugify
 from accounts.models import User
 from colleges.models import ClassSection, Student
+from courses.storage import content_addressed_storage
 
 class Discussion(models.Model):
     CATEGORY_CHOICES = (
@@ -22,9 +23,18 @@ class Discussion(models.Model):
     is_locked = models.BooleanField(default=False)
     is_resolved = models.BooleanField(default=False)
     views_count = models.IntegerField(default=0)
+    # Maintained by the Comment signals in discussions/signals.py
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Net votes on the discussion's comments (discussions/votes.py)
+    vote_total = models.IntegerField(default=0, editable=False)
+    # Trending rank, refreshed on comment, vote and view-count changes (discussions/ranking.py)
+    hot_score = models.FloatField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    attachment = models.FileField(upload_to='discussions/', blank=True, null=True)
+    attachment = models.FileField(upload_to='discussions/', blank=True, null=True,
+                                  storage=content_addressed_storage)
+    
+    SEARCH_FIELDS = ('title', 'content')  # indexed by discussions/search.py
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -35,7 +45,15 @@ class Discussion(models.Model):
         return self.title
     
     class Meta:
-        ordering = ['-is_pinned', '-created_at']
+        ordering = ['-is_pinned', '-created_at', '-id']
+        indexes = [
+            # Keyset pagination of a section's list, with and without the category filter
+            models.Index(fields=['section', '-is_pinned', '-created_at', '-id'], name='discussion_list_idx'),
+            models.Index(fields=['section', 'category', '-is_pinned', '-created_at', '-id'],
+                         name='discussion_category_idx'),
+            models.Index(fields=['section', '-hot_score', '-id'], name='discussion_section_hot_idx'),
+            models.Index(fields=['-hot_score', '-id'], name='discussion_hot_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -47,13 +65,55 @@ class Comment(models.Model):
     upvotes = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    attachment = models.FileField(upload_to='comments/', blank=True, null=True)
+    attachment = models.FileField(upload_to='comments/', blank=True, null=True,
+                                  storage=content_addressed_storage)
+    # Materialized path: zero-padded ids from the thread's root down to this comment,
+    # e.g. "0000000012/0000000045/". Ordering by it lists a thread depth-first.
+    path = models.CharField(max_length=255, blank=True, default='', editable=False)
+    
+    PATH_SEGMENT_WIDTH = 10
+    MAX_DEPTH = 255 // (PATH_SEGMENT_WIDTH + 1)
+    SEARCH_FIELDS = ('content',)  # indexed by discussions/search.py
+    
+    @property
+    def depth(self):
+        return len(self.path) // (self.PATH_SEGMENT_WIDTH + 1) - 1
+    
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            super().save(*args, **kwargs)
+            return
+        # Replies nested deeper than the path can hold are attached one level up
+        while self.parent is not None and self.parent.depth + 1 >= self.MAX_DEPTH:
+            self.parent = self.parent.parent
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            parent_path = self.parent.path if self.parent is not None else ''
+            self.path = f"{parent_path}{self.pk:0{self.PATH_SEGMENT_WIDTH}d}/"
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
     
     def __str__(self):
         return f"Comment by {self.author.get_full_name()} on {self.discussion.title}"
     
     class Meta:
         ordering = ['-is_solution', '-created_at']
+        indexes = [
+            models.Index(fields=['discussion', 'path'], name='comment_thread_path_idx'),
+            models.Index(fields=['discussion', 'created_at'], name='comment_created_idx'),
+        ]
+
+
+class DiscussionReadMark(models.Model):
+    """When a user last opened a discussion (see discussions/read_state.py)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='discussion_read_marks')
+    discussion = models.ForeignKey(Discussion, on_delete=models.CASCADE, related_name='read_marks')
+    last_read_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.user.username} read {self.discussion_id} at {self.last_read_at}"
+    
+    class Meta:
+        unique_together = ['user', 'discussion']
 
 
 class CommentVote(models.Model):
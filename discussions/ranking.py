@@ -0,0 +1,82 @@
+# discussions/ranking.py
+"""
+"Hot" ranking of discussions for the trending lists.
+
+``hot_score`` combines a thread's activity (comments, net comment votes and
+views) on a log scale with its creation time::
+
+    log10(activity) + seconds since HOT_EPOCH / DECAY_SECONDS
+
+Because age enters as a constant offset fixed at creation, scores never need
+to be decayed over time: a thread must have ten times the activity to outrank
+one created ``DECAY_SECONDS`` later. A score therefore only changes when its
+own thread's activity does, and ``update_hot_scores`` is called for just those
+threads when a comment is added or removed, a vote is cast or buffered view
+counts are flushed. Trending lists are then a range scan of the
+``(section, -hot_score, -id)`` or ``(-hot_score, -id)`` index.
+"""
+import datetime
+import math
+
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Discussion
+
+HOT_EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+DECAY_SECONDS = 45000  # 12.5 hours
+COMMENT_WEIGHT = 2.0
+VOTE_WEIGHT = 1.0
+VIEW_WEIGHT = 0.1
+TRENDING_LIMIT = 10
+BATCH_SIZE = 500
+
+
+def hot_score(comment_count, vote_total, views_count, created_at):
+    activity = comment_count * COMMENT_WEIGHT + max(vote_total, 0) * VOTE_WEIGHT + views_count * VIEW_WEIGHT
+    age = (created_at - HOT_EPOCH).total_seconds()
+    return round(math.log10(max(activity, 1)) + age / DECAY_SECONDS, 7)
+
+
+def update_hot_scores(discussion_ids):
+    """Recompute the score of the given discussions from their stored counters."""
+    discussions = list(
+        Discussion.objects.filter(pk__in=list(discussion_ids)).only(
+            'id', 'comment_count', 'vote_total', 'views_count', 'created_at', 'hot_score'
+        ).order_by()
+    )
+    changed = []
+    for discussion in discussions:
+        score = hot_score(discussion.comment_count, discussion.vote_total, discussion.views_count,
+                          discussion.created_at)
+        if score != discussion.hot_score:
+            discussion.hot_score = score
+            changed.append(discussion)
+    Discussion.objects.bulk_update(changed, ['hot_score'], batch_size=BATCH_SIZE)
+    return len(changed)
+
+
+def refresh_vote_totals(discussion_ids=None):
+    """Re-derive ``vote_total`` from the comments' ``upvotes`` (all discussions by default)."""
+    discussions = Discussion.objects.all()
+    if discussion_ids is not None:
+        discussions = discussions.filter(pk__in=list(discussion_ids))
+    votes = Comment.objects.filter(discussion=OuterRef('pk')).order_by().values('discussion').annotate(
+        total=Sum('upvotes')
+    ).values('total')
+    discussions.update(vote_total=Coalesce(Subquery(votes), 0))
+
+
+def rebuild_hot_scores():
+    """Re-derive every discussion's ``vote_total``, then rescore all of them. Returns the number changed."""
+    refresh_vote_totals()
+    ids = list(Discussion.objects.values_list('id', flat=True).order_by('id'))
+    updated = 0
+    for start in range(0, len(ids), BATCH_SIZE):
+        updated += update_hot_scores(ids[start:start + BATCH_SIZE])
+    return updated
+
+
+def trending(discussions, limit=TRENDING_LIMIT):
+    """The ``limit`` hottest of a Discussion queryset (e.g. one section's or one college's)."""
+    return discussions.select_related('author', 'section__course').order_by('-hot_score', '-id')[:limit]
@@ -0,0 +1,124 @@
+# discussions/read_state.py
+"""
+Per-user read watermarks for discussions ("new replies since your last visit").
+
+A user has at most one ``DiscussionReadMark`` per discussion they have opened,
+holding the time of their last visit, so storage grows with threads visited
+rather than with comments. ``mark_read`` buffers the visit under its own key in
+the counters cache (see ``analytics.counters``); only the first visit of a
+user to a discussion between two flushes also registers that key in the pending
+set. ``flush`` writes all buffered visits with one bulk upsert, from the request
+path at most once every ``COUNTER_FLUSH_INTERVAL`` seconds or from the
+``flush_read_marks`` command. Readers see buffered visits immediately.
+
+``annotate_new_replies`` counts, for a page of discussions, the comments by
+other people posted after the user's watermark with one query joining the
+read marks and the comments.
+"""
+from django.conf import settings
+from django.db.models import Count, F, FilteredRelation, Q
+from django.utils import timezone
+
+from analytics.counters import counter_cache, update_pending_set
+
+from .models import Discussion, DiscussionReadMark
+
+VISIT_KEY = 'read_marks:{user_id}:{discussion_id}'
+PENDING_KEY = 'read_marks:pending'
+FLUSH_KEY = 'read_marks:flushed'
+BATCH_SIZE = 500
+
+
+def _visit_key(user_id, discussion_id):
+    return VISIT_KEY.format(user_id=user_id, discussion_id=discussion_id)
+
+
+def mark_read(user, discussion, when=None):
+    """Record that ``user`` has seen ``discussion`` up to ``when`` (default: now), buffered."""
+    key = _visit_key(user.pk, discussion.pk)
+    when = when or timezone.now()
+    if counter_cache.add(key, when, None):
+        update_pending_set(PENDING_KEY, add=[(user.pk, discussion.pk)])
+    else:
+        counter_cache.set(key, when, None)
+    maybe_flush()
+
+
+def maybe_flush():
+    """Flush if no flush has happened in the last ``COUNTER_FLUSH_INTERVAL`` seconds."""
+    interval = getattr(settings, 'COUNTER_FLUSH_INTERVAL', 60)
+    if counter_cache.add(FLUSH_KEY, 1, interval):
+        flush()
+
+
+def flush():
+    """Write buffered visits to the database. Returns the number of watermarks written."""
+    pending = update_pending_set(PENDING_KEY, pop=True)
+    if not pending:
+        return 0
+
+    keys = {_visit_key(user_id, discussion_id): (user_id, discussion_id) for user_id, discussion_id in pending}
+    visits = counter_cache.get_many(list(keys))
+    marks = [
+        DiscussionReadMark(user_id=keys[key][0], discussion_id=keys[key][1], last_read_at=when)
+        for key, when in visits.items()
+    ]
+    # Discussions deleted since the visit would fail the foreign key
+    existing = set(Discussion.objects.filter(pk__in={mark.discussion_id for mark in marks}).values_list('pk', flat=True))
+    marks = [mark for mark in marks if mark.discussion_id in existing]
+    try:
+        DiscussionReadMark.objects.bulk_create(
+            marks, batch_size=BATCH_SIZE,
+            update_conflicts=True, unique_fields=['user', 'discussion'], update_fields=['last_read_at'],
+        )
+    except Exception:
+        update_pending_set(PENDING_KEY, add=pending)  # keep the visits for the next flush
+        raise
+
+    # Visits made since get_many() stay buffered for the next flush
+    requeue = []
+    for key, when in visits.items():
+        if counter_cache.get(key) == when:
+            counter_cache.delete(key)
+        else:
+            requeue.append(keys[key])
+    if requeue:
+        update_pending_set(PENDING_KEY, add=requeue)
+    return len(marks)
+
+
+def annotate_new_replies(discussions, user):
+    """
+    Set ``last_read_at`` (None if never opened) and ``new_replies`` (comments by
+    others since then) on each Discussion in ``discussions``, typically one page.
+    """
+    discussions = list(discussions)
+    if not discussions:
+        return discussions
+
+    rows = Discussion.objects.filter(pk__in=[discussion.pk for discussion in discussions]).annotate(
+        mark=FilteredRelation('read_marks', condition=Q(read_marks__user_id=user.pk)),
+    ).values('pk', 'mark__last_read_at').annotate(
+        new_replies=Count('comments', filter=Q(comments__created_at__gt=F('mark__last_read_at'))
+                          & ~Q(comments__author_id=user.pk)),
+    ).order_by()
+    state = {row['pk']: (row['mark__last_read_at'], row['new_replies']) for row in rows}
+
+    # Visits not flushed yet are newer than any stored watermark
+    keys = {_visit_key(user.pk, discussion.pk): discussion.pk for discussion in discussions}
+    pending = {keys[key]: when for key, when in counter_cache.get_many(list(keys)).items()}
+    if pending:
+        newer = Q()
+        for pk, when in pending.items():
+            newer |= Q(pk=pk, comments__created_at__gt=when)
+        counts = dict(
+            Discussion.objects.filter(pk__in=list(pending)).values('pk').annotate(
+                new_replies=Count('comments', filter=newer & ~Q(comments__author_id=user.pk)),
+            ).order_by().values_list('pk', 'new_replies')
+        )
+        for pk, when in pending.items():
+            state[pk] = (when, counts.get(pk, 0))
+
+    for discussion in discussions:
+        discussion.last_read_at, discussion.new_replies = state.get(discussion.pk, (None, 0))
+    return discussions
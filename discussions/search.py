@@ -0,0 +1,227 @@
+# discussions/search.py
+"""
+Full-text search over discussions and comments.
+
+Every discussion (title + content) and comment (content) has one row in the
+``discussions_search`` table, created by migration 0003 for the database in
+use:
+
+* SQLite: an FTS5 virtual table ranked with ``bm25()`` and excerpted with
+  ``snippet()``.
+* PostgreSQL: a table with a generated, weighted ``tsvector`` column and a GIN
+  index, ranked with ``ts_rank()`` and excerpted with ``ts_headline()``.
+
+Other databases fall back to ``icontains`` lookups. Rows are keyed by
+``doc_id`` (``2 * id`` for discussions, ``2 * id + 1`` for comments) and kept in
+sync by the save/delete signals in ``discussions.signals``; the
+``rebuild_search_index`` command repopulates the table from scratch.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+TABLE = 'discussions_search'
+SEARCH_LIMIT = 50
+TITLE_WEIGHT = 10.0
+
+_START, _STOP = '\x02', '\x03'
+WORD_RE = re.compile(r'\w+')
+
+SearchResult = namedtuple('SearchResult', ['discussion_id', 'comment_id', 'rank', 'snippet'])
+
+
+def _doc_id(discussion_id=None, comment_id=None):
+    return comment_id * 2 + 1 if comment_id is not None else discussion_id * 2
+
+
+def _split_doc_id(doc_id):
+    return (doc_id // 2, None) if doc_id % 2 == 0 else (None, doc_id // 2)
+
+
+def _highlight(snippet):
+    """Escape an excerpt and turn the backend's match markers into <mark> tags."""
+    return mark_safe(escape(snippet).replace(_START, '<mark>').replace(_STOP, '</mark>'))
+
+
+class SQLiteBackend:
+    def write(self, cursor, rows):
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, discussion_id, section_id, title, body) VALUES (%s, %s, %s, %s, %s)', rows
+        )
+
+    def delete(self, cursor, doc_ids):
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(doc_id,) for doc_id in doc_ids])
+
+    def query(self, cursor, words, section_ids, limit):
+        # Quote every word so user input can never be parsed as FTS5 query syntax
+        match = ' '.join('"%s"' % word for word in words)
+        placeholders = ', '.join(['%s'] * len(section_ids))
+        cursor.execute(
+            f"SELECT rowid, discussion_id, bm25({TABLE}, 0, 0, %s, 1.0) AS score, "
+            f"snippet({TABLE}, -1, %s, %s, '…', 16) "
+            f"FROM {TABLE} WHERE {TABLE} MATCH %s AND section_id IN ({placeholders}) "
+            f"ORDER BY score LIMIT %s",
+            [TITLE_WEIGHT, _START, _STOP, match, *section_ids, limit],
+        )
+        # bm25() is lower-is-better; flip it so callers can sort descending for every backend
+        return [(doc_id, discussion_id, -score, snippet) for doc_id, discussion_id, score, snippet in cursor.fetchall()]
+
+
+class PostgreSQLBackend:
+    def write(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (doc_id, discussion_id, section_id, title, body) VALUES (%s, %s, %s, %s, %s) '
+            f'ON CONFLICT (doc_id) DO UPDATE SET title = EXCLUDED.title, body = EXCLUDED.body, '
+            f'section_id = EXCLUDED.section_id',
+            rows,
+        )
+
+    def delete(self, cursor, doc_ids):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE doc_id = ANY(%s)', [list(doc_ids)])
+
+    def query(self, cursor, words, section_ids, limit):
+        cursor.execute(
+            f"SELECT doc_id, discussion_id, ts_rank(document, query) AS score, "
+            f"ts_headline('english', title || ' ' || body, query, %s) "
+            f"FROM {TABLE}, plainto_tsquery('english', %s) query "
+            f"WHERE document @@ query AND section_id = ANY(%s) "
+            f"ORDER BY score DESC LIMIT %s",
+            [f'StartSel={_START}, StopSel={_STOP}, MaxWords=30, MinWords=12', ' '.join(words),
+             list(section_ids), limit],
+        )
+        return cursor.fetchall()
+
+
+_BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgreSQLBackend,
+}
+
+
+def get_backend():
+    """The full-text backend for the default database, or None to fall back to icontains."""
+    backend = _BACKENDS.get(connection.vendor)
+    return backend() if backend else None
+
+
+def index_discussion(discussion):
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.write(cursor, [(_doc_id(discussion.id), discussion.id, discussion.section_id,
+                                discussion.title, discussion.content)])
+
+
+def index_comment(comment, section_id=None):
+    backend = get_backend()
+    if backend is None:
+        return
+    if section_id is None:
+        section_id = comment.discussion.section_id
+    with connection.cursor() as cursor:
+        backend.write(cursor, [(_doc_id(comment_id=comment.id), comment.discussion_id, section_id,
+                                '', comment.content)])
+
+
+def remove_from_index(discussion_id=None, comment_id=None):
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.delete(cursor, [_doc_id(discussion_id, comment_id)])
+
+
+def remove_discussion_from_index(discussion_id, comment_ids=()):
+    """Remove a discussion and its comments from the index with one statement."""
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.delete(cursor, [_doc_id(discussion_id)] + [_doc_id(comment_id=comment_id) for comment_id in comment_ids])
+
+
+def rebuild_index():
+    """Recreate every row of the search table. Returns the number of documents indexed."""
+    backend = get_backend()
+    if backend is None:
+        return 0
+    from .models import Comment, Discussion
+
+    count = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        for discussion in Discussion.objects.only('id', 'section_id', 'title', 'content').iterator(chunk_size=500):
+            backend.write(cursor, [(_doc_id(discussion.id), discussion.id, discussion.section_id,
+                                    discussion.title, discussion.content)])
+            count += 1
+        comments = Comment.objects.values_list('id', 'discussion_id', 'discussion__section_id', 'content')
+        for comment_id, discussion_id, section_id, content in comments.iterator(chunk_size=500):
+            backend.write(cursor, [(_doc_id(comment_id=comment_id), discussion_id, section_id, '', content)])
+            count += 1
+    return count
+
+
+def _fallback_search(words, section_ids, limit):
+    from .models import Comment, Discussion
+
+    discussion_filter, comment_filter = Q(), Q()
+    for word in words:
+        discussion_filter &= Q(title__icontains=word) | Q(content__icontains=word)
+        comment_filter &= Q(content__icontains=word)
+    results = [
+        SearchResult(discussion_id, None, 0, escape(content[:200]))
+        for discussion_id, content in Discussion.objects.filter(discussion_filter, section_id__in=section_ids)
+        .values_list('id', 'content')[:limit]
+    ]
+    results += [
+        SearchResult(discussion_id, comment_id, 0, escape(content[:200]))
+        for comment_id, discussion_id, content in Comment.objects.filter(
+            comment_filter, discussion__section_id__in=section_ids
+        ).values_list('id', 'discussion_id', 'content')[:limit - len(results)]
+    ]
+    return results
+
+
+def search(query, section_ids, limit=SEARCH_LIMIT):
+    """
+    Search discussions and comments in ``section_ids`` for all words of ``query``.
+
+    Returns up to ``limit`` ``SearchResult`` tuples, best match first. ``snippet``
+    is an HTML-safe excerpt with the matched words wrapped in ``<mark>``;
+    ``comment_id`` is None for matches in a discussion itself.
+    """
+    words = WORD_RE.findall(query or '')
+    section_ids = list(section_ids)
+    if not words or not section_ids:
+        return []
+
+    backend = get_backend()
+    if backend is None:
+        return _fallback_search(words, section_ids, limit)
+
+    with connection.cursor() as cursor:
+        rows = backend.query(cursor, words, section_ids, limit)
+    results = []
+    for doc_id, discussion_id, rank, snippet in rows:
+        _, comment_id = _split_doc_id(doc_id)
+        results.append(SearchResult(discussion_id, comment_id, rank, _highlight(snippet)))
+    return results
+
+
+def matching_discussions(query, section_ids, limit=SEARCH_LIMIT):
+    """
+    Ids of discussions matching ``query`` (in the discussion or any of its
+    comments), best first, mapped to the snippet of their best match.
+    """
+    best = {}
+    for result in search(query, section_ids, limit=limit * 3):
+        best.setdefault(result.discussion_id, result.snippet)
+        if len(best) == limit:
+            break
+    return best
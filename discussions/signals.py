@@ -0,0 +1,89 @@
+# discussions/signals.py
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from analytics.counters import counters_flushed
+from courses.storage import track_file_references
+
+from .live import publish_comment
+from .models import Comment, Discussion
+from .ranking import refresh_vote_totals, update_hot_scores
+from .search import index_comment, index_discussion, remove_discussion_from_index, remove_from_index
+
+track_file_references(Discussion, 'attachment')
+track_file_references(Comment, 'attachment')
+
+
+def _indexed_fields(instance):
+    # None when loaded with only()/defer(): such saves leave the index alone
+    values = [instance.__dict__.get(field) for field in instance.SEARCH_FIELDS]
+    return None if None in values else tuple(values)
+
+
+@receiver(post_init, sender=Discussion)
+@receiver(post_init, sender=Comment)
+def remember_indexed_text(sender, instance, **kwargs):
+    instance._indexed_text = _indexed_fields(instance)
+
+
+@receiver(post_save, sender=Discussion)
+def discussion_saved(sender, instance, created, **kwargs):
+    if created:
+        update_hot_scores([instance.id])
+    
+    current = _indexed_fields(instance)
+    if current is not None and (created or current != instance._indexed_text):
+        index_discussion(instance)
+        instance._indexed_text = current
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        Discussion.objects.filter(pk=instance.discussion_id).update(comment_count=F('comment_count') + 1)
+        update_hot_scores([instance.discussion_id])
+        transaction.on_commit(lambda: publish_comment(instance))
+    
+    current = _indexed_fields(instance)
+    if current is not None and (created or current != instance._indexed_text):
+        index_comment(instance)
+        instance._indexed_text = current
+
+
+def _deleting_discussion(origin):
+    """True when ``origin`` (the object or queryset ``delete()`` was called on) is a discussion."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is Discussion
+
+
+@receiver(pre_delete, sender=Discussion)
+def discussion_deleting(sender, instance, **kwargs):
+    # The comments are gone by post_delete; remember their ids to unindex them in one go
+    instance._comment_ids = list(instance.comments.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Discussion)
+def discussion_deleted(sender, instance, **kwargs):
+    remove_discussion_from_index(instance.id, getattr(instance, '_comment_ids', ()))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    if _deleting_discussion(origin):
+        # Deleted along with its discussion, which is unindexed with all its comments
+        return
+    Discussion.objects.filter(pk=instance.discussion_id).update(comment_count=Greatest(F('comment_count') - 1, 0))
+    # The in-memory upvotes may be stale (votes are applied with F()), so re-sum the rest
+    refresh_vote_totals([instance.discussion_id])
+    update_hot_scores([instance.discussion_id])
+    remove_from_index(comment_id=instance.id)
+
+
+@receiver(counters_flushed, sender=Discussion)
+def discussion_views_flushed(sender, field, pks, **kwargs):
+    if field == 'views_count':
+        update_hot_scores(pks)
@@ -1,3 +1,594 @@
-from django.test import TestCase
+import datetime
+import threading
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import College, User
+from analytics.counters import counter_cache
+from colleges.models import ClassSection, Course, Department, Enrollment, Student
+from . import read_state, search
+from .live import RESYNC, InProcessBroker, channel_for, stream_slots
+from .models import Comment, CommentVote, Discussion, DiscussionReadMark
+from .ranking import DECAY_SECONDS, HOT_EPOCH, hot_score, trending
+from .threads import comment_thread, discussion_page
+from .votes import cast_vote, reconcile_comment_votes
+
+
+class DiscussionTestData(TestCase):
+    """A section with its teacher and two enrolled students, plus a section of another teacher."""
+
+    @classmethod
+    def setUpTestData(cls):
+        college = College.objects.create(name='College', code='C1', address='a', established_year=2000,
+                                         contact_email='c@example.com', contact_phone='1')
+        department = Department.objects.create(college=college, name='Computer Science', code='CS')
+        cls.teacher = User.objects.create_user('teacher', password='pw', role='teacher', college=college)
+        other_teacher = User.objects.create_user('other', password='pw', role='teacher', college=college)
+        cls.section, cls.other_section = [
+            ClassSection.objects.create(
+                course=Course.objects.create(department=department, name=f'Course {number}', code=f'CS{number}',
+                                             credits=3, semester=1),
+                section_name='A', academic_year='2024-2025', year=1, teacher=teacher,
+            )
+            for number, teacher in enumerate([cls.teacher, other_teacher])
+        ]
+        cls.students = []
+        for number in range(2):
+            user = User.objects.create_user(f'student{number}', password='pw', role='student', college=college)
+            student = Student.objects.create(user=user, department=department, roll_number=f'R{number:03d}',
+                                             admission_year=2024, current_semester=1, guardian_name='g',
+                                             guardian_phone='1')
+            Enrollment.objects.create(student=student, section=cls.section)
+            cls.students.append(user)
+
+    def setUp(self):
+        cache.clear()
+        counter_cache.clear()
+
+    def discuss(self, title='Question', content='c', section=None, author=None, **kwargs):
+        return Discussion.objects.create(section=section or self.section, author=author or self.students[0],
+                                         title=title, content=content, **kwargs)
+
+    def comment(self, discussion, content='reply', author=None, parent=None):
+        return Comment.objects.create(discussion=discussion, author=author or self.teacher, content=content,
+                                      parent=parent)
+
+
+class SearchTests(DiscussionTestData):
+    def test_titles_rank_above_bodies(self):
+        in_body = self.discuss('Homework', 'How does recursion terminate?')
+        in_title = self.discuss('Recursion question', 'Stuck on exercise 3')
+        results = search.search('recursion', [self.section.id])
+        self.assertEqual([result.discussion_id for result in results], [in_title.id, in_body.id])
+        self.assertIn('<mark>recursion</mark>', results[1].snippet.lower())
+
+    def test_comments_are_searched(self):
+        discussion = self.discuss('Exam', 'When is it?')
+        comment = self.comment(discussion, 'Tuesday in the lecture hall')
+        [result] = search.search('lecture hall', [self.section.id])
+        self.assertEqual((result.discussion_id, result.comment_id), (discussion.id, comment.id))
+        self.assertEqual(search.matching_discussions('tuesday', [self.section.id]),
+                         {discussion.id: '<mark>Tuesday</mark> in the lecture hall'})
+
+    def test_index_follows_edits_and_deletes(self):
+        discussion = self.discuss('Graphs', 'Dijkstra')
+        discussion.content = 'Bellman-Ford'
+        discussion.save()
+        self.assertEqual(search.search('dijkstra', [self.section.id]), [])
+        self.assertEqual(len(search.search('bellman', [self.section.id])), 1)
+        comment = self.comment(discussion, 'Negative weights')
+        comment.delete()
+        self.assertEqual(search.search('negative', [self.section.id]), [])
+
+    def test_query_syntax_and_markup_are_escaped(self):
+        self.discuss('Markup', 'Use <b>bold</b> AND NEAR(x) "quotes"')
+        [result] = search.search('bold AND NEAR', [self.section.id])
+        self.assertNotIn('<b>', result.snippet)
+        self.assertEqual(search.search('"  * ', [self.section.id]), [])
+
+    def test_results_are_limited_to_the_given_sections(self):
+        self.discuss('Sorting', section=self.other_section, author=self.teacher)
+        self.assertEqual(search.search('sorting', [self.section.id]), [])
+        self.assertEqual(search.search('sorting', []), [])
+
+    def test_rebuild_command(self):
+        discussion = self.discuss('Heaps', 'priority queues')
+        self.comment(discussion, 'binary heap')
+        search.remove_discussion_from_index(discussion.id, discussion.comments.values_list('id', flat=True))
+        self.assertEqual(search.search('heap', [self.section.id]), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        results = search.search('heap', [self.section.id])
+        self.assertEqual([result.comment_id for result in results], [None, discussion.comments.get().id])
+
+    def test_search_view_only_shows_readable_sections(self):
+        mine = self.discuss('Pointers explained')
+        self.discuss('Pointers elsewhere', section=self.other_section, author=self.teacher)
+        self.client.login(username='student1', password='pw')
+        response = self.client.get(reverse('discussion_search'), {'q': 'pointers'})
+        self.assertEqual([row['discussion'] for row in response.context['results']], [mine])
+
+    def test_discussion_list_search(self):
+        self.discuss('Trees')
+        match = self.discuss('Tries', 'prefix trees')
+        self.client.login(username='teacher', password='pw')
+        response = self.client.get(reverse('discussion_list', args=[self.section.id]), {'search': 'prefix'})
+        self.assertEqual(response.context['discussions'], [match])
+
+
+class CommentThreadTests(DiscussionTestData):
+    def setUp(self):
+        super().setUp()
+        self.discussion = self.discuss()
+
+    def shape(self, comments):
+        return [(comment.content, self.shape(comment.children)) for comment in comments]
+
+    def test_tree_is_built_depth_first(self):
+        first = self.comment(self.discussion, 'first')
+        second = self.comment(self.discussion, 'second')
+        reply = self.comment(self.discussion, 'reply 1', parent=first)
+        self.comment(self.discussion, 'reply 2', parent=first)
+        self.comment(self.discussion, 'nested', parent=reply)
+        self.comment(self.discussion, 'answer', parent=second)
+        comments, _ = comment_thread(self.discussion, self.students[0])
+        self.assertEqual(self.shape(comments), [
+            ('second', [('answer', [])]),
+            ('first', [('reply 1', [('nested', [])]), ('reply 2', [])]),
+        ])
+
+    def test_solution_comes_first(self):
+        solution = self.comment(self.discussion, 'solution')
+        self.comment(self.discussion, 'later')
+        Comment.objects.filter(pk=solution.pk).update(is_solution=True)
+        comments, _ = comment_thread(self.discussion, self.students[0])
+        self.assertEqual([comment.content for comment in comments], ['solution', 'later'])
+
+    def test_query_count_does_not_grow_with_replies(self):
+        root = self.comment(self.discussion, 'root')
+        with CaptureQueriesContext(connection) as small:
+            comment_thread(self.discussion, self.students[0])
+        parent = root
+        for number in range(10):
+            parent = self.comment(self.discussion, f'reply {number}', parent=parent, author=self.students[1])
+        with CaptureQueriesContext(connection) as large:
+            comments, _ = comment_thread(self.discussion, self.students[0])
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        with self.assertNumQueries(0):
+            node = comments[0]
+            while node.children:
+                node = node.children[0]
+                node.author.username
+        self.assertEqual(node.content, 'reply 9')
+
+    def test_user_vote_is_annotated(self):
+        voted, _ = self.comment(self.discussion, 'voted'), self.comment(self.discussion, 'not voted')
+        CommentVote.objects.create(comment=voted, user=self.students[0], vote_type=-1)
+        comments, _ = comment_thread(self.discussion, self.students[0])
+        self.assertEqual({comment.content: comment.user_vote for comment in comments},
+                         {'voted': -1, 'not voted': None})
+        comments, _ = comment_thread(self.discussion, self.students[1])
+        self.assertEqual([comment.user_vote for comment in comments], [None, None])
+
+    def test_top_level_comments_are_paged_with_their_replies(self):
+        roots = [self.comment(self.discussion, f'root {number}') for number in range(3)]
+        self.comment(self.discussion, 'reply', parent=roots[0])
+        comments, page = comment_thread(self.discussion, self.students[0], page=2, per_page=2)
+        self.assertEqual(self.shape(comments), [('root 0', [('reply', [])])])
+        self.assertEqual(page.paginator.num_pages, 2)
+        self.assertEqual(comment_thread(self.discussion, self.students[0], page='x', per_page=2)[1].number, 1)
+
+    def test_deep_replies_are_attached_at_the_maximum_depth(self):
+        parent = self.comment(self.discussion, 'root')
+        for number in range(Comment.MAX_DEPTH + 2):
+            parent = self.comment(self.discussion, f'reply {number}', parent=parent)
+        self.assertEqual(parent.depth, Comment.MAX_DEPTH - 1)
+        self.assertLessEqual(max(len(path) for path in Comment.objects.values_list('path', flat=True)), 255)
+
+    def test_path_backfill_caps_the_depth(self):
+        fill_comment_paths = import_module('discussions.migrations.0004_comment_path').fill_comment_paths
+        chain = [self.comment(self.discussion, 'root')]
+        for number in range(Comment.MAX_DEPTH + 2):
+            chain.append(self.comment(self.discussion, f'reply {number}', parent=chain[-1]))
+        # Threads from before the cap could nest without limit
+        for parent, reply in zip(chain, chain[1:]):
+            Comment.objects.filter(pk=reply.pk).update(parent=parent)
+        Comment.objects.update(path='')
+
+        fill_comment_paths(apps, None)
+        comments = Comment.objects.in_bulk([comment.pk for comment in chain])
+        self.assertEqual(max(comment.depth for comment in comments.values()), Comment.MAX_DEPTH - 1)
+        for comment in comments.values():
+            parent_path = comments[comment.parent_id].path if comment.parent_id else ''
+            self.assertEqual(comment.path, f'{parent_path}{comment.pk:010d}/')
+        self.assertEqual(comments[chain[-1].pk].parent_id, chain[Comment.MAX_DEPTH - 2].pk)
+
+
+class VoteTests(DiscussionTestData):
+    def setUp(self):
+        super().setUp()
+        self.discussion = self.discuss()
+        self.reply = self.comment(self.discussion)
+
+    def totals(self):
+        self.reply.refresh_from_db()
+        self.discussion.refresh_from_db()
+        return self.reply.upvotes, self.discussion.vote_total
+
+    def test_votes_toggle(self):
+        first, second = self.students
+        self.assertEqual(cast_vote(self.reply.id, first, 1), ('added', 1))
+        self.assertEqual(cast_vote(self.reply.id, second, 1), ('added', 2))
+        self.assertEqual(cast_vote(self.reply.id, first, -1), ('changed', 0))
+        self.assertEqual(cast_vote(self.reply.id, first, -1), ('removed', 1))
+        self.assertEqual(self.totals(), (1, 1))
+        self.assertEqual(CommentVote.objects.get().user, second)
+        with self.assertRaises(ValueError):
+            cast_vote(self.reply.id, first, 2)
+
+    def test_reconcile_repairs_drift(self):
+        cast_vote(self.reply.id, self.students[0], 1)
+        Comment.objects.filter(pk=self.reply.pk).update(upvotes=7)
+        self.assertEqual(reconcile_comment_votes(), 1)
+        self.assertEqual(self.totals(), (1, 1))
+        self.assertEqual(reconcile_comment_votes([self.reply.id]), 0)
+
+        Comment.objects.filter(pk=self.reply.pk).update(upvotes=3)
+        out = StringIO()
+        call_command('reconcile_comment_votes', stdout=out)
+        self.assertIn('Corrected vote totals on 1 comments.', out.getvalue())
+
+    def test_vote_view(self):
+        self.client.login(username='student0', password='pw')
+        url = reverse('vote_comment', args=[self.reply.id])
+        response = self.client.post(url, {'vote_type': '-1'})
+        self.assertEqual(response.json(), {'success': True, 'action': 'added', 'upvotes': -1})
+        for vote_type in ['2', 'up']:
+            self.assertEqual(self.client.post(url, {'vote_type': vote_type}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.totals(), (-1, -1))
+
+    def test_marking_a_solution_keeps_the_votes(self):
+        stale = Comment.objects.get(pk=self.reply.pk)
+        cast_vote(self.reply.id, self.students[1], 1)
+        self.client.login(username='teacher', password='pw')
+        with mock.patch('discussions.views.get_object_or_404', return_value=stale):
+            self.client.get(reverse('mark_solution', args=[self.reply.id]))
+        self.reply.refresh_from_db()
+        self.assertEqual((self.reply.is_solution, self.reply.upvotes), (True, 1))
+
+    def test_editing_a_comment_keeps_the_votes(self):
+        stale = Comment.objects.get(pk=self.reply.pk)
+        cast_vote(self.reply.id, self.students[1], 1)
+        self.client.login(username='teacher', password='pw')
+        with mock.patch('discussions.views.get_object_or_404', return_value=stale):
+            response = self.client.post(reverse('edit_comment', args=[self.reply.id]), {'content': 'edited'})
+        self.assertRedirects(response, reverse('discussion_detail', args=[self.discussion.id]),
+                             fetch_redirect_response=False)
+        self.reply.refresh_from_db()
+        self.assertEqual((self.reply.content, self.reply.upvotes), ('edited', 1))
+
+
+class DiscussionListTests(DiscussionTestData):
+    def titles(self, discussions):
+        return [discussion.title for discussion in discussions]
+
+    def test_pages_are_pinned_first_then_newest(self):
+        for number in range(5):
+            self.discuss(f'Topic {number}', is_pinned=number == 1)
+        discussions = Discussion.objects.filter(section=self.section)
+        page, cursor = discussion_page(discussions, page_size=3)
+        self.assertEqual(self.titles(page), ['Topic 1', 'Topic 4', 'Topic 3'])
+        page, cursor = discussion_page(discussions, cursor, page_size=3)
+        self.assertEqual(self.titles(page), ['Topic 2', 'Topic 0'])
+        self.assertIsNone(cursor)
+        self.assertEqual(self.titles(discussion_page(discussions, '%%%', page_size=1)[0]), ['Topic 1'])
+
+    def test_list_view(self):
+        self.discuss('Question', category='question')
+        self.discuss('Announcement', category='announcement')
+        self.client.login(username='student0', password='pw')
+        url = reverse('discussion_list', args=[self.section.id])
+        response = self.client.get(url)
+        self.assertEqual(self.titles(response.context['discussions']), ['Announcement', 'Question'])
+        self.assertIsNone(response.context['next_cursor'])
+        response = self.client.get(url, {'category': 'question'})
+        self.assertEqual(self.titles(response.context['discussions']), ['Question'])
+
+    def test_comment_count_is_maintained(self):
+        discussion = self.discuss()
+        first = self.comment(discussion)
+        self.comment(discussion, parent=first)
+        self.comment(discussion)
+        discussion.refresh_from_db()
+        self.assertEqual(discussion.comment_count, 3)
+
+        # The reply goes with its parent
+        first.delete()
+        discussion.refresh_from_db()
+        self.assertEqual(discussion.comment_count, 1)
+
+    def test_moderation_keeps_the_counters(self):
+        discussion = self.discuss()
+        stale = Discussion.objects.get(pk=discussion.pk)
+        self.comment(discussion)
+        Discussion.objects.filter(pk=discussion.pk).update(views_count=7)
+        self.client.login(username='teacher', password='pw')
+        with mock.patch('discussions.views.get_object_or_404', return_value=stale):
+            for name in ['discussion_toggle_pin', 'discussion_toggle_lock', 'discussion_resolve']:
+                self.client.get(reverse(name, args=[discussion.pk]))
+        discussion.refresh_from_db()
+        self.assertEqual((discussion.is_pinned, discussion.is_locked, discussion.is_resolved), (True, True, True))
+        self.assertEqual((discussion.comment_count, discussion.views_count), (1, 7))
+
+    def test_editing_keeps_the_counters(self):
+        discussion = self.discuss()
+        stale = Discussion.objects.get(pk=discussion.pk)
+        self.comment(discussion)
+        self.client.login(username='student0', password='pw')
+        with mock.patch('discussions.views.get_object_or_404', return_value=stale):
+            response = self.client.post(reverse('discussion_edit', args=[discussion.pk]),
+                                        {'title': 'Renamed', 'content': 'c', 'category': 'general'})
+        self.assertRedirects(response, reverse('discussion_detail', args=[discussion.pk]),
+                             fetch_redirect_response=False)
+        discussion.refresh_from_db()
+        self.assertEqual((discussion.title, discussion.comment_count), ('Renamed', 1))
+
+
+@override_settings(COUNTER_FLUSH_INTERVAL=60)
+class ReadStateTests(DiscussionTestData):
+    def setUp(self):
+        super().setUp()
+        # Keep mark_read() from flushing on its own unless a test asks for it
+        counter_cache.add(read_state.FLUSH_KEY, 1, 60)
+        self.discussion = self.discuss()
+        self.reader = self.students[0]
+        self.an_hour_ago = timezone.now() - datetime.timedelta(hours=1)
+
+    def new_replies(self, user=None):
+        [discussion] = read_state.annotate_new_replies([Discussion.objects.get(pk=self.discussion.pk)],
+                                                       user or self.reader)
+        return discussion.last_read_at, discussion.new_replies
+
+    def test_unread_discussion(self):
+        self.comment(self.discussion)
+        self.assertEqual(self.new_replies(), (None, 0))
+
+    def test_replies_by_others_since_the_visit_are_new(self):
+        read_state.mark_read(self.reader, self.discussion, self.an_hour_ago)
+        self.comment(self.discussion)
+        self.comment(self.discussion, author=self.students[1])
+        self.comment(self.discussion, author=self.reader)
+        self.assertEqual(self.new_replies(), (self.an_hour_ago, 2))
+        # The same numbers once the buffered visit is written
+        self.assertEqual(read_state.flush(), 1)
+        self.assertEqual(self.new_replies(), (self.an_hour_ago, 2))
+
+        read_state.mark_read(self.reader, self.discussion)
+        self.assertEqual(self.new_replies()[1], 0)
+        self.assertEqual(self.new_replies(self.students[1]), (None, 0))
+
+    def test_repeat_visits_only_overwrite_their_own_key(self):
+        with mock.patch('discussions.read_state.update_pending_set',
+                        wraps=read_state.update_pending_set) as update_pending_set:
+            read_state.mark_read(self.reader, self.discussion, self.an_hour_ago)
+            later = self.an_hour_ago + datetime.timedelta(minutes=30)
+            read_state.mark_read(self.reader, self.discussion, later)
+        self.assertEqual(update_pending_set.call_count, 1)
+        self.assertEqual(self.new_replies()[0], later)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(read_state.flush(), 1)
+        self.assertEqual(DiscussionReadMark.objects.get().last_read_at, later)
+        self.assertIsNone(counter_cache.get(read_state._visit_key(self.reader.pk, self.discussion.pk)))
+        self.assertEqual(read_state.flush(), 0)
+
+    def test_visit_during_a_flush_is_written_by_the_next_one(self):
+        read_state.mark_read(self.reader, self.discussion, self.an_hour_ago)
+        later = self.an_hour_ago + datetime.timedelta(minutes=30)
+        bulk_create = DiscussionReadMark.objects.bulk_create
+
+        def visit_then_write(*args, **kwargs):
+            read_state.mark_read(self.reader, self.discussion, later)
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(DiscussionReadMark.objects, 'bulk_create', side_effect=visit_then_write):
+            read_state.flush()
+        self.assertEqual(DiscussionReadMark.objects.get().last_read_at, self.an_hour_ago)
+        self.assertEqual(read_state.flush(), 1)
+        self.assertEqual(DiscussionReadMark.objects.get().last_read_at, later)
+
+    def test_visits_to_deleted_discussions_are_dropped(self):
+        read_state.mark_read(self.reader, self.discussion)
+        self.discussion.delete()
+        self.assertEqual(read_state.flush(), 0)
+        self.assertFalse(DiscussionReadMark.objects.exists())
+
+    def test_failed_flush_keeps_the_visits(self):
+        read_state.mark_read(self.reader, self.discussion, self.an_hour_ago)
+        with mock.patch.object(DiscussionReadMark.objects, 'bulk_create', side_effect=DatabaseError('down')):
+            with self.assertRaises(DatabaseError):
+                read_state.flush()
+        self.assertEqual(read_state.flush(), 1)
+
+    def test_detail_view_marks_the_discussion_read(self):
+        self.comment(self.discussion)
+        self.client.login(username='student0', password='pw')
+        self.client.get(reverse('discussion_detail', args=[self.discussion.pk]))
+        self.assertEqual(self.new_replies()[1], 0)
+        out = StringIO()
+        call_command('flush_read_marks', stdout=out)
+        self.assertIn('Wrote 1 read watermarks.', out.getvalue())
+
+
+class LiveUpdateTests(DiscussionTestData):
+    def test_events_after(self):
+        broker = InProcessBroker()
+        start = broker.last_event_id('a')
+        first = broker.publish('a', 'comment', {'id': 1})
+        broker.publish('b', 'comment', {'id': 2})
+        second = broker.publish('a', 'vote', {'id': 1, 'upvotes': 3})
+        self.assertEqual(broker.events_after('a', start, timeout=0), [
+            (first, 'comment', {'id': 1}), (second, 'vote', {'id': 1, 'upvotes': 3}),
+        ])
+        self.assertEqual(broker.events_after('a', first, timeout=0), [(second, 'vote', {'id': 1, 'upvotes': 3})])
+        self.assertEqual(broker.events_after('a', second, timeout=0.01), [])
+        self.assertEqual(broker.last_event_id('a'), second)
+
+    def test_clients_that_missed_events_must_resync(self):
+        broker = InProcessBroker(buffer_size=2)
+        start = broker.last_event_id('a')
+        for number in range(3):
+            broker.publish('a', 'vote', {'id': number})
+        self.assertIs(broker.events_after('a', start, timeout=0), RESYNC)
+        self.assertIs(broker.events_after('a', 'old-process:1', timeout=0), RESYNC)
+        self.assertIs(broker.events_after('a', None, timeout=0), RESYNC)
+
+    def test_publish_wakes_only_its_own_channel(self):
+        broker = InProcessBroker()
+        start = broker.last_event_id('a')
+        received = []
+        waiter = threading.Thread(target=lambda: received.append(broker.events_after('a', start, timeout=5)))
+        waiter.start()
+        waiter.join(0.1)  # let it start waiting
+
+        broker.publish('b', 'vote', {'id': 1})
+        waiter.join(0.2)
+        self.assertTrue(waiter.is_alive())
+        event_id = broker.publish('a', 'vote', {'id': 2})
+        waiter.join(5)
+        self.assertEqual(received, [[(event_id, 'vote', {'id': 2})]])
+
+    def stream(self, discussion, **kwargs):
+        response = self.client.get(reverse('discussion_stream', args=[discussion.pk]), **kwargs)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    @override_settings(DISCUSSION_LIVE_UPDATES=True, DISCUSSION_STREAM_MAX_SECONDS=0.1,
+                       DISCUSSION_STREAM_HEARTBEAT=0.02)
+    def test_stream_relays_new_comments(self):
+        discussion = self.discuss()
+        broker = InProcessBroker()
+        with mock.patch('discussions.live._broker', broker):
+            start = broker.last_event_id(channel_for(discussion.pk))
+            with self.captureOnCommitCallbacks(execute=True):
+                comment = self.comment(discussion, 'live reply')
+            self.client.login(username='student1', password='pw')
+            body = self.stream(discussion, data={'last_event_id': start})
+            self.assertIn(f'id: {broker.last_event_id(channel_for(discussion.pk))}\nevent: comment\n', body)
+            self.assertIn(f'"id": {comment.id}', body)
+            self.assertIn('live reply', body)
+            self.assertIn(': heartbeat', body)
+
+            body = self.stream(discussion, HTTP_LAST_EVENT_ID='old-process:5')
+            self.assertIn('event: resync', body)
+        self.assertEqual(stream_slots.open, 0)
+
+    def test_stream_is_off_by_default(self):
+        discussion = self.discuss()
+        self.client.login(username='student1', password='pw')
+        response = self.client.get(reverse('discussion_stream', args=[discussion.pk]))
+        self.assertEqual(response.status_code, 404)
+        page = self.client.get(reverse('discussion_detail', args=[discussion.pk]))
+        self.assertNotContains(page, 'EventSource(')
+
+    @override_settings(DISCUSSION_LIVE_UPDATES=True, DISCUSSION_STREAM_MAX_CLIENTS=1,
+                       DISCUSSION_STREAM_BUSY_RETRY_SECONDS=30)
+    def test_streams_per_process_are_capped(self):
+        discussion = self.discuss()
+        self.client.login(username='student1', password='pw')
+        url = reverse('discussion_stream', args=[discussion.pk])
+        first = self.client.get(url)
+        self.assertEqual(stream_slots.open, 1)
+        busy = self.client.get(url)
+        self.assertEqual(busy.status_code, 503)
+        self.assertEqual(busy['Retry-After'], '30')
+        # Closing the first stream (the client went away) frees its slot, even unread
+        first.close()
+        self.assertEqual(stream_slots.open, 0)
+        self.client.get(url).close()
+        self.assertEqual(stream_slots.open, 0)
+        page = self.client.get(reverse('discussion_detail', args=[discussion.pk]))
+        self.assertContains(page, 'setTimeout(connect, 30000)')
+
+    def test_stream_is_for_members_of_the_section(self):
+        discussion = self.discuss(section=self.other_section, author=self.teacher)
+        for username in ['student0', 'teacher']:
+            self.client.login(username=username, password='pw')
+            response = self.client.get(reverse('discussion_stream', args=[discussion.pk]))
+            self.assertEqual(response.status_code, 403)
+
+
+class RankingTests(DiscussionTestData):
+    def score(self, discussion):
+        discussion.refresh_from_db()
+        return discussion.hot_score
+
+    def test_hot_score(self):
+        later = HOT_EPOCH + datetime.timedelta(seconds=DECAY_SECONDS)
+        self.assertEqual(hot_score(0, 0, 0, HOT_EPOCH), 0)
+        self.assertEqual(hot_score(5, 0, 0, HOT_EPOCH), 1)
+        self.assertEqual(hot_score(0, -3, 0, later), 1)
+        # Ten times the activity makes up for DECAY_SECONDS of age
+        self.assertEqual(hot_score(50, 0, 0, HOT_EPOCH), hot_score(5, 0, 0, later))
+
+    def test_scores_follow_activity(self):
+        discussion = self.discuss()
+        created = self.score(discussion)
+        self.assertEqual(created, hot_score(0, 0, 0, discussion.created_at))
+        reply = self.comment(discussion)
+        cast_vote(reply.id, self.students[1], 1)
+        self.assertEqual(self.score(discussion), hot_score(1, 1, 0, discussion.created_at))
+        reply.delete()
+        self.assertEqual(self.score(discussion), created)
+
+    def test_trending_and_rebuild(self):
+        quiet, busy = self.discuss('Quiet'), self.discuss('Busy')
+        for _ in range(20):
+            self.comment(quiet)
+        Discussion.objects.update(hot_score=0)
+        Discussion.objects.filter(pk=busy.pk).update(views_count=1000)
+        out = StringIO()
+        call_command('rebuild_hot_scores', stdout=out)
+        self.assertIn('Updated hot scores of 2 discussions.', out.getvalue())
+        self.assertEqual(list(trending(Discussion.objects.all())), [busy, quiet])
+        self.assertEqual(list(trending(Discussion.objects.all(), limit=1)), [busy])
+
+    def test_trending_view(self):
+        self.discuss('Mine')
+        self.discuss('Elsewhere', section=self.other_section, author=self.teacher)
+        self.client.login(username='student0', password='pw')
+        response = self.client.get(reverse('trending_discussions'))
+        self.assertEqual([discussion.title for discussion in response.context['discussions']], ['Mine'])
+        response = self.client.get(reverse('section_trending', args=[self.other_section.id]))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    def deleting(self, replies):
+        discussion = self.discuss('Doomed', 'doomed thread')
+        for number in range(replies):
+            self.comment(discussion, f'doomed reply {number}')
+        with CaptureQueriesContext(connection) as queries:
+            discussion.delete()
+        return len(queries.captured_queries)
+
+    def test_deleting_a_discussion_does_not_touch_each_comment(self):
+        self.assertEqual(self.deleting(1), self.deleting(10))
+        self.assertEqual(search.search('doomed', [self.section.id]), [])
+
+    def test_comments_deleted_with_their_author_are_uncounted(self):
+        discussion = self.discuss(author=self.teacher)
+        self.comment(discussion, 'leaving', author=self.students[1])
+        self.comment(discussion, 'staying')
+        self.students[1].delete()
+        discussion.refresh_from_db()
+        self.assertEqual(discussion.comment_count, 1)
+        self.assertEqual(search.search('leaving', [self.section.id]), [])
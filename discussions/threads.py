@@ -0,0 +1,99 @@
+# discussions/threads.py
+"""
+Loading a discussion's comments as a tree.
+
+Each comment stores its materialized ``path`` (see ``Comment.path``), so every
+reply under a set of top-level comments is found with ``path`` prefix filters
+and comes back depth-first from one query ordered by ``path``. Authors are
+joined and the current user's vote is annotated in that same query; the tree
+is then assembled in memory instead of following ``replies`` level by level.
+
+Top-level comments are paged (accepted solution first, then newest), and each
+page carries its complete reply threads.
+
+A section's discussion list is paged with an opaque keyset cursor over
+``(is_pinned, created_at, id)``, which the ``discussion_list_idx`` and
+``discussion_category_idx`` indexes serve directly, so a page costs the same
+however many threads the section has.
+"""
+import base64
+import datetime
+
+from django.core.paginator import Paginator
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import CommentVote
+
+COMMENTS_PER_PAGE = 20
+DISCUSSIONS_PER_PAGE = 20
+
+
+def comment_thread(discussion, user, page=1, per_page=COMMENTS_PER_PAGE):
+    """
+    Return ``(comments, page_obj)`` for one page of ``discussion``'s top-level comments.
+
+    Every comment has ``children`` (its replies, oldest first) and ``user_vote``
+    (1, -1 or None for ``user``'s vote) set.
+    """
+    root_paths = discussion.comments.filter(parent=None).order_by(
+        '-is_solution', '-created_at', '-id'
+    ).values_list('path', flat=True)
+    page_obj = Paginator(root_paths, per_page).get_page(page)
+    root_paths = list(page_obj.object_list)
+    if not root_paths:
+        return [], page_obj
+
+    in_page = Q()
+    for path in root_paths:
+        in_page |= Q(path__startswith=path)
+    comments = discussion.comments.filter(in_page).select_related('author').annotate(
+        user_vote=Subquery(
+            CommentVote.objects.filter(comment=OuterRef('pk'), user_id=user.pk).values('vote_type')[:1]
+        ),
+    ).order_by('path')
+
+    nodes, roots = {}, {}
+    for comment in comments:
+        comment.children = []
+        nodes[comment.id] = comment
+        if comment.parent_id is None:
+            roots[comment.path] = comment
+        elif comment.parent_id in nodes:
+            # Ordered by path, so a parent always comes before its replies
+            nodes[comment.parent_id].children.append(comment)
+    return [roots[path] for path in root_paths if path in roots], page_obj
+
+
+def _encode_cursor(discussion):
+    raw = f'{int(discussion.is_pinned)}|{discussion.created_at.isoformat()}|{discussion.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        pinned, created_at, discussion_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return bool(int(pinned)), datetime.datetime.fromisoformat(created_at), int(discussion_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def discussion_page(discussions, cursor=None, page_size=DISCUSSIONS_PER_PAGE):
+    """
+    Return ``(page, next_cursor)`` from a Discussion queryset, pinned threads
+    first and then newest first.
+
+    ``next_cursor`` is None on the last page. An invalid cursor restarts from the top.
+    """
+    discussions = discussions.order_by('-is_pinned', '-created_at', '-id')
+    position = _decode_cursor(cursor) if cursor else None
+    if position is not None:
+        pinned, created_at, discussion_id = position
+        discussions = discussions.filter(
+            Q(is_pinned__lt=pinned)
+            | Q(is_pinned=pinned, created_at__lt=created_at)
+            | Q(is_pinned=pinned, created_at=created_at, id__lt=discussion_id)
+        )
+
+    page = list(discussions[:page_size + 1])
+    next_cursor = _encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
@@ -5,7 +5,11 @@ urlpatterns = [
     # Discussion forum
     path('<int:section_id>/', views.discussion_list, name='discussion_list'),
     path('<int:section_id>/create/', views.discussion_create, name='discussion_create'),
+    path('search/', views.discussion_search, name='discussion_search'),
+    path('trending/', views.trending_discussions, name='trending_discussions'),
+    path('<int:section_id>/trending/', views.trending_discussions, name='section_trending'),
     path('discussion/<int:pk>/', views.discussion_detail, name='discussion_detail'),
+    path('discussion/<int:pk>/stream/', views.discussion_stream, name='discussion_stream'),
     path('discussion/<int:pk>/edit/', views.discussion_edit, name='discussion_edit'),
     path('discussion/<int:pk>/delete/', views.discussion_delete, name='discussion_delete'),
     path('discussion/<int:pk>/toggle-pin/', views.discussion_toggle_pin, name='discussion_toggle_pin'),
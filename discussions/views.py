@@ -1,12 +1,23 @@
 # discussions/views.py - COMPLETE IMPLEMENTATION
+import json
+import time
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from colleges.models import ClassSection, Student, Enrollment
-from .models import Discussion, Comment, CommentVote
+from colleges.student_context import get_student_context
+from analytics import counters
+from . import search as search_index
+from .live import RESYNC, channel_for, get_broker, stream_slots
+from .models import Discussion, Comment
+from .ranking import trending
+from .read_state import annotate_new_replies, mark_read
 from .forms import DiscussionForm, CommentForm
+from .threads import comment_thread, discussion_page
+from .votes import VOTE_TYPES, cast_vote
 
 @login_required
 def discussion_list(request, section_id):
@@ -15,14 +26,13 @@ def discussion_list(request, section_id):
     
     # Check access
     if request.user.role == 'student':
-        try:
-            student = Student.objects.get(user=request.user)
-            if not Enrollment.objects.filter(student=student, section=section, is_active=True).exists():
-                messages.error(request, 'You are not enrolled in this course.')
-                return redirect('dashboard')
-        except Student.DoesNotExist:
+        student_context = get_student_context(request)
+        if student_context is None:
             messages.error(request, 'Student profile not found.')
             return redirect('dashboard')
+        if not student_context.is_enrolled(section):
+            messages.error(request, 'You are not enrolled in this course.')
+            return redirect('dashboard')
     elif request.user.role == 'teacher':
         if section.teacher != request.user:
             messages.error(request, 'Access denied.')
@@ -36,24 +46,87 @@ def discussion_list(request, section_id):
     if category:
         discussions = discussions.filter(category=category)
     
-    # Search
+    # Search (full-text index over titles, content and comments; best matches first)
     search = request.GET.get('search')
+    cursor = request.GET.get('cursor')
+    next_cursor = None
     if search:
-        discussions = discussions.filter(
-            Q(title__icontains=search) | Q(content__icontains=search)
-        )
-    
-    # Annotate with comment count
-    discussions = discussions.annotate(comment_count=Count('comments'))
+        snippets = search_index.matching_discussions(search, [section.id])
+        order = {discussion_id: position for position, discussion_id in enumerate(snippets)}
+        discussions = sorted(discussions.filter(id__in=snippets), key=lambda discussion: order[discussion.id])
+        for discussion in discussions:
+            discussion.search_snippet = snippets[discussion.id]
+    else:
+        # Keyset pagination; comment counts are a maintained column, not an annotation
+        discussions, next_cursor = discussion_page(discussions, cursor)
+    discussions = annotate_new_replies(discussions, request.user)
     
     context = {
         'section': section,
         'discussions': discussions,
         'category': category,
         'search': search,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
     }
     
-    return render(request, 'discussions/discussion_list.html', context)
+    return render(request, 'discussions/discussions_list.html', context)
+
+
+def _searchable_section_ids(request):
+    """Ids of the sections whose discussions the user may read."""
+    user = request.user
+    if user.role == 'student':
+        student_context = get_student_context(request)
+        return student_context.section_ids if student_context else []
+    if user.role == 'teacher':
+        return ClassSection.objects.filter(teacher=user).values_list('id', flat=True)
+    if user.role == 'college_admin':
+        return ClassSection.objects.filter(course__department__college=user.college).values_list('id', flat=True)
+    return []
+
+@login_required
+def discussion_search(request):
+    """Search discussions and comments across all of the user's sections"""
+    query = request.GET.get('q', '').strip()
+    results = []
+    if query:
+        results = search_index.search(query, _searchable_section_ids(request))
+        discussions = Discussion.objects.select_related('section__course', 'author').in_bulk(
+            {result.discussion_id for result in results}
+        )
+        annotate_new_replies(discussions.values(), request.user)
+        results = [
+            {'result': result, 'discussion': discussions[result.discussion_id]}
+            for result in results if result.discussion_id in discussions
+        ]
+    
+    return render(request, 'discussions/search_results.html', {
+        'query': query,
+        'results': results,
+    })
+
+@login_required
+def trending_discussions(request, section_id=None):
+    """Hottest discussions of one section, or of all the user's sections"""
+    section_ids = _searchable_section_ids(request)
+    section = None
+    if section_id is not None:
+        section = get_object_or_404(ClassSection.objects.select_related('course'), id=section_id)
+        if section.id not in set(section_ids):
+            messages.error(request, 'Access denied.')
+            return redirect('dashboard')
+        discussions = Discussion.objects.filter(section=section)
+    else:
+        discussions = Discussion.objects.filter(section_id__in=section_ids)
+    
+    # Served from the hot_score indexes; scores are maintained as activity happens
+    discussions = annotate_new_replies(trending(discussions), request.user)
+    
+    return render(request, 'discussions/trending.html', {
+        'section': section,
+        'discussions': discussions,
+    })
 
 @login_required
 def discussion_create(request, section_id):
@@ -62,14 +135,13 @@ def discussion_create(request, section_id):
     
     # Check access
     if request.user.role == 'student':
-        try:
-            student = Student.objects.get(user=request.user)
-            if not Enrollment.objects.filter(student=student, section=section, is_active=True).exists():
-                messages.error(request, 'You are not enrolled in this course.')
-                return redirect('dashboard')
-        except Student.DoesNotExist:
+        student_context = get_student_context(request)
+        if student_context is None:
             messages.error(request, 'Student profile not found.')
             return redirect('dashboard')
+        if not student_context.is_enrolled(section):
+            messages.error(request, 'You are not enrolled in this course.')
+            return redirect('dashboard')
     elif request.user.role == 'teacher':
         if section.teacher != request.user:
             messages.error(request, 'Access denied.')
@@ -98,36 +170,92 @@ def discussion_detail(request, pk):
     """View discussion details and comments"""
     discussion = get_object_or_404(Discussion, pk=pk)
     
-    # Increment view count
-    discussion.views_count += 1
-    discussion.save(update_fields=['views_count'])
+    # Increment view count (buffered; written to the database in batches)
+    counters.increment(discussion, 'views_count')
     
     # Check access
     if request.user.role == 'student':
-        try:
-            student = Student.objects.get(user=request.user)
-            if not Enrollment.objects.filter(student=student, section=discussion.section, is_active=True).exists():
-                messages.error(request, 'You are not enrolled in this course.')
-                return redirect('dashboard')
-        except Student.DoesNotExist:
+        student_context = get_student_context(request)
+        if student_context is None:
             messages.error(request, 'Student profile not found.')
             return redirect('dashboard')
+        if not student_context.is_enrolled(discussion.section_id):
+            messages.error(request, 'You are not enrolled in this course.')
+            return redirect('dashboard')
     elif request.user.role == 'teacher':
         if discussion.section.teacher != request.user:
             messages.error(request, 'Access denied.')
             return redirect('dashboard')
     
-    # Get comments (top-level only, replies will be nested)
-    comments = discussion.comments.filter(parent=None).select_related('author').prefetch_related('replies')
+    # One page of top-level comments with their whole reply trees (see threads.py)
+    comments, comments_page = comment_thread(discussion, request.user, request.GET.get('page'))
+    
+    # Move the user's read watermark (buffered; written to the database in batches)
+    mark_read(request.user, discussion)
     
     context = {
         'discussion': discussion,
         'comments': comments,
+        'comments_page': comments_page,
+        'live_updates': settings.DISCUSSION_LIVE_UPDATES,
+        'live_event_id': get_broker().last_event_id(channel_for(discussion.id)),
+        'live_busy_retry_ms': settings.DISCUSSION_STREAM_BUSY_RETRY_SECONDS * 1000,
         'can_moderate': request.user == discussion.section.teacher or request.user.role == 'college_admin',
     }
     
     return render(request, 'discussions/discussion_detail.html', context)
 
+def _sse_message(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+@login_required
+def discussion_stream(request, pk):
+    """Server-Sent Events stream of new comments and vote totals (see live.py)"""
+    discussion = get_object_or_404(Discussion.objects.select_related('section'), pk=pk)
+    
+    # Check access
+    if request.user.role == 'student':
+        student_context = get_student_context(request)
+        if student_context is None or not student_context.is_enrolled(discussion.section_id):
+            return JsonResponse({'error': 'You are not enrolled in this course.'}, status=403)
+    elif request.user.role == 'teacher' and discussion.section.teacher_id != request.user.id:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    
+    if not settings.DISCUSSION_LIVE_UPDATES:
+        return JsonResponse({'error': 'Live updates are disabled.'}, status=404)
+    # Each stream holds this worker thread; past the cap the page retries later
+    if not stream_slots.acquire(settings.DISCUSSION_STREAM_MAX_CLIENTS):
+        response = JsonResponse({'error': 'Too many live connections.'}, status=503)
+        response['Retry-After'] = settings.DISCUSSION_STREAM_BUSY_RETRY_SECONDS
+        return response
+    
+    broker = get_broker()
+    channel = channel_for(discussion.id)
+    # Browsers send Last-Event-ID when reconnecting; the page passes the id it was rendered at
+    last_event_id = (request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+                     or broker.last_event_id(channel))
+    
+    def stream():
+        event_id = last_event_id
+        yield f"retry: {settings.DISCUSSION_STREAM_RETRY_MS}\n\n"
+        # Streams end after a while so worker threads are recycled; the browser reconnects
+        deadline = time.monotonic() + settings.DISCUSSION_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            events = broker.events_after(channel, event_id, timeout=settings.DISCUSSION_STREAM_HEARTBEAT)
+            if events is RESYNC:
+                yield _sse_message(broker.last_event_id(channel), 'resync', {})
+                return
+            if not events:
+                yield ": heartbeat\n\n"
+                continue
+            for event_id, event, data in events:
+                yield _sse_message(event_id, event, data)
+    
+    response = StreamingHttpResponse(stream_slots.hold(stream()), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let nginx pass events through unbuffered
+    return response
+
 @login_required
 def discussion_edit(request, pk):
     """Edit discussion"""
@@ -136,7 +264,9 @@ def discussion_edit(request, pk):
     if request.method == 'POST':
         form = DiscussionForm(request.POST, request.FILES, instance=discussion)
         if form.is_valid():
-            form.save()
+            # Only the form's columns: counters on the row are maintained with F() elsewhere
+            discussion = form.save(commit=False)
+            discussion.save(update_fields=[*form.Meta.fields, 'updated_at'])
             messages.success(request, 'Discussion updated successfully!')
             return redirect('discussion_detail', pk=discussion.id)
     else:
@@ -175,7 +305,7 @@ def discussion_toggle_pin(request, pk):
         return redirect('discussion_detail', pk=pk)
     
     discussion.is_pinned = not discussion.is_pinned
-    discussion.save()
+    discussion.save(update_fields=['is_pinned', 'updated_at'])
     
     status = 'pinned' if discussion.is_pinned else 'unpinned'
     messages.success(request, f'Discussion {status} successfully!')
@@ -192,7 +322,7 @@ def discussion_toggle_lock(request, pk):
         return redirect('discussion_detail', pk=pk)
     
     discussion.is_locked = not discussion.is_locked
-    discussion.save()
+    discussion.save(update_fields=['is_locked', 'updated_at'])
     
     status = 'locked' if discussion.is_locked else 'unlocked'
     messages.success(request, f'Discussion {status} successfully!')
@@ -210,7 +340,7 @@ def discussion_resolve(request, pk):
         return redirect('discussion_detail', pk=pk)
     
     discussion.is_resolved = not discussion.is_resolved
-    discussion.save()
+    discussion.save(update_fields=['is_resolved', 'updated_at'])
     
     status = 'marked as resolved' if discussion.is_resolved else 'reopened'
     messages.success(request, f'Discussion {status}!')
@@ -228,14 +358,20 @@ def add_comment(request, discussion_id):
     
     # Check access
     if request.user.role == 'student':
-        try:
-            student = Student.objects.get(user=request.user)
-            if not Enrollment.objects.filter(student=student, section=discussion.section, is_active=True).exists():
-                messages.error(request, 'You are not enrolled in this course.')
-                return redirect('dashboard')
-        except Student.DoesNotExist:
+        student_context = get_student_context(request)
+        if student_context is None:
             messages.error(request, 'Student profile not found.')
             return redirect('dashboard')
+        if not student_context.is_enrolled(discussion.section_id):
+            messages.error(request, 'You are not enrolled in this course.')
+            return redirect('dashboard')
+    
+    # Check if it's a reply (the parent must belong to the same thread)
+    parent_comment = None
+    parent_id = request.POST.get('parent_id') or request.GET.get('parent')
+    if parent_id:
+        parent_comment = get_object_or_404(Comment.objects.select_related('author'), pk=parent_id,
+                                           discussion=discussion)
     
     if request.method == 'POST':
         form = CommentForm(request.POST, request.FILES)
@@ -243,13 +379,7 @@ def add_comment(request, discussion_id):
             comment = form.save(commit=False)
             comment.discussion = discussion
             comment.author = request.user
-            
-            # Check if it's a reply
-            parent_id = request.POST.get('parent_id')
-            if parent_id:
-                parent_comment = get_object_or_404(Comment, pk=parent_id)
-                comment.parent = parent_comment
-            
+            comment.parent = parent_comment
             comment.save()
             messages.success(request, 'Comment added successfully!')
             return redirect('discussion_detail', pk=discussion_id)
@@ -258,7 +388,8 @@ def add_comment(request, discussion_id):
     
     return render(request, 'discussions/add_comment.html', {
         'form': form,
-        'discussion': discussion
+        'discussion': discussion,
+        'parent_comment': parent_comment,
     })
 
 @login_required
@@ -269,7 +400,9 @@ def edit_comment(request, comment_id):
     if request.method == 'POST':
         form = CommentForm(request.POST, request.FILES, instance=comment)
         if form.is_valid():
-            form.save()
+            # Leave upvotes alone: votes are applied to the row with F() by cast_vote
+            comment = form.save(commit=False)
+            comment.save(update_fields=[*form.Meta.fields, 'updated_at'])
             messages.success(request, 'Comment updated successfully!')
             return redirect('discussion_detail', pk=comment.discussion.id)
     else:
@@ -305,35 +438,20 @@ def vote_comment(request, comment_id):
         return JsonResponse({'error': 'Invalid request'}, status=400)
     
     comment = get_object_or_404(Comment, pk=comment_id)
-    vote_type = int(request.POST.get('vote_type', 1))  # 1 for upvote, -1 for downvote
-    
-    # Check if user already voted
-    existing_vote = CommentVote.objects.filter(comment=comment, user=request.user).first()
-    
-    if existing_vote:
-        if existing_vote.vote_type == vote_type:
-            # Remove vote
-            existing_vote.delete()
-            comment.upvotes -= vote_type
-            action = 'removed'
-        else:
-            # Change vote
-            existing_vote.vote_type = vote_type
-            existing_vote.save()
-            comment.upvotes += (2 * vote_type)  # Change from -1 to 1 or vice versa
-            action = 'changed'
-    else:
-        # New vote
-        CommentVote.objects.create(comment=comment, user=request.user, vote_type=vote_type)
-        comment.upvotes += vote_type
-        action = 'added'
+    try:
+        vote_type = int(request.POST.get('vote_type', 1))  # 1 for upvote, -1 for downvote
+    except ValueError:
+        vote_type = None
+    if vote_type not in VOTE_TYPES:
+        return JsonResponse({'error': 'Invalid vote type'}, status=400)
     
-    comment.save()
+    # Atomic: the vote row and an F() delta on the comment in one transaction
+    action, upvotes = cast_vote(comment.id, request.user, vote_type)
     
     return JsonResponse({
         'success': True,
         'action': action,
-        'upvotes': comment.upvotes
+        'upvotes': upvotes
     })
 
 @login_required
@@ -351,7 +469,7 @@ def mark_solution(request, comment_id):
     
     # Mark this as solution
     comment.is_solution = not comment.is_solution
-    comment.save()
+    comment.save(update_fields=['is_solution'])
     
     if comment.is_solution:
         messages.success(request, 'Comment marked as solution!')
@@ -0,0 +1,88 @@
+# discussions/votes.py
+"""
+Comment voting without lost updates.
+
+``cast_vote`` changes the voter's ``CommentVote`` row (insert, flip or remove)
+and applies the resulting delta to ``Comment.upvotes`` with a single ``F()``
+update in the same transaction, so concurrent votes on one comment all count
+and the comment row is never rewritten from a stale copy. New totals are
+pushed to live viewers of the discussion (see ``discussions.live``).
+``reconcile_comment_votes`` (and the command of the same name) recomputes
+``upvotes`` from the votes to repair any drift.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .live import publish_votes
+from .models import Comment, CommentVote, Discussion
+from .ranking import refresh_vote_totals, update_hot_scores
+
+VOTE_TYPES = (1, -1)
+
+
+def cast_vote(comment_id, user, vote_type):
+    """
+    Toggle ``user``'s vote on a comment: a new vote is added, the same vote again
+    removes it and the opposite vote replaces it.
+
+    Returns ``(action, upvotes)`` with action 'added', 'removed' or 'changed'.
+    """
+    if vote_type not in VOTE_TYPES:
+        raise ValueError(f'vote_type must be one of {VOTE_TYPES}')
+
+    with transaction.atomic():
+        votes = CommentVote.objects.select_for_update().filter(comment_id=comment_id, user=user)
+        existing = votes.values_list('vote_type', flat=True).first()
+        if existing is None:
+            try:
+                with transaction.atomic():
+                    CommentVote.objects.create(comment_id=comment_id, user=user, vote_type=vote_type)
+                action, delta = 'added', vote_type
+            except IntegrityError:
+                # A concurrent request from the same user inserted first; treat this one as a repeat
+                existing = votes.values_list('vote_type', flat=True).get()
+        if existing == vote_type:
+            votes.delete()
+            action, delta = 'removed', -vote_type
+        elif existing is not None:
+            votes.update(vote_type=vote_type)
+            action, delta = 'changed', 2 * vote_type
+
+        Comment.objects.filter(pk=comment_id).update(upvotes=F('upvotes') + delta)
+        upvotes, discussion_id = Comment.objects.filter(pk=comment_id).values_list('upvotes', 'discussion_id').get()
+        Discussion.objects.filter(pk=discussion_id).update(vote_total=F('vote_total') + delta)
+        update_hot_scores([discussion_id])
+        transaction.on_commit(lambda: publish_votes(discussion_id, comment_id, upvotes))
+    return action, upvotes
+
+
+def reconcile_comment_votes(comment_ids=None):
+    """
+    Recompute ``Comment.upvotes`` as the sum of its votes with one grouped query.
+
+    Only comments whose stored count differs are written. Returns the number of
+    comments corrected.
+    """
+    comments = Comment.objects.all()
+    if comment_ids is not None:
+        comments = comments.filter(pk__in=list(comment_ids))
+
+    totals = dict(
+        CommentVote.objects.filter(comment__in=comments).values('comment_id').annotate(
+            total=Sum('vote_type')
+        ).order_by().values_list('comment_id', 'total')
+    )
+
+    stale = []
+    for comment in comments.only('id', 'discussion_id', 'upvotes').order_by().iterator(chunk_size=1000):
+        total = totals.get(comment.id, 0)
+        if comment.upvotes != total:
+            comment.upvotes = total
+            stale.append(comment)
+
+    Comment.objects.bulk_update(stale, ['upvotes'], batch_size=500)
+    if stale:
+        discussion_ids = {comment.discussion_id for comment in stale}
+        refresh_vote_totals(discussion_ids)
+        update_hot_scores(discussion_ids)
+    return len(stale)
@@ -0,0 +1,43 @@
+"""
+CSV helpers shared by the streamed exports (grade sheets, question banks).
+
+Exported cells hold user-entered names, titles and feedback. A spreadsheet runs
+a cell starting with ``= + - @`` as a formula, so such text cells are written
+with a leading ``'`` (which spreadsheets display as plain text), and the
+importers strip it again with ``unescape_formula`` so sheets round-trip.
+Numbers are written as they are, so negative marks stay numeric.
+"""
+import csv
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def escape_formula(value):
+    """Prefix ``'`` to text a spreadsheet would run as a formula; other values pass through."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def unescape_formula(value):
+    """Undo ``escape_formula`` on a cell read back from an exported sheet."""
+    if value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+class _Echo:
+    """File-like object that hands back whatever ``csv.writer`` writes to it."""
+
+    def write(self, value):
+        return value
+
+
+class StreamingWriter:
+    """``csv.writer`` whose ``writerow`` returns the line for a streamed response."""
+
+    def __init__(self):
+        self._writer = csv.writer(_Echo())
+
+    def writerow(self, row):
+        return self._writer.writerow([escape_formula(value) for value in row])
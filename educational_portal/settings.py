@@ -57,6 +57,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.media',
+                'courses.context_processors.inbox',
             ],
         },
     },
@@ -106,6 +107,60 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Cache (used for per-student access context and other short-lived data).
+# For production with several worker processes, use a shared cache such as Redis:
+# CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379'}}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'educational-portal',
+    },
+    # Buffered download/view counters and discussion visits, kept apart so that other
+    # cached data never pushes them out. LocMemCache culls entries once MAX_ENTRIES is
+    # reached, and culled counts are lost, so size it well above the number of rows
+    # counted between two flushes.
+    'counters': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'educational-portal-counters',
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+
+# Cache alias of the buffered counters (see analytics.counters / flush_counters).
+# LocMemCache is per process: each worker buffers and flushes only its own counts, and a
+# flush_counters run from cron sees none of them. With several workers, point this alias at
+# a shared cache that never evicts keys without an expiry, e.g. Redis with
+# maxmemory-policy volatile-lru (Memcached evicts any key under memory pressure).
+COUNTER_CACHE_ALIAS = 'counters'
+
+# Seconds between flushes of buffered counters
+COUNTER_FLUSH_INTERVAL = 60
+
+# Live discussion updates over Server-Sent Events (see discussions.live). The in-process
+# broker only reaches clients served by the same process; swap in a shared broker when
+# running several workers.
+# Off by default: every open stream holds a worker thread for up to
+# DISCUSSION_STREAM_MAX_SECONDS, so a few readers exhaust a sync or threaded worker pool.
+# Enable it only with workers that can hold many idle connections (e.g. gunicorn with
+# gevent workers), and size DISCUSSION_STREAM_MAX_CLIENTS (streams per process) to fit.
+# Past that cap the stream answers 503 and the page retries after
+# DISCUSSION_STREAM_BUSY_RETRY_SECONDS.
+DISCUSSION_LIVE_UPDATES = False
+DISCUSSION_STREAM_MAX_CLIENTS = 10
+DISCUSSION_STREAM_BUSY_RETRY_SECONDS = 30
+DISCUSSION_LIVE_BROKER = 'discussions.live.InProcessBroker'
+DISCUSSION_STREAM_HEARTBEAT = 15  # seconds between keep-alive comments
+DISCUSSION_STREAM_MAX_SECONDS = 300  # then the browser reconnects with Last-Event-ID
+DISCUSSION_STREAM_RETRY_MS = 3000
+
+# Protected media delivery (study material downloads).
+# 'django' streams files from the worker with Range/ETag support. Behind a proxy, set
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd) so the proxy sends the bytes
+# after Django's access check. Example nginx location for x-accel-redirect:
+#   location /protected-media/ { internal; alias /path/to/media/; }
+MEDIA_DELIVERY_MODE = 'django'
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -116,6 +171,10 @@ LOGOUT_REDIRECT_URL = 'login'
 
 # Email Configuration (for development - console backend)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'Educational Portal <noreply@localhost>'
+
+# Deadline reminders (send_deadline_reminders): look-ahead window in hours
+DEADLINE_REMINDER_HOURS = 48
 
 # For production, use SMTP:
 # EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -147,6 +206,13 @@ MESSAGE_TAGS = {
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB
 
+# Chunked uploads (large study materials and submissions). Chunks are appended to a
+# partial file in CHUNKED_UPLOAD_DIR, which must not be served publicly.
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'chunked_uploads'
+CHUNKED_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024  # 5 MB, below DATA_UPLOAD_MAX_MEMORY_SIZE
+CHUNKED_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024  # 2 GB
+CHUNKED_UPLOAD_EXPIRY_HOURS = 24
+
 # Session Settings
 SESSION_COOKIE_AGE = 86400  # 24 hours
 SESSION_SAVE_EVERY_REQUEST = True
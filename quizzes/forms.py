@@ -1,6 +1,7 @@
 
 # quizzes/forms.py
 from django import forms
+from django.core.validators import FileExtensionValidator
 from .models import Quiz, QuizQuestion, QuizOption
 
 class QuizForm(forms.ModelForm):
@@ -8,7 +9,8 @@ class QuizForm(forms.ModelForm):
         model = Quiz
         fields = ['title', 'description', 'duration_minutes', 'total_marks', 'passing_marks',
                  'difficulty', 'start_time', 'end_time', 'allow_multiple_attempts', 
-                 'max_attempts', 'show_results_immediately', 'randomize_questions']
+                 'max_attempts', 'show_results_immediately', 'randomize_questions',
+                 'multiple_answer_scoring']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
@@ -22,6 +24,7 @@ class QuizForm(forms.ModelForm):
             'max_attempts': forms.NumberInput(attrs={'class': 'form-control'}),
             'show_results_immediately': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'randomize_questions': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'multiple_answer_scoring': forms.Select(attrs={'class': 'form-select'}),
         }
 
 class QuizQuestionForm(forms.ModelForm):
@@ -43,3 +46,10 @@ class QuizOptionForm(forms.ModelForm):
             'option_text': forms.TextInput(attrs={'class': 'form-control'}),
             'is_correct': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
+
+class QuestionBankImportForm(forms.Form):
+    file = forms.FileField(
+        validators=[FileExtensionValidator(allowed_extensions=['json', 'csv'])],
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.json,.csv'}),
+        help_text='A JSON or CSV question bank exported from this portal or prepared from the template.'
+    )
@@ -0,0 +1,194 @@
+# quizzes/grading.py
+"""
+Manual grading of short answers, regrading and bulk recalculation of attempt scores.
+
+Scores follow ``QuizAttempt.calculate_score``: the score is the sum of
+``marks_awarded`` over an attempt's answers and the percentage is taken against
+the marks of the questions that were answered. Recalculation is done for many
+attempts at once - one grouped aggregate per batch of attempts and a
+``bulk_update`` of ``QuizAttempt`` and ``QuizResult`` - instead of calling
+``calculate_score()`` attempt by attempt.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from accounts.student_dashboard import invalidate_student_dashboard
+
+from .models import QuizAnswer, QuizAttempt, QuizOption, QuizResult
+
+BATCH_SIZE = 500
+
+
+def _batches(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def recalculate_attempt_scores(attempt_ids):
+    """
+    Recompute ``score``/``percentage`` of the given attempts and their results.
+
+    Returns the number of attempts updated. Should be called inside the
+    transaction that changed the answers' marks.
+    """
+    attempt_ids = sorted(set(attempt_ids))
+    updated = 0
+
+    for batch in _batches(attempt_ids):
+        totals = {attempt_id: (Decimal('0'), 0) for attempt_id in batch}
+        rows = QuizAnswer.objects.filter(attempt_id__in=batch).values('attempt_id').annotate(
+            total_score=Sum('marks_awarded'),
+            total_marks=Sum('question__marks'),
+        ).order_by()
+        for row in rows:
+            totals[row['attempt_id']] = (row['total_score'] or Decimal('0'), row['total_marks'] or 0)
+
+        attempts = []
+        for attempt_id, (score, total_marks) in totals.items():
+            if total_marks > 0:
+                percentage = round((Decimal(score) / total_marks) * 100, 2)
+            else:
+                percentage = Decimal('0')
+            attempts.append(QuizAttempt(id=attempt_id, score=score, percentage=percentage))
+        QuizAttempt.objects.bulk_update(attempts, ['score', 'percentage'])
+        updated += len(attempts)
+
+        scores = {attempt.id: attempt for attempt in attempts}
+        results = []
+        for result in QuizResult.objects.filter(attempt_id__in=batch).select_related('quiz').only(
+            'id', 'attempt_id', 'student_id', 'quiz__passing_marks'
+        ):
+            attempt = scores[result.attempt_id]
+            result.score = attempt.score
+            result.percentage = attempt.percentage
+            result.passed = attempt.percentage >= result.quiz.passing_marks
+            results.append(result)
+        QuizResult.objects.bulk_update(results, ['score', 'percentage', 'passed'])
+        invalidate_student_dashboard(*{result.student_id for result in results})
+
+    return updated
+
+
+def short_answer_queue(quiz):
+    """Short-answer questions of ``quiz`` annotated with their submitted/ungraded answer counts."""
+    submitted = Q(answers__attempt__status='submitted')
+    return quiz.questions.filter(question_type='short').annotate(
+        answer_count=Count('answers', filter=submitted),
+        ungraded_count=Count('answers', filter=submitted & Q(answers__graded_at__isnull=True)),
+    ).order_by('order', 'id')
+
+
+def parse_marks(question, post_data, answer_ids):
+    """
+    Read ``marks_<answer id>`` values for ``answer_ids`` from ``post_data``.
+
+    Blank fields are skipped. Returns ``(marks_by_answer_id, errors)``.
+    """
+    marks, errors = {}, []
+    for answer_id in answer_ids:
+        value = (post_data.get(f'marks_{answer_id}') or '').strip()
+        if not value:
+            continue
+        try:
+            mark = Decimal(value)
+        except InvalidOperation:
+            errors.append(f'"{value}" is not a valid mark.')
+            continue
+        if not mark.is_finite() or mark < 0 or mark > question.marks:
+            errors.append(f'Marks must be between 0 and {question.marks} (got {value}).')
+            continue
+        marks[answer_id] = mark.quantize(Decimal('0.01'))
+    return marks, errors
+
+
+@transaction.atomic
+def grade_short_answers(question, marks, grader):
+    """
+    Save marks for many answers of one short-answer question.
+
+    ``marks`` maps answer ids to awarded marks. Answers are written with one
+    ``bulk_update`` and the affected attempts/results are recalculated in bulk.
+    Returns the number of answers graded.
+    """
+    now = timezone.now()
+    answers = list(
+        QuizAnswer.objects.select_for_update().filter(question=question, id__in=marks.keys())
+        .only('id', 'attempt_id')
+    )
+    for answer in answers:
+        answer.marks_awarded = marks[answer.id]
+        answer.is_correct = answer.marks_awarded == question.marks
+        answer.graded_by = grader
+        answer.graded_at = now
+
+    QuizAnswer.objects.bulk_update(
+        answers, ['marks_awarded', 'is_correct', 'graded_by', 'graded_at'], batch_size=BATCH_SIZE
+    )
+    recalculate_attempt_scores(answer.attempt_id for answer in answers)
+    return len(answers)
+
+
+@transaction.atomic
+def regrade_quiz(quiz):
+    """
+    Re-score every objective answer of the submitted attempts of ``quiz`` against
+    the current answer key.
+
+    The key, the selections and the answers are each read with a single query,
+    changed answers are written back with ``bulk_update`` and then all submitted
+    attempts (and their results) are recalculated, so question marks that were
+    edited are picked up as well. Short answers keep their manual marks.
+
+    Returns a dict with the number of answers checked/changed and attempts updated.
+    """
+    questions = {
+        question.id: question
+        for question in quiz.questions.filter(question_type__in=['mcq', 'multiple', 'true_false'])
+    }
+    for question in questions.values():
+        # Avoid a query per question when score_selection looks at the quiz
+        question.quiz = quiz
+
+    correct = {question_id: set() for question_id in questions}
+    for question_id, option_id in QuizOption.objects.filter(
+        question_id__in=questions, is_correct=True
+    ).values_list('question_id', 'id'):
+        correct[question_id].add(option_id)
+
+    # Attempts still in progress are scored when they are submitted
+    Selection = QuizAnswer.selected_options.through
+    selected = {}
+    for answer_id, option_id in Selection.objects.filter(
+        quizanswer__question_id__in=questions, quizanswer__attempt__status='submitted'
+    ).values_list('quizanswer_id', 'quizoption_id').iterator(chunk_size=5000):
+        selected.setdefault(answer_id, set()).add(option_id)
+
+    checked, changed = 0, []
+    answers = QuizAnswer.objects.filter(question_id__in=questions, attempt__status='submitted').only(
+        'id', 'question_id', 'is_correct', 'marks_awarded'
+    )
+    for answer in answers.iterator(chunk_size=5000):
+        checked += 1
+        question = questions[answer.question_id]
+        is_correct, marks = question.score_selection(
+            correct[question.id], selected.get(answer.id, ()), quiz.multiple_answer_scoring
+        )
+        if is_correct != answer.is_correct or marks != answer.marks_awarded:
+            answer.is_correct = is_correct
+            answer.marks_awarded = marks
+            changed.append(answer)
+
+    QuizAnswer.objects.bulk_update(changed, ['is_correct', 'marks_awarded'], batch_size=BATCH_SIZE)
+
+    attempts_updated = recalculate_attempt_scores(
+        quiz.attempts.filter(status='submitted').values_list('id', flat=True)
+    )
+
+    return {
+        'answers_checked': checked,
+        'answers_changed': len(changed),
+        'attempts_updated': attempts_updated,
+    }
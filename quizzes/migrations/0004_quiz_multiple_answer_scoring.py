@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0003_quizanswer_grading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='multiple_answer_scoring',
+            field=models.CharField(choices=[('exact', 'All or nothing'), ('partial', 'Partial credit (no marks if a wrong option is chosen)'), ('penalized', 'Partial credit, each wrong option cancels a right one')], default='exact', help_text='How multiple-answer questions are marked.', max_length=20),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from decimal import Decimal
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
@@ -11,6 +12,12 @@ class Quiz(models.Model):
         ('hard', 'Hard'),
     )
     
+    MULTIPLE_ANSWER_SCORING_CHOICES = (
+        ('exact', 'All or nothing'),
+        ('partial', 'Partial credit (no marks if a wrong option is chosen)'),
+        ('penalized', 'Partial credit, each wrong option cancels a right one'),
+    )
+    
     section = models.ForeignKey(ClassSection, on_delete=models.CASCADE, related_name='quizzes')
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -25,6 +32,9 @@ class Quiz(models.Model):
     max_attempts = models.IntegerField(default=1, validators=[MinValueValidator(1)])
     show_results_immediately = models.BooleanField(default=True)
     randomize_questions = models.BooleanField(default=False)
+    multiple_answer_scoring = models.CharField(max_length=20, choices=MULTIPLE_ANSWER_SCORING_CHOICES,
+                                               default='exact',
+                                               help_text='How multiple-answer questions are marked.')
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_quizzes')
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -58,6 +68,33 @@ class QuizQuestion(models.Model):
     def __str__(self):
         return f"Q{self.order}: {self.question_text[:50]}"
     
+    def score_selection(self, correct_ids, selected_ids, scoring=None):
+        """
+        Grade a set of selected option ids against the correct ones.
+        
+        Returns ``(is_correct, marks_awarded)``. Only 'multiple' questions can earn
+        partial credit, according to the quiz's ``multiple_answer_scoring``.
+        """
+        correct_ids, selected_ids = set(correct_ids), set(selected_ids)
+        if correct_ids and correct_ids == selected_ids:
+            return True, Decimal(self.marks)
+        if self.question_type != 'multiple' or not correct_ids:
+            return False, Decimal('0')
+        
+        scoring = scoring or self.quiz.multiple_answer_scoring
+        right = len(selected_ids & correct_ids)
+        wrong = len(selected_ids - correct_ids)
+        
+        if scoring == 'partial':
+            credited = 0 if wrong else right
+        elif scoring == 'penalized':
+            credited = max(right - wrong, 0)
+        else:
+            credited = 0
+        
+        marks = Decimal(self.marks) * credited / len(correct_ids)
+        return False, marks.quantize(Decimal('0.01'))
+    
     class Meta:
         ordering = ['order']
 
@@ -99,10 +136,9 @@ class QuizAttempt(models.Model):
         total_score = 0
         total_marks = 0
         
-        for answer in self.answers.all():
+        for answer in self.answers.select_related('question'):
             total_marks += answer.question.marks
-            if answer.is_correct:
-                total_score += answer.question.marks
+            total_score += answer.marks_awarded
         
         self.score = total_score
         if total_marks > 0:
@@ -139,21 +175,19 @@ class QuizAnswer(models.Model):
     is_correct = models.BooleanField(default=False)
     marks_awarded = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     answered_at = models.DateTimeField(auto_now=True)
+    graded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='graded_quiz_answers')
+    graded_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f"{self.attempt.student.roll_number} - Q{self.question.order}"
     
     def check_answer(self):
-        if self.question.question_type in ['mcq', 'true_false']:
-            correct_options = set(self.question.options.filter(is_correct=True))
-            selected_options = set(self.selected_options.all())
+        if self.question.question_type in ['mcq', 'true_false', 'multiple']:
+            correct_options = self.question.options.filter(is_correct=True).values_list('id', flat=True)
+            selected_options = self.selected_options.values_list('id', flat=True)
             
-            if correct_options == selected_options:
-                self.is_correct = True
-                self.marks_awarded = self.question.marks
-            else:
-                self.is_correct = False
-                self.marks_awarded = 0
+            self.is_correct, self.marks_awarded = self.question.score_selection(correct_options, selected_options)
         
         self.save()
     
@@ -0,0 +1,254 @@
+# quizzes/question_bank.py
+"""
+Import and export of a quiz's question bank.
+
+Two formats are supported:
+
+* JSON - ``{"quiz": "...", "questions": [{"question_text": ..., "question_type": ...,
+  "marks": ..., "explanation": ..., "options": [{"text": ..., "is_correct": ...}]}]}``
+  (a bare list of questions is accepted on import as well).
+* CSV - one question per row with the columns ``question_text, question_type, marks,
+  explanation, option_1 ... option_N, correct``, where ``correct`` holds the 1-based
+  numbers of the correct options separated by commas (e.g. ``2`` or ``1,3``).
+
+Imports validate the whole file before anything is written and then insert all
+questions and options with ``bulk_create`` inside a single transaction. Exports are
+generators meant for ``StreamingHttpResponse`` so large banks never sit in memory.
+"""
+import codecs
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max
+
+from educational_portal.csv_export import StreamingWriter, unescape_formula
+
+from .forms import QuizQuestionForm
+from .models import QuizQuestion, QuizOption
+
+MAX_OPTIONS = 6
+BULK_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 500
+
+QUESTION_FIELDS = ['question_text', 'question_type', 'marks', 'explanation']
+OBJECTIVE_TYPES = ['mcq', 'multiple', 'true_false']
+SINGLE_ANSWER_TYPES = ['mcq', 'true_false']
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+
+def _validate_question(label, data, options):
+    """
+    Validate one question and its options.
+
+    Returns ``(question, option_objects, errors)``; the model instances are unsaved
+    and have no quiz/question set yet.
+    """
+    errors = []
+    form = QuizQuestionForm(data={field: data.get(field, '') for field in QUESTION_FIELDS})
+    if not form.is_valid():
+        for field, field_errors in form.errors.items():
+            for error in field_errors:
+                errors.append(f'{label}: {field}: {error}')
+        return None, [], errors
+
+    question = form.save(commit=False)
+    question_type = question.question_type
+    correct_count = sum(1 for _, is_correct in options if is_correct)
+
+    if question_type == 'short':
+        if options:
+            errors.append(f'{label}: short answer questions cannot have options.')
+    else:
+        if len(options) < 2:
+            errors.append(f'{label}: at least 2 options are required.')
+        if len(options) > MAX_OPTIONS:
+            errors.append(f'{label}: at most {MAX_OPTIONS} options are allowed.')
+        if correct_count == 0:
+            errors.append(f'{label}: mark at least one option as correct.')
+        elif question_type in SINGLE_ANSWER_TYPES and correct_count > 1:
+            errors.append(f'{label}: only one option can be correct for this question type.')
+
+    option_objects = []
+    for index, (text, is_correct) in enumerate(options, start=1):
+        if len(text) > QuizOption._meta.get_field('option_text').max_length:
+            errors.append(f'{label}: option {index} is longer than 500 characters.')
+        option_objects.append(QuizOption(option_text=text, is_correct=is_correct, order=index))
+
+    return question, option_objects, errors
+
+
+def _parse_json(uploaded_file):
+    try:
+        payload = json.load(codecs.getreader('utf-8-sig')(uploaded_file))
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValidationError(f'Invalid JSON file: {exc}')
+
+    items = payload.get('questions') if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        raise ValidationError('The JSON file must contain a list of questions.')
+
+    for number, item in enumerate(items, start=1):
+        label = f'Question {number}'
+        if not isinstance(item, dict):
+            yield label, {}, [], [f'{label}: expected an object.']
+            continue
+
+        options, errors = [], []
+        for option in item.get('options') or []:
+            if isinstance(option, dict):
+                options.append((str(option.get('text', '')).strip(), bool(option.get('is_correct'))))
+            else:
+                errors.append(f'{label}: each option must be an object with "text" and "is_correct".')
+        yield label, item, [option for option in options if option[0]], errors
+
+
+def _parse_csv(uploaded_file):
+    reader = csv.DictReader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+    header = reader.fieldnames or []
+    missing = [field for field in QUESTION_FIELDS if field not in header]
+    if missing:
+        raise ValidationError(f'The CSV file is missing the column(s): {", ".join(missing)}.')
+
+    option_columns = sorted(
+        (column for column in header if column.startswith('option_') and column[7:].isdigit()),
+        key=lambda column: int(column[7:])
+    )
+
+    try:
+        for row in reader:
+            # Header is line 1
+            label = f'Row {reader.line_num}'
+            errors = []
+            # Exports escape text that would run as a spreadsheet formula
+            row = {key: unescape_formula(value) if isinstance(value, str) else value for key, value in row.items()}
+            texts = [(row.get(column) or '').strip() for column in option_columns]
+
+            correct = set()
+            for value in (row.get('correct') or '').replace(';', ',').split(','):
+                value = value.strip()
+                if not value:
+                    continue
+                if not value.isdigit() or not 1 <= int(value) <= len(texts) or not texts[int(value) - 1]:
+                    errors.append(f'{label}: "{value}" in correct does not match a filled option column.')
+                else:
+                    correct.add(int(value))
+
+            options = [
+                (text, number in correct)
+                for number, text in enumerate(texts, start=1) if text
+            ]
+            yield label, row, options, errors
+    except (csv.Error, UnicodeDecodeError) as exc:
+        raise ValidationError(f'Invalid CSV file: {exc}')
+
+
+def parse_question_bank(uploaded_file):
+    """
+    Parse and validate an uploaded JSON or CSV question bank.
+
+    Returns a list of ``(question, options)`` pairs of unsaved model instances.
+    Raises ``ValidationError`` listing every problem found in the file, so nothing
+    is imported unless the whole file is valid.
+    """
+    if uploaded_file.name.lower().endswith('.json'):
+        rows = _parse_json(uploaded_file)
+    else:
+        rows = _parse_csv(uploaded_file)
+
+    parsed, errors = [], []
+    for label, data, options, row_errors in rows:
+        question, option_objects, question_errors = _validate_question(label, data, options)
+        errors.extend(row_errors)
+        errors.extend(question_errors)
+        if not row_errors and not question_errors:
+            parsed.append((question, option_objects))
+
+    if errors:
+        raise ValidationError(errors)
+    if not parsed:
+        raise ValidationError('The file does not contain any questions.')
+    return parsed
+
+
+@transaction.atomic
+def import_question_bank(quiz, parsed):
+    """
+    Append parsed questions to ``quiz`` after its existing questions.
+
+    Questions and options are each written with one ``bulk_create`` (batched), so the
+    whole import costs a handful of queries regardless of the bank size.
+    """
+    next_order = (quiz.questions.aggregate(Max('order'))['order__max'] or 0) + 1
+
+    questions = []
+    for offset, (question, _) in enumerate(parsed):
+        question.quiz = quiz
+        question.order = next_order + offset
+        questions.append(question)
+    QuizQuestion.objects.bulk_create(questions, batch_size=BULK_BATCH_SIZE)
+
+    options = []
+    for question, question_options in parsed:
+        for option in question_options:
+            option.question = question
+            options.append(option)
+    QuizOption.objects.bulk_create(options, batch_size=BULK_BATCH_SIZE)
+
+    return len(questions)
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def _export_queryset(quiz):
+    return quiz.questions.order_by('order', 'id').prefetch_related('options').iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+
+
+def _question_to_dict(question):
+    return {
+        'question_text': question.question_text,
+        'question_type': question.question_type,
+        'marks': question.marks,
+        'explanation': question.explanation,
+        'options': [
+            {'text': option.option_text, 'is_correct': option.is_correct}
+            for option in question.options.all()
+        ],
+    }
+
+
+def iter_json_export(quiz):
+    """Yield the quiz's question bank as JSON, one question at a time."""
+    yield '{"quiz": %s, "questions": [' % json.dumps(quiz.title)
+    for index, question in enumerate(_export_queryset(quiz)):
+        yield ('' if index == 0 else ',\n') + json.dumps(_question_to_dict(question))
+    yield ']}\n'
+
+
+def iter_csv_export(quiz):
+    """Yield the quiz's question bank as CSV rows."""
+    option_counts = quiz.questions.annotate(option_count=Count('options')).values_list('option_count', flat=True)
+    option_columns = max([MAX_OPTIONS, *option_counts])
+
+    writer = StreamingWriter()
+    yield writer.writerow(
+        QUESTION_FIELDS + [f'option_{number}' for number in range(1, option_columns + 1)] + ['correct']
+    )
+
+    for question in _export_queryset(quiz):
+        options = list(question.options.all())
+        texts = [option.option_text for option in options]
+        correct = [str(number) for number, option in enumerate(options, start=1) if option.is_correct]
+        yield writer.writerow(
+            [question.question_text, question.question_type, question.marks, question.explanation]
+            + texts + [''] * (option_columns - len(texts))
+            + [','.join(correct)]
+        )
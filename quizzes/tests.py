@@ -1,3 +1,301 @@
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import College, User
+from colleges.models import ClassSection, Course, Department, Enrollment, Student, Teacher
+from .grading import grade_short_answers, parse_marks, recalculate_attempt_scores, regrade_quiz
+from .models import Quiz, QuizAnswer, QuizAttempt, QuizOption, QuizQuestion, QuizResult
+from .question_bank import import_question_bank, iter_csv_export, iter_json_export, parse_question_bank
+
+
+class QuizTestData(TestCase):
+    """A section with a teacher, two enrolled students and an empty quiz."""
+
+    @classmethod
+    def setUpTestData(cls):
+        college = College.objects.create(name='College', code='C1', address='a', established_year=2000,
+                                         contact_email='c@example.com', contact_phone='1')
+        department = Department.objects.create(college=college, name='Computer Science', code='CS')
+        course = Course.objects.create(department=department, name='Algorithms', code='CS101', credits=4, semester=1)
+        cls.teacher = User.objects.create_user('teacher', password='pw', role='teacher', college=college)
+        Teacher.objects.create(user=cls.teacher, department=department, employee_id='E1', qualification='q',
+                               specialization='s', joining_date=datetime.date(2020, 1, 1))
+        cls.section = ClassSection.objects.create(course=course, section_name='A', academic_year='2024-2025',
+                                                  year=1, teacher=cls.teacher)
+        cls.students, cls.enrollments = [], []
+        for number in range(2):
+            user = User.objects.create_user(f'student{number}', password='pw', role='student', college=college)
+            student = Student.objects.create(user=user, department=department, roll_number=f'R{number:03d}',
+                                             admission_year=2024, current_semester=1, guardian_name='g',
+                                             guardian_phone='1')
+            cls.students.append(student)
+            cls.enrollments.append(Enrollment.objects.create(student=student, section=cls.section))
+        now = timezone.now()
+        cls.quiz = Quiz.objects.create(section=cls.section, title='Week 1', duration_minutes=30, total_marks=10,
+                                       passing_marks=50, start_time=now - datetime.timedelta(hours=1),
+                                       end_time=now + datetime.timedelta(days=1), created_by=cls.teacher)
+
+    def add_question(self, question_type='mcq', marks=2, options=(('4', True), ('5', False)), quiz=None):
+        quiz = quiz or self.quiz
+        question = QuizQuestion.objects.create(quiz=quiz, question_text=f'Question {quiz.questions.count() + 1}',
+                                               question_type=question_type, marks=marks,
+                                               order=quiz.questions.count() + 1)
+        for order, (text, is_correct) in enumerate(options, start=1):
+            QuizOption.objects.create(question=question, option_text=text, is_correct=is_correct, order=order)
+        return question
+
+    def submit_attempt(self, student, answers):
+        """
+        A submitted attempt of ``student`` with a result. ``answers`` maps questions
+        to selected options (a list) or to ``(text, marks_awarded)`` for short answers.
+        """
+        attempt = QuizAttempt.objects.create(quiz=self.quiz, student=student, status='submitted',
+                                             submitted_at=timezone.now())
+        for question, answer in answers.items():
+            if question.question_type == 'short':
+                text, marks = answer
+                QuizAnswer.objects.create(attempt=attempt, question=question, text_answer=text, marks_awarded=marks)
+            else:
+                quiz_answer = QuizAnswer.objects.create(attempt=attempt, question=question)
+                quiz_answer.selected_options.set(answer)
+                quiz_answer.check_answer()
+        recalculate_attempt_scores([attempt.id])
+        attempt.refresh_from_db()
+        QuizResult.objects.create(attempt=attempt, student=student, quiz=self.quiz,
+                                  enrollment=self.enrollments[self.students.index(student)],
+                                  score=attempt.score, percentage=attempt.percentage,
+                                  passed=attempt.percentage >= self.quiz.passing_marks)
+        return attempt
+
+
+def _bank(quiz):
+    return [
+        (question.question_text, question.question_type, question.marks, question.explanation,
+         [(option.option_text, option.is_correct) for option in question.options.all()])
+        for question in quiz.questions.order_by('order').prefetch_related('options')
+    ]
+
+
+class QuestionBankTests(QuizTestData):
+    def setUp(self):
+        self.add_question('mcq', 2, [('4', True), ('5', False)])
+        self.add_question('multiple', 4, [('2', True), ('3', True), ('4', False), ('5, or "7"', True)])
+        self.add_question('true_false', 1, [('True', False), ('False', True)])
+        self.add_question('short', 3, [])
+
+    def copy_quiz(self):
+        quiz = self.quiz
+        return Quiz.objects.create(section=self.section, title='Copy', duration_minutes=30, total_marks=10,
+                                   passing_marks=50, start_time=quiz.start_time, end_time=quiz.end_time,
+                                   created_by=self.teacher)
+
+    def round_trip(self, exporter, name):
+        content = ''.join(exporter(self.quiz)).encode()
+        copy = self.copy_quiz()
+        import_question_bank(copy, parse_question_bank(SimpleUploadedFile(name, content)))
+        self.assertEqual(_bank(copy), _bank(self.quiz))
+
+    def test_json_round_trip(self):
+        self.round_trip(iter_json_export, 'bank.json')
+
+    def test_csv_round_trip(self):
+        self.round_trip(iter_csv_export, 'bank.csv')
+
+    def test_csv_export_escapes_formulas(self):
+        question = self.add_question('mcq', 1, [('-1', True), ('=1+1', False)])
+        QuizQuestion.objects.filter(pk=question.pk).update(question_text='@SUM(A1:A2)', explanation='+ or -')
+        export = ''.join(iter_csv_export(self.quiz))
+        self.assertIn("'@SUM(A1:A2),mcq,1,'+ or -,'-1,'=1+1,", export)
+        self.round_trip(iter_csv_export, 'bank.csv')
+
+    def test_json_export_is_valid_json(self):
+        payload = json.loads(''.join(iter_json_export(self.quiz)))
+        self.assertEqual(payload['quiz'], 'Week 1')
+        self.assertEqual(len(payload['questions']), 4)
+
+    def test_import_appends_after_existing_questions(self):
+        bank = SimpleUploadedFile('bank.json', json.dumps([
+            {'question_text': 'New', 'question_type': 'mcq', 'marks': 1,
+             'options': [{'text': 'a', 'is_correct': True}, {'text': 'b'}]},
+        ]).encode())
+        import_question_bank(self.quiz, parse_question_bank(bank))
+        self.assertEqual(self.quiz.questions.get(question_text='New').order, 5)
+
+    def test_invalid_bank_reports_every_error(self):
+        bank = SimpleUploadedFile('bank.csv', (
+            'question_text,question_type,marks,explanation,option_1,option_2,correct\n'
+            'Pick one,mcq,2,,a,b,"1,2"\n'
+            'No options,multiple,1,,,,\n'
+            'Fine,mcq,1,,a,b,3\n'
+        ).encode())
+        with self.assertRaises(ValidationError) as raised:
+            parse_question_bank(bank)
+        self.assertEqual(raised.exception.messages, [
+            'Row 2: only one option can be correct for this question type.',
+            'Row 3: at least 2 options are required.',
+            'Row 3: mark at least one option as correct.',
+            'Row 4: "3" in correct does not match a filled option column.',
+            'Row 4: mark at least one option as correct.',
+        ])
+
+    def test_invalid_upload_imports_nothing(self):
+        self.client.login(username='teacher', password='pw')
+        bank = SimpleUploadedFile('bank.json', b'[{"question_text": "x", "question_type": "mcq", "marks": 1}]')
+        response = self.client.post(reverse('import_questions', args=[self.quiz.id]), {'file': bank})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['import_errors'])
+        self.assertEqual(self.quiz.questions.count(), 4)
+
+    def test_export_view_streams_csv(self):
+        self.client.login(username='teacher', password='pw')
+        response = self.client.get(reverse('export_questions', args=[self.quiz.id, 'csv']))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+    def test_export_requires_the_quiz_teacher(self):
+        self.client.login(username='student0', password='pw')
+        response = self.client.get(reverse('export_questions', args=[self.quiz.id, 'json']))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+
+class GradingQueueTests(QuizTestData):
+    def setUp(self):
+        self.mcq = self.add_question('mcq', 2, [('4', True), ('5', False)])
+        self.short = self.add_question('short', 8, [])
+        right = self.mcq.options.get(is_correct=True)
+        self.attempts = [
+            self.submit_attempt(student, {self.mcq: [right], self.short: ('An answer', Decimal('0'))})
+            for student in self.students
+        ]
+
+    def short_answers(self):
+        return list(QuizAnswer.objects.filter(question=self.short).order_by('attempt__student__roll_number'))
+
+    def test_grading_rescores_attempts_and_results(self):
+        first, second = self.short_answers()
+        graded = grade_short_answers(self.short, {first.id: Decimal('8'), second.id: Decimal('4')}, self.teacher)
+        self.assertEqual(graded, 2)
+
+        first.refresh_from_db()
+        self.assertTrue(first.is_correct)
+        self.assertEqual(first.graded_by, self.teacher)
+        scores = list(QuizAttempt.objects.order_by('student__roll_number').values_list('score', 'percentage'))
+        self.assertEqual(scores, [(Decimal('10'), Decimal('100')), (Decimal('6'), Decimal('60'))])
+        results = list(QuizResult.objects.order_by('student__roll_number').values_list('percentage', 'passed'))
+        self.assertEqual(results, [(Decimal('100'), True), (Decimal('60'), True)])
+
+    def test_query_count_does_not_grow_with_answers(self):
+        first, second = self.short_answers()
+        with CaptureQueriesContext(connection) as one:
+            grade_short_answers(self.short, {first.id: Decimal('1')}, self.teacher)
+        with CaptureQueriesContext(connection) as both:
+            grade_short_answers(self.short, {first.id: Decimal('2'), second.id: Decimal('2')}, self.teacher)
+        self.assertEqual(len(one.captured_queries), len(both.captured_queries))
+
+    def test_parse_marks_rejects_out_of_range_values(self):
+        first, second = self.short_answers()
+        marks, errors = parse_marks(self.short, {f'marks_{first.id}': '9', f'marks_{second.id}': 'abc'},
+                                    [first.id, second.id])
+        self.assertEqual(marks, {})
+        self.assertEqual(len(errors), 2)
+
+    def test_queue_view_grades_posted_marks(self):
+        first, second = self.short_answers()
+        self.client.login(username='teacher', password='pw')
+        url = reverse('grading_queue', args=[self.quiz.id])
+        response = self.client.get(url)
+        self.assertEqual(response.context['question'], self.short)
+        self.assertEqual(len(response.context['answers']), 2)
+
+        response = self.client.post(url, {'question_id': self.short.id, f'marks_{first.id}': '5'})
+        self.assertRedirects(response, f'{url}?question={self.short.id}', fetch_redirect_response=False)
+        self.assertEqual(QuizAttempt.objects.get(pk=first.attempt_id).score, Decimal('7'))
+        self.assertEqual(len(self.client.get(url).context['answers']), 1)
+
+
+class RegradeTests(QuizTestData):
+    def setUp(self):
+        self.mcq = self.add_question('mcq', 2, [('4', False), ('5', True)])
+        self.multiple = self.add_question('multiple', 4, [('2', True), ('3', True), ('4', False), ('5', True)])
+        self.wrong_key, self.right_key = self.mcq.options.all()
+        self.primes = list(self.multiple.options.all())
+
+    def test_score_selection(self):
+        correct = [option.id for option in self.primes if option.is_correct]
+        two_right, one_wrong = [self.primes[0].id, self.primes[1].id], [self.primes[0].id, self.primes[2].id]
+        expected = {
+            'exact': [(True, Decimal('4')), (False, Decimal('0')), (False, Decimal('0'))],
+            'partial': [(True, Decimal('4')), (False, Decimal('2.67')), (False, Decimal('0'))],
+            'penalized': [(True, Decimal('4')), (False, Decimal('2.67')), (False, Decimal('0'))],
+        }
+        for scoring, outcomes in expected.items():
+            with self.subTest(scoring=scoring):
+                self.assertEqual([self.multiple.score_selection(correct, selected, scoring)
+                                  for selected in (correct, two_right, one_wrong)], outcomes)
+        # Each wrong option cancels one right one
+        all_and_one_wrong = correct + [self.primes[2].id]
+        self.assertEqual(self.multiple.score_selection(correct, all_and_one_wrong, 'penalized'), (False, Decimal('2.67')))
+        self.assertEqual(self.multiple.score_selection(correct, all_and_one_wrong, 'partial'), (False, Decimal('0')))
+        self.assertEqual(self.mcq.score_selection([self.right_key.id], [self.wrong_key.id], 'partial'),
+                         (False, Decimal('0')))
+
+    def test_regrade_applies_a_corrected_key_and_scoring(self):
+        first, second = self.students
+        self.submit_attempt(first, {self.mcq: [self.wrong_key], self.multiple: self.primes[:2]})
+        self.submit_attempt(second, {self.mcq: [self.right_key], self.multiple: [self.primes[0], self.primes[2]]})
+        self.assertEqual(list(QuizAttempt.objects.order_by('student__roll_number').values_list('score', flat=True)),
+                         [Decimal('0'), Decimal('2')])
+
+        # The answer key was wrong, and the teacher switches to penalized partial credit
+        QuizOption.objects.filter(pk=self.wrong_key.pk).update(is_correct=True)
+        QuizOption.objects.filter(pk=self.right_key.pk).update(is_correct=False)
+        Quiz.objects.filter(pk=self.quiz.pk).update(multiple_answer_scoring='penalized')
+        self.quiz.refresh_from_db()
+
+        summary = regrade_quiz(self.quiz)
+        self.assertEqual(summary, {'answers_checked': 4, 'answers_changed': 3, 'attempts_updated': 2})
+        self.assertEqual(
+            list(QuizAttempt.objects.order_by('student__roll_number').values_list('score', 'percentage')),
+            [(Decimal('4.67'), Decimal('77.83')), (Decimal('0'), Decimal('0'))],
+        )
+        self.assertEqual(list(QuizResult.objects.order_by('student__roll_number').values_list('passed', flat=True)),
+                         [True, False])
+
+    def test_regrade_skips_attempts_in_progress(self):
+        self.submit_attempt(self.students[0], {self.mcq: [self.right_key]})
+        attempt = QuizAttempt.objects.create(quiz=self.quiz, student=self.students[1])
+        answer = QuizAnswer.objects.create(attempt=attempt, question=self.mcq)
+        answer.selected_options.set([self.right_key])
+
+        summary = regrade_quiz(self.quiz)
+        self.assertEqual(summary, {'answers_checked': 1, 'answers_changed': 0, 'attempts_updated': 1})
+        answer.refresh_from_db()
+        self.assertEqual((answer.is_correct, answer.marks_awarded), (False, Decimal('0')))
+
+    def test_regrade_query_count_does_not_grow_with_attempts(self):
+        self.submit_attempt(self.students[0], {self.mcq: [self.right_key], self.multiple: self.primes[:2]})
+        with CaptureQueriesContext(connection) as one:
+            regrade_quiz(self.quiz)
+        self.submit_attempt(self.students[1], {self.mcq: [self.wrong_key], self.multiple: self.primes[:1]})
+        with CaptureQueriesContext(connection) as two:
+            regrade_quiz(self.quiz)
+        self.assertEqual(len(one.captured_queries), len(two.captured_queries))
 
-# Create your tests here.
+    def test_regrade_view_requires_post(self):
+        self.submit_attempt(self.students[0], {self.mcq: [self.right_key]})
+        self.client.login(username='teacher', password='pw')
+        url = reverse('quiz_regrade', args=[self.quiz.id])
+        self.assertEqual(self.client.get(url).context['submitted_count'], 1)
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse('quiz_results', args=[self.quiz.id]), fetch_redirect_response=False)
@@ -13,6 +13,8 @@ urlpatterns = [
     path('<int:quiz_id>/add-question/', views.add_question, name='add_question'),
     path('question/<int:question_id>/edit/', views.edit_question, name='edit_question'),
     path('question/<int:question_id>/delete/', views.delete_question, name='delete_question'),
+    path('<int:quiz_id>/questions/import/', views.import_questions, name='import_questions'),
+    path('<int:quiz_id>/questions/export/<str:file_format>/', views.export_questions, name='export_questions'),
     
     # Taking quiz
     path('<int:quiz_id>/take/', views.take_quiz, name='take_quiz'),
@@ -22,4 +24,6 @@ urlpatterns = [
     # Results & analytics
     path('<int:quiz_id>/results/', views.quiz_results, name='quiz_results'),
     path('<int:quiz_id>/analytics/', views.quiz_analytics, name='quiz_analytics'),
+    path('<int:quiz_id>/grading/', views.grading_queue, name='grading_queue'),
+    path('<int:quiz_id>/regrade/', views.quiz_regrade, name='quiz_regrade'),
 ]
\ No newline at end of file
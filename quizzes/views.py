@@ -2,12 +2,16 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.db.models import Avg, Count
 from .models import Quiz, QuizQuestion, QuizOption, QuizAttempt, QuizAnswer, QuizResult
 from colleges.models import ClassSection, Enrollment, Student
-from .forms import QuizForm, QuizQuestionForm, QuizOptionForm
+from colleges.student_context import get_student_context
+from .forms import QuizForm, QuizQuestionForm, QuizOptionForm, QuestionBankImportForm
+from .question_bank import parse_question_bank, import_question_bank, iter_json_export, iter_csv_export
+from .grading import short_answer_queue, parse_marks, grade_short_answers, regrade_quiz
 from django.db import models
 
 @login_required
@@ -20,26 +24,19 @@ def quiz_list(request):
 
     if user.role == 'student':
         # --- LOGIC FOR STUDENTS ---
-        try:
-            # Check for the student profile associated with the user
-            student = Student.objects.get(user=user)
-        except Student.DoesNotExist:
+        # Check for the student profile associated with the user
+        student_context = get_student_context(request)
+        if student_context is None:
             # Fallback if student profile is missing
             return render(request, 'quizzes/quiz_list.html', {'available_quizzes': [], 'upcoming_quizzes': []})
 
-        # 1. Get the IDs of all sections the student is enrolled in
-        enrolled_section_ids = Enrollment.objects.filter(
-            student=student, 
-            is_active=True
-        ).values_list('section_id', flat=True) # FIX: Uses 'section_id'
-
-        # 2. Filter Quizzes for the student's enrolled sections
+        # 1. Filter Quizzes for the student's enrolled sections (cached per student)
         all_quizzes_for_student = Quiz.objects.filter(
-            section_id__in=enrolled_section_ids,
+            section_id__in=student_context.section_ids,
             is_active=True
         ).select_related('section', 'section__course').order_by('start_time')
 
-        # 3. Categorize Quizzes by time for students
+        # 2. Categorize Quizzes by time for students
         context['available_quizzes'] = all_quizzes_for_student.filter(
             start_time__lte=now,
             end_time__gte=now
@@ -123,14 +120,13 @@ def quiz_detail(request, quiz_id):
     
     # Check access
     if request.user.role == 'student':
-        try:
-            student = Student.objects.get(user=request.user)
-            if not quiz.section.enrollments.filter(student=student, is_active=True).exists():
-                messages.error(request, 'You are not enrolled in this course.')
-                return redirect('quiz_list')
-        except Student.DoesNotExist:
+        student_context = get_student_context(request)
+        if student_context is None:
             messages.error(request, 'Student profile not found.')
             return redirect('dashboard')
+        if not student_context.is_enrolled(quiz.section_id):
+            messages.error(request, 'You are not enrolled in this course.')
+            return redirect('quiz_list')
     elif request.user.role == 'teacher':
         if quiz.section.teacher != request.user:
             messages.error(request, 'Access denied.')
@@ -141,7 +137,7 @@ def quiz_detail(request, quiz_id):
     can_attempt = False
     
     if request.user.role == 'student':
-        student = Student.objects.get(user=request.user)
+        student = get_student_context(request).student
         attempts = QuizAttempt.objects.filter(quiz=quiz, student=student).order_by('-started_at')
         
         # Check if student can take quiz
@@ -227,17 +223,19 @@ def add_question(request, quiz_id):
             # --- Logic to save Options ---
             num_options = int(request.POST.get('num_options', 4))
             
+            options = []
             for i in range(num_options):
                 option_text = request.POST.get(f'option_{i}')
                 is_correct = request.POST.get(f'is_correct_{i}') == 'on'
                 
                 if option_text:
-                    QuizOption.objects.create(
+                    options.append(QuizOption(
                         question=question,
                         option_text=option_text,
                         is_correct=is_correct,
                         order=i + 1
-                    )
+                    ))
+            QuizOption.objects.bulk_create(options)
             
             messages.success(request, 'Question added successfully!')
             
@@ -293,6 +291,8 @@ def edit_question(request, question_id):
                     option.save()
             
             messages.success(request, 'Question updated successfully!')
+            if quiz.attempts.filter(status='submitted').exists():
+                messages.info(request, 'Regrade the quiz to apply the updated answer key to submitted attempts.')
             return redirect('quiz_detail', quiz_id=quiz.id)
     else:
         form = QuizQuestionForm(instance=question)
@@ -327,6 +327,57 @@ def delete_question(request, question_id):
         'quiz': quiz
     })
 
+@login_required
+def import_questions(request, quiz_id):
+    """Bulk import questions and options from a JSON or CSV question bank"""
+    if request.user.role != 'teacher':
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+    
+    quiz = get_object_or_404(Quiz, id=quiz_id, section__teacher=request.user)
+    import_errors = []
+    
+    if request.method == 'POST':
+        form = QuestionBankImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                parsed = parse_question_bank(form.cleaned_data['file'])
+            except ValidationError as e:
+                import_errors = e.messages
+                messages.error(request, 'The question bank was not imported. Fix the errors below and try again.')
+            else:
+                imported = import_question_bank(quiz, parsed)
+                messages.success(request, f'{imported} questions imported successfully!')
+                return redirect('quiz_detail', quiz_id=quiz.id)
+    else:
+        form = QuestionBankImportForm()
+    
+    return render(request, 'quizzes/import_questions.html', {
+        'form': form,
+        'quiz': quiz,
+        'import_errors': import_errors,
+    })
+
+@login_required
+def export_questions(request, quiz_id, file_format):
+    """Stream the quiz's question bank as a JSON or CSV download"""
+    if request.user.role != 'teacher':
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+    
+    quiz = get_object_or_404(Quiz, id=quiz_id, section__teacher=request.user)
+    
+    if file_format == 'json':
+        response = StreamingHttpResponse(iter_json_export(quiz), content_type='application/json')
+    elif file_format == 'csv':
+        response = StreamingHttpResponse(iter_csv_export(quiz), content_type='text/csv')
+    else:
+        messages.error(request, 'Unsupported export format.')
+        return redirect('quiz_detail', quiz_id=quiz.id)
+    
+    response['Content-Disposition'] = f'attachment; filename="quiz_{quiz.id}_questions.{file_format}"'
+    return response
+
 @login_required
 def take_quiz(request, quiz_id):
     """Start taking a quiz"""
@@ -335,7 +386,10 @@ def take_quiz(request, quiz_id):
         return redirect('dashboard')
     
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    student = get_object_or_404(Student, user=request.user)
+    student_context = get_student_context(request)
+    if student_context is None:
+        raise Http404('Student profile not found.')
+    student = student_context.student
     
     # Check if quiz is available
     if not quiz.is_available():
@@ -570,4 +624,82 @@ def quiz_analytics(request, quiz_id):
         'question_stats': question_stats,
     }
     
-    return render(request, 'quizzes/quiz_analytics.html', context)
\ No newline at end of file
+    return render(request, 'quizzes/quiz_analytics.html', context)
+
+
+@login_required
+def grading_queue(request, quiz_id):
+    """Grade one short-answer question across all submitted attempts (teacher only)"""
+    if request.user.role != 'teacher':
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+    
+    quiz = get_object_or_404(Quiz, id=quiz_id, section__teacher=request.user)
+    queue = list(short_answer_queue(quiz))
+    
+    # Default to the first question that still has ungraded answers
+    question = None
+    question_id = request.POST.get('question_id') or request.GET.get('question')
+    if question_id:
+        question = next((q for q in queue if str(q.id) == question_id), None)
+    if question is None:
+        question = next((q for q in queue if q.ungraded_count), queue[0] if queue else None)
+    
+    show_all = request.GET.get('show') == 'all'
+    answers = []
+    
+    if question is not None:
+        answers = QuizAnswer.objects.filter(
+            question=question,
+            attempt__status='submitted'
+        ).select_related('attempt__student__user').order_by('attempt__student__roll_number', 'attempt__attempt_number')
+        if not show_all and request.method != 'POST':
+            answers = answers.filter(graded_at__isnull=True)
+        
+        if request.method == 'POST':
+            answer_ids = list(answers.values_list('id', flat=True))
+            marks, errors = parse_marks(question, request.POST, answer_ids)
+            for error in errors:
+                messages.error(request, error)
+            
+            if not errors:
+                graded = grade_short_answers(question, marks, request.user)
+                messages.success(request, f'{graded} answers graded and scores updated!')
+                return redirect(f"{request.path}?question={question.id}")
+            
+            answers = answers.filter(graded_at__isnull=True)
+    
+    context = {
+        'quiz': quiz,
+        'queue': queue,
+        'question': question,
+        'answers': answers,
+        'show_all': show_all,
+    }
+    
+    return render(request, 'quizzes/grading_queue.html', context)
+
+@login_required
+def quiz_regrade(request, quiz_id):
+    """Regrade all submitted attempts against the current answer key (teacher only)"""
+    if request.user.role != 'teacher':
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+    
+    quiz = get_object_or_404(Quiz, id=quiz_id, section__teacher=request.user)
+    
+    if request.method == 'POST':
+        summary = regrade_quiz(quiz)
+        messages.success(
+            request,
+            f"Regrade complete: {summary['answers_changed']} of {summary['answers_checked']} answers changed, "
+            f"{summary['attempts_updated']} attempts rescored."
+        )
+        return redirect('quiz_results', quiz_id=quiz.id)
+    
+    submitted_count = quiz.attempts.filter(status='submitted').count()
+    
+    return render(request, 'quizzes/quiz_regrade_confirm.html', {
+        'quiz': quiz,
+        'submitted_count': submitted_count,
+    })